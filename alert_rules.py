@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+"""
+Moteur de règles d'alerte déclaratives.
+
+Une règle compare une ou plusieurs métriques du vecteur courant (celui de
+metric_store, plus quelques grandeurs dérivées) à un seuil :
+
+    {"name": "pilot_low", "metric": "pilot_level", "op": "<", "threshold": -45,
+     "hold": 30, "hysteresis": 3, "label": "Pilote 19 kHz faible",
+     "actions": ["email", "webhook"]}
+
+  - name        : type d'alerte enregistré (épisode), `restore` : type du
+                  rétablissement (défaut : name + '_restored')
+  - metric / op / threshold / hysteresis, ou `when` : liste de conditions
+    de cette forme combinées en OU
+  - hold        : secondes de dépassement continu avant l'alerte
+  - clear_hold  : secondes revenues dans la norme avant le rétablissement
+  - hysteresis  : marge à repasser sous (ou au-dessus) du seuil pour rétablir
+  - baseline    : k, seuil adaptatif moyenne ± k écarts-types de la ligne de
+                  base apprise pour l'heure de la semaine (baselines.py) ; le
+                  seuil statique sert tant que la case n'est pas apprise
+                  (sans `threshold`, la condition est inerte jusque-là)
+  - floor       : borne dure du seuil adaptatif, qui n'est jamais moins
+                  sensible qu'elle (par défaut le seuil statique)
+  - peak        : 'max' ou 'min', valeur extrême suivie pendant l'épisode
+  - depends_on  : règle parente (cause racine possible) ; voir plus bas
+  - suspends    : métriques ignorées tant que la règle est en alerte (âge du
+                  RadioText pendant une perte RDS) ; elles reprennent leur
+                  dernière valeur reçue au rétablissement, évaluée aussitôt
+  - actions     : 'db' (enregistrement seul), 'email', 'webhook' (ACTIONS)
+  - label, restore_label, message, details, restore_message,
+    restore_details : gabarits str.format sur le vecteur de métriques plus
+    value, threshold, duration et peak
+
+Les règles sont compilées une fois en tableaux numpy (indice de métrique,
+sens, seuils d'alerte et de rétablissement, délais) : une évaluation est une
+poignée d'opérations vectorisées quel que soit le nombre de règles, et seules
+les transitions (alerte, rétablissement) passent par du code Python. Une
+mesure absente (NaN) ne déclenche ni ne rétablit : l'état est conservé.
+
+Le moteur est piloté par événements : update() applique des mesures à leur
+horodatage, next_deadline() donne l'instant du prochain changement possible
+sans nouvelle mesure (fin d'un délai, âge franchissant un seuil) et
+advance() y évalue les règles. Le début d'un dépassement est daté de la
+mesure qui l'a révélé, l'alerte part exactement `hold` secondes après.
+
+Corrélation : une alerte (ou son rétablissement) survenant pendant que
+l'une de ses règles ancêtres (`depends_on`, remontée jusqu'à la racine) est
+en dépassement ou en alerte est rattachée à l'épisode de l'ancêtre le plus
+haut : enregistrée, mais sans notification. Si la cause disparaît (délai
+non atteint ou rétablissement) alors que la conséquence persiste, celle-ci
+est relancée comme alerte autonome et notifiée. Le rétablissement du parent
+énumère les alertes qui lui ont été rattachées.
+
+builtin_rules() reproduit les contrôles historiques (porteuse, modulation,
+RDS, RadioText, sur-déviation) ; la section `alerting.rules` de config.json
+les surcharge par nom (`"enabled": false` pour en retirer une) ou en ajoute.
+"""
+import logging
+import math
+from collections import namedtuple
+import numpy as np
+from database import register_episode_type
+
+logger = logging.getLogger(__name__)
+
+COMPARATORS = ('<', '<=', '>', '>=')
+
+# Métrique d'âge (`rds_age`…) : publiée comme « vue il y a N s », elle croît
+# ensuite d'elle-même ; le franchissement de son seuil est une échéance
+AGE_SUFFIX = '_age'
+
+# cause : règle racine à laquelle l'événement est rattaché (None : autonome) ;
+# folded : règles rattachées à cet épisode (alerte et rétablissement d'un parent) ;
+# onset : début du dépassement (epoch s), ts - onset = duration
+RuleEvent = namedtuple('RuleEvent', 'rule restored ts value duration peak label message details cause folded '
+                                    'onset')
+
+
+def _finite(x, ndigits=3):
+    """Nombre arrondi pour l'API, None pour NaN (non représentable en JSON)"""
+    return None if x is None or math.isnan(x) else round(float(x), ndigits)
+
+
+class _Context(dict):
+    """Contexte des gabarits : une métrique absente vaut NaN au lieu de lever KeyError"""
+
+    def __missing__(self, key):
+        return math.nan
+
+
+def _render(template, context):
+    try:
+        return template.format_map(context)
+    except (ValueError, TypeError, IndexError) as e:
+        logger.debug(f"Gabarit d'alerte invalide {template!r} : {e}")
+        return template
+
+
+# ── Actions ─────────────────────────────────────────────────────────────
+# Une action reçoit l'événement et rend la notification à mettre en file
+# (voir FMDatabase.save_alert) ou None. L'enregistrement en base est fait
+# pour tout événement ; 'db' n'ajoute donc rien.
+
+ACTIONS = {}
+
+
+def register_action(name, builder):
+    ACTIONS[name] = builder
+
+
+def _email_action(event):
+    if event.restored and event.rule.restore_label is None:
+        # Rétablissement générique (« Signal FM rétabli »)
+        return {'channel': 'email', 'kind': 'recovery',
+                'payload': {'alert_type': None, 'details': event.details}}
+    return {'channel': 'email', 'kind': 'alert',
+            'payload': {'alert_type': event.label, 'details': event.details}}
+
+
+def _webhook_action(event):
+    if not event.rule.webhook:
+        return None
+    return {'channel': 'webhook', 'kind': 'recovery' if event.restored else 'alert',
+            'payload': {'url': event.rule.webhook, 'body': {
+                'alert_type': event.rule.restore if event.restored else event.rule.name,
+                'restored':   event.restored,
+                'label':      event.label,
+                'message':    event.message,
+                'details':    event.details,
+                'value':      None if math.isnan(event.value) else event.value,
+                'duration_seconds': event.duration,
+                'peak':       event.peak,
+                'folded':     list(event.folded),
+                'ts':         int(event.ts * 1000),
+            }}}
+
+
+register_action('db', lambda event: None)
+register_action('email', _email_action)
+register_action('webhook', _webhook_action)
+
+
+class Rule:
+    """Règle normalisée depuis sa description (dict de config)"""
+
+    def __init__(self, spec, webhook=None):
+        self.name = spec['name']
+        self.restore = spec.get('restore', f'{self.name}_restored')
+        if 'when' in spec:
+            conditions = spec['when']
+        else:
+            conditions = [{k: spec[k] for k in ('metric', 'op', 'threshold', 'hysteresis') if k in spec}]
+        self.conditions = []
+        for c in conditions:
+            if c.get('op') not in COMPARATORS:
+                raise ValueError(f"Règle {self.name} : comparateur invalide {c.get('op')!r}")
+            if c.get('threshold') is None and c.get('baseline', spec.get('baseline')) is None:
+                raise ValueError(f"Règle {self.name} : seuil manquant")
+            self.conditions.append({
+                'metric':     c['metric'],
+                'op':         c['op'],
+                'threshold':  math.nan if c.get('threshold') is None else float(c['threshold']),
+                'hysteresis': float(c.get('hysteresis', spec.get('hysteresis', 0.0))),
+                'baseline':   c.get('baseline', spec.get('baseline')),
+                'floor':      c.get('floor', spec.get('floor', c.get('threshold'))),
+            })
+            if self.conditions[-1]['baseline'] is not None:
+                self.conditions[-1]['baseline'] = float(self.conditions[-1]['baseline'])
+        if not self.conditions:
+            raise ValueError(f"Règle {self.name} : aucune condition")
+        self.hold = float(spec.get('hold', 0))
+        self.clear_hold = float(spec.get('clear_hold', 0))
+        self.peak = spec.get('peak')
+        self.depends_on = spec.get('depends_on')
+        self.suspends = tuple(spec.get('suspends', ()))
+        self.actions = tuple(spec.get('actions', ('email',)))
+        unknown = [a for a in self.actions if a not in ACTIONS]
+        if unknown:
+            raise ValueError(f"Règle {self.name} : action(s) inconnue(s) {unknown}")
+        self.webhook = spec.get('webhook', webhook)
+        self.label = spec.get('label', self.name)
+        self.restore_label = spec.get('restore_label', f'{self.label} : rétabli')
+        first = self.conditions[0]
+        self.message = spec.get('message', f"{self.label} - {{value:.1f}}")
+        self.details = spec.get(
+            'details',
+            f"{first['metric']} : {{value:.2f}} (seuil {first['op']} {{threshold:g}})\n"
+            f"Durée : {{duration}}s"
+        )
+        self.restore_message = spec.get('restore_message', f"{self.restore_label or self.label} - {{value:.1f}}")
+        self.restore_details = spec.get('restore_details', f"{first['metric']} : {{value:.2f}}")
+
+
+def merge_rules(builtin, overrides):
+    """Règles intégrées surchargées par nom par celles de la config, puis les nouvelles"""
+    by_name = {spec['name']: dict(spec) for spec in builtin}
+    order = [spec['name'] for spec in builtin]
+    for spec in overrides or ():
+        name = spec.get('name')
+        if not name:
+            logger.warning(f"Règle d'alerte sans nom ignorée : {spec}")
+            continue
+        if name in by_name:
+            base = by_name[name]
+            if any(k in spec for k in ('metric', 'op', 'threshold')):
+                base.pop('when', None)
+            base.update(spec)
+        else:
+            by_name[name] = dict(spec)
+            order.append(name)
+    return [by_name[n] for n in order if by_name[n].get('enabled', True)]
+
+
+class RuleEngine:
+    """Évalue toutes les règles sur le vecteur de métriques courant"""
+
+    def __init__(self, specs, webhook=None):
+        self.rules = []
+        for spec in specs:
+            try:
+                self.rules.append(Rule(spec, webhook))
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f"Règle d'alerte ignorée ({spec.get('name', '?')}) : {e}")
+        self._index = {r.name: i for i, r in enumerate(self.rules)}
+        self._parent = self._link_parents()
+        for r in self.rules:
+            register_episode_type(r.name, r.restore, r.label, 'max' if r.peak == 'max' else 'min')
+        self._compile()
+        self.reset()
+
+    def _link_parents(self):
+        """Indice de la règle parente de chaque règle ; parents inconnus et cycles ignorés"""
+        parent = [self._index.get(r.depends_on) for r in self.rules]
+        for i, r in enumerate(self.rules):
+            if r.depends_on and parent[i] is None:
+                logger.warning(f"Règle {r.name} : parente inconnue {r.depends_on!r} ignorée")
+            seen, j = {i}, parent[i]
+            while j is not None:
+                if j in seen:
+                    logger.warning(f"Règle {r.name} : dépendance circulaire ignorée")
+                    parent[i] = None
+                    break
+                seen.add(j)
+                j = parent[j]
+        return parent
+
+    def _compile(self):
+        conds = [(i, c) for i, r in enumerate(self.rules) for c in r.conditions]
+        self.metrics = tuple(sorted({c['metric'] for _, c in conds}))
+        self._col = col = {m: j for j, m in enumerate(self.metrics)}
+        self._is_age = np.array([m.endswith(AGE_SUFFIX) for m in self.metrics], dtype=bool)
+        sign = np.array([1.0 if c['op'] in ('>', '>=') else -1.0 for _, c in conds])
+        threshold = np.array([c['threshold'] for _, c in conds])
+        hysteresis = np.array([c['hysteresis'] for _, c in conds])
+        self._metric = np.array([col[c['metric']] for _, c in conds], dtype=np.intp)
+        self._sign = sign
+        self._strict = np.array([c['op'] in ('<', '>') for _, c in conds], dtype=bool)
+        self._static_threshold = threshold
+        self._hysteresis = hysteresis
+        self._threshold = threshold.copy()
+        self._clear_threshold = threshold - sign * hysteresis
+        self._baseline_k = np.array([np.nan if c['baseline'] is None else c['baseline']
+                                     for _, c in conds])
+        self._floor = np.array([np.nan if c['floor'] is None else float(c['floor']) for _, c in conds])
+        self.baseline_metrics = frozenset(c['metric'] for _, c in conds if c['baseline'] is not None)
+        # Première condition de chaque règle : bornes des réductions par règle
+        rule_of = np.array([i for i, _ in conds], dtype=np.intp)
+        self._starts = np.searchsorted(rule_of, np.arange(len(self.rules)))
+        self._hold = np.array([r.hold for r in self.rules])
+        self._clear_hold = np.array([r.clear_hold for r in self.rules])
+        self._peak_sign = np.array([{'max': 1.0, 'min': -1.0}.get(r.peak, 0.0) for r in self.rules])
+        self._cond_age = self._is_age[self._metric]
+        # Métriques suspendues par chaque règle en alerte (règles × métriques)
+        self._suspends = np.array([[m in r.suspends for m in self.metrics] for r in self.rules],
+                                  dtype=bool).reshape(len(self.rules), len(self.metrics))
+
+    def reset(self):
+        """Oublie les mesures, dépassements et épisodes en cours (arrêt du moniteur)"""
+        n = len(self.rules)
+        self._values = np.full(len(self.metrics), np.nan)   # dernière valeur (horodatage pour un âge)
+        self._latest = {}                       # toutes les mesures reçues (gabarits)
+        self._stamps = {}                       # métriques d'âge : instant de référence
+        self._now = 0.0
+        self._breach = np.zeros(n, dtype=bool)  # état de la dernière évaluation
+        self._clear = np.zeros(n, dtype=bool)
+        self._since = np.full(n, np.nan)        # début du dépassement en cours
+        self._clear_since = np.full(n, np.nan)  # début du retour à la normale (épisode actif)
+        self._active = np.zeros(n, dtype=bool)  # alerte émise, rétablissement attendu
+        self._peak = np.full(n, np.nan)
+        self._resolving = np.zeros(n, dtype=bool)   # rétablies dans l'évaluation en cours
+        self._cause = [None] * n                # racine à laquelle l'épisode est rattaché
+        self._folded = [[] for _ in range(n)]   # règles rattachées à l'épisode (parent)
+
+    def carry_state(self, other):
+        """Reprend mesures et état des règles de même nom d'un moteur précédent (rechargement)"""
+        self.restore(other.state())
+
+    def state(self):
+        """
+        Mesures et état des règles, par nom de règle, sérialisable en JSON
+        (point de reprise). Les instants sont absolus (epoch s) : un épisode
+        repris garde son début et sa durée.
+        """
+        def num(x):
+            return None if x is None or x != x else float(x)
+        return {
+            'now': self._now,
+            'latest': {k: num(v) for k, v in self._latest.items()},
+            'stamps': {k: num(v) for k, v in self._stamps.items()},
+            'rules': {r.name: {
+                'since':       num(self._since[i]),
+                'clear_since': num(self._clear_since[i]),
+                'active':      bool(self._active[i]),
+                'peak':        num(self._peak[i]),
+                'breach':      bool(self._breach[i]),
+                'clear':       bool(self._clear[i]),
+                'cause':       None if self._cause[i] is None else self.rules[self._cause[i]].name,
+                'folded':      [self.rules[k].name for k in self._folded[i]],
+            } for i, r in enumerate(self.rules)},
+        }
+
+    def restore(self, state):
+        """Reprend un état produit par state() ; règles et métriques inconnues ignorées"""
+        def num(x):
+            return np.nan if x is None else x
+        self._latest = dict(state['latest'])
+        self._stamps = dict(state['stamps'])
+        self._now = state['now']
+        for j, m in enumerate(self.metrics):
+            value = self._stamps.get(m) if m.endswith(AGE_SUFFIX) else self._latest.get(m)
+            self._values[j] = num(value)
+        for name, s in state['rules'].items():
+            i = self._index.get(name)
+            if i is None:
+                continue
+            self._since[i] = num(s['since'])
+            self._clear_since[i] = num(s['clear_since'])
+            self._active[i] = s['active']
+            self._peak[i] = num(s['peak'])
+            self._breach[i] = s['breach']
+            self._clear[i] = s['clear']
+            self._cause[i] = None if s['cause'] is None else self._index.get(s['cause'])
+            self._folded[i] = [self._index[n] for n in s['folded'] if n in self._index]
+
+    def set_baselines(self, bands):
+        """
+        Seuils adaptatifs : {métrique: (moyenne, écart-type)} de l'heure
+        courante. Une condition `baseline` dont la métrique n'a pas de bande
+        reprend son seuil statique. Le seuil appris est borné par `floor` : une
+        heure à faible variance ne doit pas rendre une porteuse muette
+        indétectable. Prise en compte à la prochaine évaluation.
+        """
+        adaptive = ~np.isnan(self._baseline_k)
+        if not adaptive.any():
+            return
+        mean = np.full(len(self.metrics), np.nan)
+        std = np.full(len(self.metrics), np.nan)
+        for name, (m, s) in bands.items():
+            j = self._col.get(name)
+            if j is not None:
+                mean[j], std[j] = m, s
+        learned = adaptive & ~np.isnan(mean[self._metric])
+        threshold = self._static_threshold.copy()
+        threshold[learned] = (mean[self._metric] + self._sign * self._baseline_k * std[self._metric])[learned]
+        # Moins sensible que la borne : dépassement plus difficile que sous floor
+        laxer = learned & (self._sign * (threshold - self._floor) > 0)
+        threshold[laxer] = self._floor[laxer]
+        self._threshold = threshold
+        self._clear_threshold = threshold - self._sign * self._hysteresis
+
+    def metrics_in_breach(self):
+        """Métriques des règles en dépassement ou en alerte (à exclure de l'apprentissage)"""
+        if not self.rules:
+            return frozenset()
+        rules = self._breach | self._active
+        cond = np.repeat(rules, np.diff(np.append(self._starts, len(self._metric))))
+        return frozenset(self.metrics[j] for j in np.unique(self._metric[cond]))
+
+    def update(self, values, ts):
+        """
+        Applique des mesures horodatées {métrique: valeur | None} (ts : epoch s
+        de la mesure) et réévalue les règles à cet instant. Les délais et âges
+        échus entre-temps sont évalués d'abord, à leur échéance exacte.
+        Retourne la liste des RuleEvent.
+        """
+        events = self.advance(ts)
+        ts = max(ts, self._now)
+        for name, value in values.items():
+            if name.endswith(AGE_SUFFIX):
+                # Âge publié à ts : on retient l'instant de référence
+                value = None if value is None else ts - value
+                self._stamps[name] = value
+            else:
+                self._latest[name] = value
+            j = self._col.get(name)
+            if j is not None:
+                self._values[j] = np.nan if value is None else value
+        return events + self._evaluate(ts)
+
+    def advance(self, now):
+        """Fait avancer le temps jusqu'à `now` sans nouvelle mesure (minuterie)"""
+        events = []
+        for _ in range(2 * len(self.rules) + 2):
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            events += self._evaluate(deadline)
+        return events
+
+    def next_deadline(self):
+        """
+        Prochain instant où une règle peut changer d'état sans nouvelle mesure :
+        fin d'un délai `hold` / `clear_hold`, ou métrique d'âge franchissant
+        un seuil. None s'il n'y en a pas.
+        """
+        if not self.rules:
+            return None
+        pending = ~np.isnan(self._since) & ~self._active & self._breach
+        clearing = self._active & self._clear & ~np.isnan(self._clear_since)
+        due = np.concatenate((
+            (self._since + self._hold)[pending],
+            (self._clear_since + self._clear_hold)[clearing],
+        ))
+        if self._cond_age.any():
+            stamp = self._effective_values()[self._metric][self._cond_age]
+            cross = np.concatenate((stamp + self._threshold[self._cond_age],
+                                    stamp + self._clear_threshold[self._cond_age])) + 1e-3
+            due = np.concatenate((due, cross[cross > self._now]))
+        due = due[~np.isnan(due)]
+        return float(due.min()) if due.size else None
+
+    def _effective_values(self):
+        """Dernières valeurs, NaN pour les métriques suspendues par une règle en alerte"""
+        masked = self._suspends[self._active].any(axis=0)
+        if not masked.any():
+            return self._values
+        return np.where(masked, np.nan, self._values)
+
+    def _evaluate(self, now):
+        """Évalue toutes les règles à l'instant `now` sur les dernières mesures"""
+        if not self.rules:
+            return []
+        self._now = now
+        values = self._effective_values()
+        v = np.where(self._is_age, now - values, values)
+        x = v[self._metric]
+        known = ~np.isnan(x) & ~np.isnan(self._threshold)
+        d = self._sign * (x - self._threshold)
+        dc = self._sign * (x - self._clear_threshold)
+        breach = np.logical_or.reduceat(np.where(self._strict, d > 0, d >= 0), self._starts)
+        clear = (np.logical_and.reduceat(np.where(self._strict, dc <= 0, dc < 0) | ~known, self._starts)
+                 & np.logical_or.reduceat(known, self._starts))
+        self._breach, self._clear = breach, clear
+        value = x[self._starts]
+
+        start = breach & np.isnan(self._since)
+        self._since[start] = now
+        pending = ~np.isnan(self._since)
+        track = pending & (self._peak_sign != 0) & ~np.isnan(value)
+        self._peak[track] = self._peak_sign[track] * np.fmax(
+            self._peak_sign[track] * self._peak[track], self._peak_sign[track] * value[track])
+
+        # Rétablissements de ce passage, connus avant tout rattachement
+        self._clear_since[self._active & ~clear] = np.nan
+        self._clear_since[self._active & clear & np.isnan(self._clear_since)] = now
+        resolve = self._active & clear & (now - self._clear_since >= self._clear_hold)
+        self._resolving = resolve
+
+        # Retour dans la norme avant le délai : le dépassement est oublié
+        cancel = pending & ~self._active & clear
+        self._since[cancel] = np.nan
+        self._peak[cancel] = np.nan
+        events = []
+        for i in np.flatnonzero(cancel):
+            events += self._release(i, now, value)
+
+        fire = pending & ~self._active & breach & (now - self._since >= self._hold)
+
+        for i in np.flatnonzero(fire):
+            self._cause[i] = self._root_cause(i)
+            if self._cause[i] is not None:
+                self._folded[self._cause[i]].append(i)
+            events.append(self._event(i, False, now, value[i]))
+            self._active[i] = True
+        for i in np.flatnonzero(resolve):
+            events.append(self._event(i, True, now, value[i]))
+            self._active[i] = False
+            self._since[i] = self._clear_since[i] = self._peak[i] = np.nan
+            events += self._release(i, now, value)
+            self._cause[i] = None
+        if any(self.rules[i].suspends for i in np.flatnonzero(fire | resolve)):
+            # Métriques suspendues ou rendues : évaluées dans la même transition
+            events += self._evaluate(now)
+        return events
+
+    def _root_cause(self, i):
+        """Ancêtre le plus haut en dépassement ou en alerte, None s'il n'y en a pas"""
+        cause, j = None, self._parent[i]
+        while j is not None:
+            if not self._resolving[j] and (self._active[j] or not np.isnan(self._since[j])):
+                cause = j
+            j = self._parent[j]
+        return cause
+
+    def _release(self, p, now, value):
+        """
+        La cause p a disparu : les alertes qui lui étaient rattachées et
+        toujours actives (hors rétablissement simultané) sont rattachées à un
+        autre ancêtre encore en défaut, sinon relancées comme alertes autonomes.
+        """
+        events = []
+        for i in self._folded[p]:
+            if not self._active[i] or self._resolving[i] or self._cause[i] != p:
+                continue
+            self._cause[i] = self._root_cause(i)
+            if self._cause[i] is not None:
+                self._folded[self._cause[i]].append(i)
+            else:
+                events.append(self._event(i, False, now, value[i]))
+        self._folded[p] = []
+        return events
+
+    def _event(self, i, restored, now, value):
+        rule = self.rules[i]
+        peak = None if np.isnan(self._peak[i]) else float(self._peak[i])
+        duration = int(round(now - self._since[i]))
+        ctx = _Context(self._latest)
+        ctx.update({name: now - stamp for name, stamp in self._stamps.items() if stamp is not None})
+        ctx.update(value=float(value), threshold=float(self._threshold[self._starts[i]]),
+                   duration=duration, peak=math.nan if peak is None else peak)
+        if restored:
+            label = _render(rule.restore_label, ctx) if rule.restore_label else None
+            message, details = rule.restore_message, rule.restore_details
+        else:
+            label = _render(rule.label, ctx)
+            message, details = rule.message, rule.details
+        details = _render(details, ctx)
+        folded = [self.rules[k] for k in dict.fromkeys(self._folded[i])]
+        if restored and folded:
+            lines = [f"  - {_render(r.label, ctx)}"
+                     + (" (toujours en défaut)" if self._active[k] and not self._resolving[k]
+                        else " (rétablie)")
+                     for k, r in zip(dict.fromkeys(self._folded[i]), folded)]
+            details = (details + "\n\n" if details else '') + "Alertes rattachées :\n" + "\n".join(lines)
+        cause = self._cause[i]
+        return RuleEvent(rule, restored, now, float(value), duration, peak, label,
+                         _render(message, ctx), details,
+                         None if cause is None else self.rules[cause].name,
+                         tuple(r.name for r in folded), float(self._since[i]))
+
+    def notifications(self, event):
+        """
+        Notifications à mettre en file pour l'événement, selon les actions de
+        la règle ; aucune pour un événement rattaché à une cause racine.
+        """
+        if event.cause is not None:
+            return []
+        return [n for n in (ACTIONS[a](event) for a in event.rule.actions) if n]
+
+    def label_of(self, name):
+        i = self._index.get(name)
+        return name if i is None else self.rules[i].label
+
+    def latest(self, name, default=None):
+        """Dernière valeur reçue d'une métrique"""
+        value = self._latest.get(name)
+        return default if value is None else value
+
+    def is_active(self, name):
+        i = self._index.get(name)
+        return i is not None and bool(self._active[i])
+
+    def is_pending(self, name):
+        """Vrai dès le début du dépassement, avant même le délai d'alerte"""
+        i = self._index.get(name)
+        return i is not None and not np.isnan(self._since[i])
+
+    def describe(self, now):
+        """Règles compilées et leur état (API)"""
+        out = []
+        for i, r in enumerate(self.rules):
+            since = self._since[i]
+            out.append({
+                'name':       r.name,
+                'label':      r.label,
+                'conditions': [dict(c, threshold=_finite(c['threshold']),
+                                    effective_threshold=_finite(self._threshold[k]))
+                               for k, c in enumerate(r.conditions, start=self._starts[i])],
+                'hold':       r.hold,
+                'clear_hold': r.clear_hold,
+                'actions':    list(r.actions),
+                'state':      'alert' if self._active[i] else ('pending' if not np.isnan(since) else 'ok'),
+                'since_seconds': None if np.isnan(since) else round(now - since, 1),
+                'peak':       None if np.isnan(self._peak[i]) else float(self._peak[i]),
+                'depends_on': r.depends_on,
+                'suspends':   list(r.suspends),
+                'cause':      None if self._cause[i] is None else self.rules[self._cause[i]].name,
+            })
+        return out
+
+
+def builtin_rules(use_tef, audio_cfg, tef_cfg, baseline_k=None):
+    """
+    Contrôles historiques du moniteur, exprimés en règles. Avec baseline_k,
+    la modulation et le SNR audio sont jugés par rapport à la ligne de base
+    de l'heure de la semaine (seuils de config tant qu'elle n'est pas apprise).
+    """
+    silence = float(audio_cfg.get('silence_duration', 30))
+    if use_tef:
+        # Présence signal = débit de trames Ss ; le TEF mesure la réception, pas l'émission
+        signal = {
+            'name': 'signal_lost', 'restore': 'signal_restored',
+            'metric': 'tef_frames', 'op': '<', 'threshold': int(tef_cfg.get('signal_frame_min', 5)),
+            'hold': silence,
+            'label': 'Signal FM non capté', 'restore_label': None,
+            'message': 'Signal FM non capté - {level_db:.2f} dB',
+            'details': ("Aucune trame signal reçue du tuner depuis {duration}s.\n"
+                        "Le tuner ne capte plus de signal FM sur {signal_dbf:.1f} dBf.\n"
+                        "Causes possibles : réception/antenne du tuner, ou interruption de la diffusion."),
+            'restore_message': 'Émetteur rétabli - {level_db:.2f} dB', 'restore_details': '',
+        }
+        modulation = {
+            'metric': 'mpx_power', 'op': '<',
+            'threshold': float(tef_cfg.get('modulation_threshold_dbfs', -40.0)),
+            'message': 'Absence modulation TEF - {mpx_power:.1f} dBFS',
+            'details': ("Signal RF présent ({signal_dbf:.1f} dBf) mais niveau audio très bas "
+                        "({mpx_power:.1f} dBFS).\nSeuil : {threshold:.0f} dBFS\n"
+                        "Vérifier la console du studio et la chaîne audio."),
+            'restore_message': 'Modulation rétablie TEF - {mpx_power:.1f} dBFS',
+            'restore_details': "La modulation audio est à nouveau détectée.\nNiveau audio : {mpx_power:.1f} dBFS",
+        }
+    else:
+        # Sans antenne le niveau reste haut (bruit) mais le SNR s'effondre
+        signal = {
+            'name': 'signal_lost', 'restore': 'signal_restored',
+            'when': [
+                {'metric': 'level_db', 'op': '<',
+                 'threshold': float(audio_cfg.get('signal_lost_threshold', -50.0))},
+                {'metric': 'audio_snr', 'op': '<',
+                 'threshold': float(audio_cfg.get('snr_lost_threshold', 8.0))},
+            ],
+            'hold': silence,
+            'label': 'Émetteur FM hors ligne', 'restore_label': None,
+            'message': 'Émetteur hors ligne - {level_db:.2f} dB',
+            'details': "Aucune porteuse FM détectée.\nNiveau: {level_db:.2f} dB\nDurée: {duration}s",
+            'restore_message': 'Émetteur rétabli - {level_db:.2f} dB', 'restore_details': '',
+        }
+        modulation = {
+            'metric': 'level_std', 'op': '<',
+            'threshold': float(audio_cfg.get('modulation_std_threshold', 1.5)),
+            'message': 'Absence modulation - std {level_std:.2f} dB',
+            'details': ("Signal FM présent ({level_db:.1f} dB) mais sans modulation audio depuis {duration}s.\n"
+                        "Variation du niveau : ±{level_std:.2f} dB (seuil : ±{threshold:.2f} dB)\n"
+                        "Vérifier la console du studio et la chaîne audio."),
+            'restore_message': 'Modulation rétablie - std {level_std:.2f} dB',
+            'restore_details': "La modulation audio est à nouveau détectée.\nVariation du niveau : ±{level_std:.2f} dB",
+        }
+    modulation.update({
+        'name': 'no_modulation', 'restore': 'modulation_restored',
+        'hold': int(audio_cfg.get('modulation_alert_delay', 30)),
+        'label': 'Absence de modulation audio', 'restore_label': 'Modulation audio rétablie',
+        'baseline': baseline_k, 'depends_on': 'signal_lost',
+    })
+    rules = [
+        signal,
+        modulation,
+        {
+            'name': 'rds_lost', 'restore': 'rds_restored',
+            'metric': 'rds_age', 'op': '>=', 'threshold': int(audio_cfg.get('rds_timeout', 120)),
+            'depends_on': 'signal_lost',
+            # RadioText surveillé seulement quand le RDS lui-même est reçu
+            'suspends': ('rt_age',),
+            'label': 'Signal RDS absent', 'restore_label': 'Signal RDS rétabli',
+            'message': 'RDS absent depuis {rds_age:.0f}s',
+            'details': "Aucune donnée RDS reçue depuis {rds_age:.0f}s.\nVérifier le codeur RDS de la station.",
+            'restore_message': 'RDS rétabli',
+            'restore_details': 'Les données RDS sont à nouveau reçues correctement.',
+        },
+        {
+            'name': 'rt_lost', 'restore': 'rt_restored',
+            'metric': 'rt_age', 'op': '>=', 'threshold': int(audio_cfg.get('rt_timeout', 300)),
+            'depends_on': 'rds_lost',
+            'label': 'RadioText absent', 'restore_label': 'RadioText rétabli',
+            'message': 'RadioText absent depuis {rt_age:.0f}s',
+            'details': "Aucun RadioText (RT) reçu depuis {rt_age:.0f}s.\nVérifier le codeur RDS de la station.",
+            'restore_message': 'RadioText rétabli',
+            'restore_details': 'Le RadioText est à nouveau reçu correctement.',
+        },
+        {
+            'name': 'over_deviation', 'restore': 'deviation_restored',
+            'metric': 'deviation_peak', 'op': '>',
+            'threshold': float(audio_cfg.get('deviation_alert_threshold', 80.0)),
+            'hold': int(audio_cfg.get('deviation_alert_delay', 10)),
+            'peak': 'max', 'depends_on': 'signal_lost',   # bruit démodulé sans porteuse
+            'label': 'Sur-déviation FM détectée', 'restore_label': 'Déviation FM normalisée',
+            'message': 'Sur-déviation {deviation_peak:.1f} kHz',
+            'details': ("Déviation FM : {deviation_peak:.1f} kHz (seuil : {threshold:.0f} kHz)\n"
+                        "Durée : {duration}s\nPilote 19 kHz : {pilot_level:.1f} dBFS\n"
+                        "Vérifier le processeur audio et le limiter de déviation."),
+            'restore_message': 'Déviation normalisée ({deviation_peak:.1f} kHz, pic {peak:.1f} kHz)',
+            'restore_details': 'Déviation revenue à {deviation_peak:.1f} kHz.',
+        },
+    ]
+    if baseline_k is not None:
+        # Sans seuil statique : inerte tant que la ligne de base n'est pas apprise
+        rules.append({
+            'name': 'snr_degraded', 'restore': 'snr_restored',
+            'metric': 'audio_snr', 'op': '<', 'threshold': None, 'baseline': baseline_k,
+            'hysteresis': 2.0, 'hold': silence, 'depends_on': 'signal_lost',
+            'label': 'Réception dégradée', 'restore_label': 'Réception normale',
+            'message': 'SNR audio anormalement bas - {audio_snr:.1f} dB',
+            'details': ("SNR audio : {audio_snr:.1f} dB, sous la ligne de base de cette heure "
+                        "(seuil : {threshold:.1f} dB) depuis {duration}s.\n"
+                        "Vérifier l'antenne de réception et l'émetteur."),
+            'restore_message': 'Réception normale - SNR {audio_snr:.1f} dB',
+            'restore_details': 'Le SNR audio est revenu dans sa plage habituelle.',
+        })
+    return rules
@@ -2,7 +2,7 @@
 """
 Application Flask pour le monitoring FM - Version sécurisée complète
 """
-from flask import Flask, render_template, Response, jsonify, request, session, redirect, url_for
+from flask import Flask, render_template, Response, jsonify, request, session, redirect, url_for, g
 from flask_bcrypt import Bcrypt
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -16,6 +16,14 @@ from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from monitor import FMMonitor
 from auth import Auth
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from timing import TIMINGS
+from profiler import SamplingProfiler, ProfilerBusy
+import metric_store
+import export
+from downsample import METHODS as DOWNSAMPLE_METHODS, downsample_rows
+import flight_recorder
+from database import ms_to_iso
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -53,6 +61,23 @@ auth = Auth()
 
 SESSION_TIMEOUT = timedelta(minutes=60)
 
+# Métriques web (latence par endpoint, clients SSE connectés)
+http_request_seconds = REGISTRY.histogram(
+    'fmmonitor_http_request_seconds', 'Durée de traitement des requêtes HTTP', ('endpoint',))
+sse_clients = REGISTRY.gauge('fmmonitor_sse_clients', 'Clients SSE connectés')
+
+@app.before_request
+def start_request_timer():
+    g.request_t0 = time.perf_counter()
+
+@app.after_request
+def observe_request_time(response):
+    t0 = getattr(g, 'request_t0', None)
+    if t0 is not None:
+        http_request_seconds.observe(time.perf_counter() - t0,
+                                     endpoint=request.endpoint or 'unknown')
+    return response
+
 @app.before_request
 def check_session_timeout():
     # Endpoints exclus du check session (polling automatique)
@@ -102,23 +127,34 @@ def check_session_timeout():
 # Instance globale du moniteur
 monitor = None
 
+# Profileur par échantillonnage (/api/debug/profile)
+profiler = SamplingProfiler()
+
 # Cache pour les stats (évite les verrous excessifs)
 stats_cache = {'data': None, 'timestamp': 0}
 
 def generate_stats_sse():
     """Générateur SSE qui pousse les stats toutes les 50ms"""
-    import json
-    while True:
-        try:
-            if monitor:
-                data = monitor.get_stats()
-                yield f"data: {json.dumps(data)}\n\n"
-            time.sleep(0.05)
-        except GeneratorExit:
-            break
-        except Exception as e:
-            logger.error(f"Erreur SSE: {e}")
-            time.sleep(0.1)
+    import json, threading
+    # Nom explicite pour le profileur, rendu au thread de requête (pool Werkzeug) à la fin
+    thread = threading.current_thread()
+    name, thread.name = thread.name, 'sse-stats'
+    sse_clients.inc()
+    try:
+        while True:
+            try:
+                if monitor:
+                    data = monitor.get_stats()
+                    yield f"data: {json.dumps(data)}\n\n"
+                time.sleep(0.05)
+            except GeneratorExit:
+                break
+            except Exception as e:
+                logger.error(f"Erreur SSE: {e}")
+                time.sleep(0.1)
+    finally:
+        sse_clients.dec()
+        thread.name = name
 
 @app.route('/login', methods=['GET', 'POST'])
 @limiter.limit("5 per minute")  # Maximum 5 tentatives de connexion par minute
@@ -179,6 +215,14 @@ def logout():
     logger.info(f"Déconnexion de {username}")
     return redirect(url_for('login'))
 
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    """Métriques au format texte Prometheus (scrape local, sans authentification)"""
+    if monitor and not monitor.config.get('metrics', {}).get('enabled', True):
+        return Response('metrics disabled\n', status=404, mimetype='text/plain')
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/csrf-token')
 def get_csrf_token():
     """Retourne un token CSRF pour les requêtes AJAX"""
@@ -296,24 +340,18 @@ def save_config():
                 config['audio']['silence_duration'] = int(data['audio']['silence_duration'])
             if 'modulation_alert_delay' in data['audio']:
                 config['audio']['modulation_alert_delay'] = int(data['audio']['modulation_alert_delay'])
-                if monitor:
-                    monitor.modulation_alert_delay = int(data['audio']['modulation_alert_delay'])
             if 'modulation_std_threshold' in data['audio']:
                 config['audio']['modulation_std_threshold'] = float(data['audio']['modulation_std_threshold'])
-                if monitor:
-                    monitor.modulation_std_threshold = float(data['audio']['modulation_std_threshold'])
             if 'signal_lost_threshold' in data['audio']:
                 config['audio']['signal_lost_threshold'] = float(data['audio']['signal_lost_threshold'])
-                if monitor:
-                    monitor.signal_lost_threshold = float(data['audio']['signal_lost_threshold'])
             if 'rds_timeout' in data['audio']:
                 config['audio']['rds_timeout'] = int(data['audio']['rds_timeout'])
-                if monitor:
-                    monitor.rds_timeout = int(data['audio']['rds_timeout'])
             if 'rt_timeout' in data['audio']:
                 config['audio']['rt_timeout'] = int(data['audio']['rt_timeout'])
-                if monitor:
-                    monitor.rt_timeout = int(data['audio']['rt_timeout'])
+            if monitor:
+                # Seuils et délais appliqués à chaud : règles d'alerte recompilées
+                monitor.audio_config.update(config['audio'])
+                monitor.reload_alert_rules()
 
         # Configuration email
         if 'email' in data:
@@ -409,14 +447,25 @@ def save_config():
 
         logger.info("Configuration sauvegardée avec succès")
 
-        # Redémarrer le monitoring si la fréquence, le gain OU la source a changé.
-        needs_restart = (
-            ('rtl_sdr' in data and ('frequency' in data['rtl_sdr'] or 'gain' in data['rtl_sdr']))
-            or ('station' in data and 'frequency' in data['station'])
-            or ('tef' in data and 'enabled' in data['tef'])
+        # Redémarrer le monitoring si le gain OU la source a changé ;
+        # un simple changement de fréquence est appliqué à chaud (retune).
+        new_freq = config['rtl_sdr'].get('frequency')
+        freq_changed = bool(monitor) and new_freq != monitor.rtl_config.get('frequency')
+        needs_restart = bool(monitor) and (
+            ('rtl_sdr' in data and 'gain' in data['rtl_sdr']
+             and str(config['rtl_sdr']['gain']) != str(monitor.rtl_config.get('gain')))
+            or ('tef' in data and 'enabled' in data['tef']
+                and bool(data['tef']['enabled']) != monitor.use_tef)
         )
+        applied = None
+        if freq_changed and not needs_restart and monitor.running:
+            logger.info(f"Fréquence modifiée - retune à chaud sur {new_freq}")
+            if monitor.retune(new_freq):
+                applied = 'retune'
+            else:
+                needs_restart = True
         if needs_restart and monitor:
-            logger.info("Config source/fréquence modifiée - redémarrage du monitoring")
+            logger.info("Config source/gain modifiée - redémarrage du monitoring")
             monitor.stop()
             time.sleep(2)
             monitor.config = config
@@ -427,6 +476,7 @@ def save_config():
                 monitor.tef_config = config['tef']
                 monitor.use_tef = config['tef'].get('enabled', False)
             monitor.start()
+            applied = 'restart'
 
         # Appliquer la configuration réseau si elle a été modifiée
         if 'network' in data:
@@ -455,7 +505,8 @@ def save_config():
             except Exception as e:
                 logger.error(f"Erreur lors de l'application de la config réseau: {str(e)}")
 
-        return jsonify({'status': 'success', 'message': 'Configuration enregistrée'})
+        return jsonify({'status': 'success', 'message': 'Configuration enregistrée',
+                        'applied': applied})
 
     except Exception as e:
         logger.error(f"Erreur lors de la sauvegarde de la config: {e}")
@@ -472,6 +523,36 @@ def get_presets():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/tune', methods=['POST'])
+@auth.login_required
+def tune():
+    """Change de fréquence à chaud (presets) sans redémarrer le monitoring"""
+    try:
+        data = request.get_json() or {}
+        freq = str(data.get('frequency', '')).strip()
+        if not freq:
+            return jsonify({'status': 'error', 'message': 'Fréquence manquante'}), 400
+        if not monitor:
+            return jsonify({'status': 'error', 'message': 'Monitor not initialized'}), 503
+
+        t0 = time.time()
+        if not monitor.retune(freq):
+            return jsonify({'status': 'error', 'message': 'Retune impossible'}), 500
+
+        with open('config.json', 'r') as f:
+            config = json.load(f)
+        config['rtl_sdr']['frequency'] = freq
+        config['station']['frequency'] = freq
+        config['station']['frequency_display'] = freq
+        with open('config.json', 'w') as f:
+            json.dump(config, f, indent=2)
+
+        return jsonify({'status': 'success', 'frequency': freq,
+                        'elapsed_ms': round((time.time() - t0) * 1000)})
+    except Exception as e:
+        logger.error(f"Erreur retune: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/logs')
 @auth.login_required
 def get_logs():
@@ -506,27 +587,260 @@ def test_email():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/watchdog/status')
+@auth.login_required
+def get_watchdog_status():
+    """Débit, blocage et compteurs de relance de chaque étage du pipeline"""
+    if monitor:
+        return jsonify({'status': 'success', 'data': monitor.get_watchdog_status()})
+    return jsonify({'status': 'error', 'message': 'Monitor not initialized'}), 503
+
+@app.route('/api/perf/timings', methods=['GET', 'POST'])
+@auth.login_required
+def perf_timings():
+    """Durées des chemins chauds et part du budget temps réel ; POST pour activer/réinitialiser"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            if 'enabled' in data:
+                TIMINGS.set_enabled(bool(data['enabled']))
+                logger.info(f"Instrumentation chemins chauds {'activée' if TIMINGS.enabled else 'désactivée'}")
+            if data.get('reset'):
+                TIMINGS.reset()
+        return jsonify({'status': 'success', 'data': TIMINGS.report()})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/debug/profile')
+@auth.login_required
+def debug_profile():
+    """
+    Profil par échantillonnage du processus en cours, format collapsed (flamegraph).
+    Paramètres : seconds (défaut 10), rate en Hz (défaut 50), threads=nom1,nom2 (préfixes)
+    """
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        rate = float(request.args.get('rate', 50))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Paramètres seconds/rate invalides'}), 400
+    threads = [t for t in request.args.get('threads', '').split(',') if t] or None
+
+    perf_cfg = monitor.config.get('perf', {}) if monitor else {}
+    profiler.max_seconds = perf_cfg.get('profile_max_seconds', 60)
+    profiler.max_rate = perf_cfg.get('profile_max_rate', 200)
+    try:
+        result = profiler.profile(seconds, rate, threads)
+    except ProfilerBusy as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+
+    logger.info(
+        f"Profil {result['seconds']}s : {result['samples']} échantillons à {result['rate']} Hz "
+        f"(surcoût {result['overhead'] * 100:.1f} %)"
+    )
+    response = Response(result['collapsed'], mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(result['samples'])
+    response.headers['X-Profile-Seconds'] = str(result['seconds'])
+    response.headers['X-Profile-Rate'] = str(result['rate'])
+    response.headers['X-Profile-Overhead'] = str(result['overhead'])
+    return response
+
+# /api/signal/history est public (graphique du tableau de bord) : réponse bornée
+SIGNAL_HISTORY_MAX_POINTS = 2000
+SIGNAL_HISTORY_MAX_SECONDS = 7 * 86400     # session authentifiée
+SIGNAL_HISTORY_PUBLIC_SECONDS = 3600       # visiteur anonyme
+
 @app.route('/api/signal/history')
 @limiter.exempt
 def get_signal_history():
-    """Retourne les 60 dernières secondes de niveau RF"""
+    """
+    Niveau RF récent (anneau mémoire). Par défaut les 120 dernières secondes ;
+    since=epoch ms pour ne recevoir que les nouveaux points, seconds=N,
+    points=N (réduction LTTB, au plus SIGNAL_HISTORY_MAX_POINTS), method=lttb|minmax.
+    Sans session, la fenêtre est limitée à SIGNAL_HISTORY_PUBLIC_SECONDS.
+    """
     if monitor:
-        return jsonify(monitor.get_signal_history())
+        try:
+            since = request.args.get('since', type=int)
+            seconds = float(request.args.get('seconds', 120))
+            points = int(request.args.get('points', SIGNAL_HISTORY_MAX_POINTS))
+        except ValueError:
+            return jsonify([]), 400
+        max_seconds = SIGNAL_HISTORY_MAX_SECONDS if 'logged_in' in session else SIGNAL_HISTORY_PUBLIC_SECONDS
+        seconds = min(seconds, max_seconds)
+        if since is not None:
+            since = max(since, int((time.time() - max_seconds) * 1000))
+        points = max(2, min(points, SIGNAL_HISTORY_MAX_POINTS))
+        method = request.args.get('method', 'lttb')
+        if method not in DOWNSAMPLE_METHODS:
+            return jsonify([]), 400
+        return jsonify(monitor.get_signal_history(since=since, seconds=seconds, points=points, method=method))
     return jsonify([])
 
 @app.route('/api/audio/history')
 @auth.login_required
 @limiter.exempt  # Exemption rate limiting pour historique appelé fréquemment
 def get_audio_history():
-    """Récupère l'historique des niveaux audio (24h)"""
+    """
+    Historique des niveaux audio, résolution choisie selon la plage et la largeur.
+    Paramètres : hours (défaut 24) ou start/end (epoch s), width (pixels, défaut 1000),
+    since (epoch ms) pour ne recevoir que les points postérieurs au dernier reçu,
+    points=N pour borner la réponse (LTTB sur level_db), method=lttb|minmax
+    """
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            try:
+                end = float(request.args.get('end', time.time()))
+                start = float(request.args.get('start', end - float(request.args.get('hours', 24)) * 3600))
+                if 'since' in request.args:
+                    start = (int(request.args['since']) + 1) / 1000
+                width = int(request.args.get('width', 1000))
+                points = request.args.get('points', type=int)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Paramètres de plage invalides'}), 400
+            method = request.args.get('method', 'lttb')
+            if method not in DOWNSAMPLE_METHODS:
+                return jsonify({'status': 'error', 'message': f'Méthode inconnue : {method}'}), 400
+            # Anneau mémoire pour la partie récente, base pour ce qui est plus ancien
+            resolution, history = monitor.get_level_history(int(start * 1000), int(end * 1000), width=width)
+            if points:
+                history = downsample_rows(history, max(3, points), method=method)
+            return jsonify({'status': 'success', 'resolution': resolution, 'data': history})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/history/metrics')
+@auth.login_required
+def get_metrics_history():
+    """
+    Séries MPX / RF persistées (blocs par minute).
+    Paramètres : fields=a,b (défaut : toutes), hours (défaut 1) ou start/end (epoch s),
+    points (défaut 2000) → moyenne sur des pas adaptés à la plage, ou
+    method=lttb|minmax pour retenir des points réels (pics conservés)
+    """
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            try:
+                end = float(request.args.get('end', time.time()))
+                start = float(request.args.get('start', end - float(request.args.get('hours', 1)) * 3600))
+                points = max(1, int(request.args.get('points', 2000)))
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Paramètres de plage invalides'}), 400
+            if end - start > 31 * 86400:
+                return jsonify({'status': 'error', 'message': 'Plage limitée à 31 jours'}), 400
+            fields = [f for f in request.args.get('fields', '').split(',') if f]
+            unknown = [f for f in fields if f not in metric_store.METRIC_FIELDS]
+            if unknown:
+                return jsonify({'status': 'error', 'message': f"Métriques inconnues : {', '.join(unknown)}"}), 400
+            method = request.args.get('method', 'mean')
+            if method != 'mean' and method not in DOWNSAMPLE_METHODS:
+                return jsonify({'status': 'error', 'message': f'Méthode inconnue : {method}'}), 400
+
+            step = None
+            if method == 'mean' and end - start > points:
+                step = max(1, int((end - start) // points) + 1)
+            start_ms, end_ms = int(start * 1000), int(end * 1000)
+            data = metric_store.read_range(
+                monitor.db.get_metric_blocks(start_ms, end_ms), start_ms, end_ms,
+                fields=fields or None, step_s=step,
+                points=max(3, points) if method != 'mean' else None,
+                method=method if method != 'mean' else None
+            )
+            data['step_s'] = step or 1
+            data['method'] = method
+            return jsonify({'status': 'success', 'data': data})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/export/<dataset>')
+@auth.login_required
+def export_dataset(dataset):
+    """
+    Export en flux CSV / NDJSON, sans limite de plage (mémoire constante).
+    dataset : levels, levels_1m|15m|1h, metrics, alerts, episodes, rds.
+    Paramètres : format=csv|ndjson, hours (défaut 24) ou start/end (epoch s),
+    fields=a,b (metrics), types=a,b (alerts, episodes), gzip=0 pour désactiver
+    la compression (appliquée si le client accepte gzip)
+    """
+    if not (monitor and hasattr(monitor, 'db')):
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    if dataset not in export.DATASETS:
+        return jsonify({'status': 'error', 'message': f'Jeu de données inconnu : {dataset}'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({'status': 'error', 'message': f'Format inconnu : {fmt}'}), 400
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - float(request.args.get('hours', 24)) * 3600))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Paramètres de plage invalides'}), 400
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    unknown = [f for f in fields or () if f not in metric_store.METRIC_FIELDS]
+    if unknown:
+        return jsonify({'status': 'error', 'message': f"Métriques inconnues : {', '.join(unknown)}"}), 400
+    types = [t for t in request.args.get('types', '').split(',') if t] or None
+
+    compress = request.args.get('gzip', '1') != '0' and 'gzip' in request.accept_encodings
+    filename = (f"fm_{dataset}_{datetime.fromtimestamp(start):%Y%m%d-%H%M}"
+                f"_{datetime.fromtimestamp(end):%Y%m%d-%H%M}.{fmt}")
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    logger.info(f"Export {dataset} ({fmt}{', gzip' if compress else ''}) "
+                f"{datetime.fromtimestamp(start)} → {datetime.fromtimestamp(end)}")
+    body = export.stream(monitor.db, dataset, fmt, int(start * 1000), int(end * 1000),
+                         fields=fields, types=types, compress=compress)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+@app.route('/api/notifications/outbox')
+@auth.login_required
+def get_notification_outbox():
+    """Suivi de livraison des notifications (file persistante), plus récentes d'abord"""
     try:
         if monitor and hasattr(monitor, 'db'):
-            history = monitor.db.get_audio_history(hours=24)
-            return jsonify({'status': 'success', 'data': history})
+            limit = min(int(request.args.get('limit', 50)), 500)
+            pending, next_due = monitor.db.get_outbox_pending()
+            return jsonify({
+                'status': 'success',
+                'pending': pending,
+                'next_attempt': datetime.fromtimestamp(next_due / 1000).isoformat(timespec='seconds')
+                    if next_due else None,
+                'data': monitor.db.get_outbox(limit=limit),
+            })
         return jsonify({'status': 'error', 'message': 'Database not available'}), 503
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/alerts/rules')
+@auth.login_required
+def get_alert_rules():
+    """Règles d'alerte compilées (intégrées + alerting.rules) et leur état courant"""
+    if not monitor:
+        return jsonify({'status': 'error', 'message': 'Monitor not running'}), 503
+    engine = monitor.alert_engine
+    return jsonify({
+        'status': 'success',
+        'metrics': list(engine.metrics),
+        'data': engine.describe(time.time()),
+    })
+
+@app.route('/api/alerts/baselines')
+@auth.login_required
+def get_alert_baselines():
+    """Lignes de base apprises : profil hebdomadaire (168 heures) par métrique"""
+    if not monitor:
+        return jsonify({'status': 'error', 'message': 'Monitor not running'}), 503
+    data = monitor.baselines.describe(time.time())
+    data.update(enabled=monitor.baseline_enabled, k=monitor.baseline_k)
+    return jsonify({'status': 'success', 'data': data})
+
 @app.route('/api/alerts/history')
 @auth.login_required
 def get_alerts_history():
@@ -552,6 +866,134 @@ def get_alerts_history_grouped():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/alerts/episodes/<int:episode_id>/flight')
+@auth.login_required
+def get_episode_flight_records(episode_id):
+    """Enregistrements de vol (10 Hz) autour de l'ouverture et de la fermeture d'un épisode"""
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            records = []
+            for r in monitor.db.get_flight_records(episode_id):
+                ts, series = flight_recorder.decode(r['start_ts'], r['fields'], r['ts_data'], r['data'])
+                records.append({
+                    'id':         r['id'],
+                    'alert_id':   r['alert_id'],
+                    'alert_type': r['alert_type'],
+                    'message':    r['message'],
+                    'event':      r['event'],
+                    'event_time': ms_to_iso(r['ts']),
+                    'event_ts':   r['ts'],
+                    'ts':         ts,
+                    'series':     series,
+                })
+            return jsonify({'status': 'success', 'data': records})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/alerts/episodes/<int:episode_id>/clips')
+@auth.login_required
+def get_episode_audio_clips(episode_id):
+    """Extraits audio MP3 autour de l'ouverture et de la fermeture d'un épisode"""
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            clips = [dict(c, event_time=ms_to_iso(c['ts']), url=f"/api/alerts/clips/{c['key']}")
+                     for c in monitor.db.get_episode_clips(episode_id)]
+            return jsonify({'status': 'success', 'data': clips})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/alerts/clips/<key>')
+@auth.login_required
+def get_audio_clip(key):
+    """Fichier MP3 d'un extrait audio d'alerte"""
+    from flask import send_file
+    if not (monitor and hasattr(monitor, 'db')):
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    clip = monitor.db.get_audio_clip(key)
+    if clip is None or not os.path.exists(clip['path']):
+        return jsonify({'status': 'error', 'message': 'Extrait audio introuvable'}), 404
+    return send_file(os.path.abspath(clip['path']), mimetype='audio/mpeg',
+                     download_name=f"{key}.mp3")
+
+@app.route('/api/db/retention', methods=['GET', 'POST'])
+@auth.login_required
+def db_retention():
+    """Politique de rétention et dernier rapport ; POST lance une passe immédiate"""
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            from database import RETENTION_DEFAULTS
+            last = monitor.run_retention() if request.method == 'POST' else monitor.last_retention
+            return jsonify({
+                'status': 'success',
+                'policy': dict(RETENTION_DEFAULTS, **monitor.retention_policy),
+                'interval_hours': monitor.retention_interval / 3600,
+                'last_run': last,
+            })
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/alerts/availability')
+@auth.login_required
+def get_alerts_availability():
+    """Disponibilité par type d'alerte sur les N dernières heures (défaut 24)"""
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            try:
+                hours = float(request.args.get('hours', 24))
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Paramètre hours invalide'}), 400
+            now = int(time.time() * 1000)
+            data = monitor.db.get_availability(now - int(hours * 3600 * 1000), now)
+            return jsonify({'status': 'success', 'hours': hours, 'data': data})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/reports/availability')
+@auth.login_required
+def get_availability_report():
+    """
+    Rapport de disponibilité (SLA) par jours civils, depuis les agrégats journaliers.
+    Paramètres : period=day|week|month|year (défaut month) et date=AAAA-MM-JJ
+    (défaut aujourd'hui), ou start/end=AAAA-MM-JJ (inclus)
+    """
+    try:
+        if monitor and hasattr(monitor, 'db'):
+            try:
+                if 'start' in request.args:
+                    first = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+                    last = datetime.strptime(request.args.get('end', request.args['start']), '%Y-%m-%d').date()
+                    period = 'custom'
+                else:
+                    ref = datetime.strptime(request.args['date'], '%Y-%m-%d').date() \
+                        if 'date' in request.args else datetime.now().date()
+                    period = request.args.get('period', 'month')
+                    if period == 'day':
+                        first = last = ref
+                    elif period == 'week':
+                        first = ref - timedelta(days=ref.weekday())
+                        last = first + timedelta(days=6)
+                    elif period == 'month':
+                        first = ref.replace(day=1)
+                        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                    elif period == 'year':
+                        first, last = ref.replace(month=1, day=1), ref.replace(month=12, day=31)
+                    else:
+                        return jsonify({'status': 'error', 'message': f'Période inconnue : {period}'}), 400
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Date invalide (AAAA-MM-JJ)'}), 400
+            if last < first or (last - first).days > 3660:
+                return jsonify({'status': 'error', 'message': 'Plage de dates invalide'}), 400
+            report = monitor.db.get_availability_report(first, last)
+            report['period'] = period
+            return jsonify({'status': 'success', 'data': report})
+        return jsonify({'status': 'error', 'message': 'Database not available'}), 503
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/webhook', methods=['GET', 'POST'])
 @auth.login_required
 def webhook_settings():
@@ -724,7 +1166,7 @@ def start_cleanup_scheduler():
         while True:
             time.sleep(600)  # 10 minutes
             cleanup_orphan_records()
-    t = threading.Thread(target=_loop, daemon=True)
+    t = threading.Thread(target=_loop, daemon=True, name='record-cleanup')
     t.start()
 
 @app.route('/api/record/start', methods=['POST'])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Anneau audio MP3 en mémoire : les dernières minutes du flux encodé.
+
+L'encodeur qui alimente Icecast écrit aussi, par son muxer tee (un seul
+encodage), dans la FIFO /tmp/fm_stream.mp3 lue par _stream_monitor. Chaque
+bloc lu est copié dans un tampon circulaire préalloué et daté à sa
+réception : à 128 kb/s, 5 minutes occupent ~5 Mo.
+
+clip() extrait les octets reçus entre deux instants et recale le début sur
+un en-tête de trame MP3 valide (le suivant est vérifié) : l'extrait est un
+fichier .mp3 lisible tel quel, sans réencodage.
+"""
+import threading
+from collections import deque
+
+# Débits Layer III (kb/s) par index : MPEG-1, puis MPEG-2 / 2.5
+_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _frame_length(data, i):
+    """Longueur de la trame MP3 (Layer III) commençant en i, None si l'en-tête est invalide"""
+    if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[i + 1] >> 3) & 0x03            # 3 : MPEG-1, 2 : MPEG-2, 0 : MPEG-2.5
+    layer = (data[i + 1] >> 1) & 0x03
+    br_index = data[i + 2] >> 4
+    sr_index = (data[i + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or br_index in (0, 15) or sr_index == 3:
+        return None
+    bitrate = _BITRATES[3 if version == 3 else 2][br_index] * 1000
+    rate = _RATES[version][sr_index]
+    padding = (data[i + 2] >> 1) & 0x01
+    return (144 if version == 3 else 72) * bitrate // rate + padding
+
+
+def frame_offset(data, limit=16384):
+    """Position du premier en-tête de trame suivi d'un second en-tête valide (0 à défaut)"""
+    for i in range(min(len(data) - 4, limit)):
+        n = _frame_length(data, i)
+        if n and i + n + 4 <= len(data) and _frame_length(data, i + n):
+            return i
+    return 0
+
+
+class AudioRing:
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._buf = bytearray(self.capacity)
+        self._total = 0             # octets écrits depuis la création
+        self._marks = deque()       # (réception epoch s, position absolue du bloc)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    def append(self, ts, chunk):
+        """Ajoute un bloc MP3 reçu à l'instant ts"""
+        if len(chunk) > self.capacity:
+            chunk = chunk[-self.capacity:]
+        n = len(chunk)
+        with self._lock:
+            pos = self._total % self.capacity
+            first = min(n, self.capacity - pos)
+            self._buf[pos:pos + first] = chunk[:first]
+            self._buf[:n - first] = chunk[first:]
+            self._marks.append((ts, self._total))
+            self._total += n
+            oldest = self._total - self.capacity
+            while self._marks and self._marks[0][1] < oldest:
+                self._marks.popleft()
+
+    def oldest_ts(self):
+        with self._lock:
+            return self._marks[0][0] if self._marks else None
+
+    def clip(self, start_ts, end_ts):
+        """
+        Octets reçus entre start_ts et end_ts (bornés à ce que l'anneau
+        contient), début recalé sur une trame. b'' si rien ne couvre la plage.
+        """
+        with self._lock:
+            begin = next((off for ts, off in self._marks if ts >= start_ts), None)
+            if begin is None:
+                return b''
+            end = next((off for ts, off in self._marks if ts > end_ts), self._total)
+            if end <= begin:
+                return b''
+            a, b = begin % self.capacity, end % self.capacity
+            if a < b:
+                data = bytes(self._buf[a:b])
+            else:
+                data = bytes(self._buf[a:]) + bytes(self._buf[:b])
+        return data[frame_offset(data):]
+
+    def clear(self):
+        with self._lock:
+            self._total = 0
+            self._marks.clear()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Lignes de base adaptatives par heure de la semaine.
+
+Pour chaque métrique suivie et chacune des 168 heures de la semaine (heure
+locale), le modèle tient une moyenne et une variance à pondération
+exponentielle : trois nombres par case, mis à jour en O(1) à chaque
+échantillon. La mémoire est exprimée en semaines : une case reçoit environ
+3600 échantillons par semaine (1 Hz) et oublie progressivement les plus
+anciens, ce qui suit les changements de grille sans réapprentissage.
+
+Une case n'est utilisée qu'une fois `min_samples` échantillons appris ; avant,
+les règles gardent leur seuil statique. L'écart-type renvoyé est borné par
+un plancher par métrique : un signal très régulier (musique fortement
+compressée) ne réduit pas la bande à zéro.
+
+Les cases modifiées sont marquées et écrites par lots (table `baselines`) ;
+le modèle est rechargé au démarrage.
+"""
+import time
+import numpy as np
+
+HOURS_OF_WEEK = 168
+
+# Métrique → plancher de l'écart-type (même unité que la métrique)
+BASELINE_METRICS = {
+    'level_std': 0.1,     # dB
+    'audio_snr': 1.0,     # dB
+    'mpx_power': 1.0,     # dBFS
+}
+
+
+def hour_of_week(ts):
+    """Case horaire locale : 0 = lundi 0 h … 167 = dimanche 23 h"""
+    t = time.localtime(ts)
+    return t.tm_wday * 24 + t.tm_hour
+
+
+class BaselineModel:
+
+    def __init__(self, metrics=BASELINE_METRICS, memory_weeks=4.0, min_samples=1800, rate=1.0):
+        self.metrics = tuple(metrics)
+        self.floors = np.array([float(metrics[m]) for m in self.metrics])
+        self._col = {m: j for j, m in enumerate(self.metrics)}
+        self.memory = max(1.0, float(memory_weeks) * 7 * 24 * 3600 * float(rate) / HOURS_OF_WEEK)
+        self.min_samples = int(min_samples)
+        shape = (len(self.metrics), HOURS_OF_WEEK)
+        self.n = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.var = np.zeros(shape)
+        self._dirty = set()
+
+    def add(self, ts, values, skip=()):
+        """Apprend un échantillon {métrique: valeur} ; None / NaN et `skip` ignorés"""
+        how = hour_of_week(ts)
+        for name, j in self._col.items():
+            x = values.get(name)
+            if x is None or x != x or name in skip:
+                continue
+            n = self.n[j, how] + 1.0
+            alpha = 1.0 / min(n, self.memory)
+            d = x - self.mean[j, how]
+            self.mean[j, how] += alpha * d
+            self.var[j, how] = (1.0 - alpha) * (self.var[j, how] + alpha * d * d)
+            self.n[j, how] = n
+            self._dirty.add((j, how))
+        return how
+
+    def band(self, metric, how):
+        """(moyenne, écart-type borné) de la case, None tant qu'elle n'est pas apprise"""
+        j = self._col.get(metric)
+        if j is None or self.n[j, how] < self.min_samples:
+            return None
+        return float(self.mean[j, how]), max(float(np.sqrt(self.var[j, how])), float(self.floors[j]))
+
+    def bands(self, ts):
+        """Bandes apprises de toutes les métriques pour l'heure de `ts`"""
+        how = hour_of_week(ts)
+        out = {}
+        for m in self.metrics:
+            b = self.band(m, how)
+            if b is not None:
+                out[m] = b
+        return out
+
+    def take_dirty(self):
+        """Lignes (metric, how, n, mean, var) modifiées depuis le dernier appel"""
+        rows = [(self.metrics[j], how, float(self.n[j, how]), float(self.mean[j, how]),
+                 float(self.var[j, how])) for j, how in sorted(self._dirty)]
+        self._dirty.clear()
+        return rows
+
+    def load(self, rows):
+        """Recharge des lignes (metric, how, n, mean, var) ; métriques inconnues ignorées"""
+        count = 0
+        for metric, how, n, mean, var in rows:
+            j = self._col.get(metric)
+            if j is None or not 0 <= how < HOURS_OF_WEEK:
+                continue
+            self.n[j, how], self.mean[j, how], self.var[j, how] = n, mean, var
+            count += 1
+        return count
+
+    def describe(self, ts):
+        """Profil hebdomadaire par métrique et case courante (API)"""
+        how = hour_of_week(ts)
+        std = np.maximum(np.sqrt(self.var), self.floors[:, None])
+        return {
+            'hour_of_week': how,
+            'min_samples':  self.min_samples,
+            'metrics': {m: {
+                'samples': self.n[j].round().astype(int).tolist(),
+                'mean':    np.round(self.mean[j], 3).tolist(),
+                'std':     np.round(std[j], 3).tolist(),
+                'current': self.band(m, how),
+            } for j, m in enumerate(self.metrics)},
+        }
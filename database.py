@@ -3,24 +3,177 @@
 Module de gestion de la base de données SQLite
 Enregistre l'historique des niveaux audio, alertes et RDS
 """
+import os
 import sqlite3
+import json
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime, timezone, timedelta
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# Tables d'agrégats de l'historique audio : (suffixe, durée du bucket en s)
+ROLLUPS = (('1m', 60), ('15m', 900), ('1h', 3600))
+
+# Tables partitionnées par jour UTC : base → (colonne temps, définition, colonnes).
+# Chaque jour est une table `<base>_AAAAMMJJ` ; la vue `<base>` les réunit.
+# La rétention supprime une journée entière par DROP TABLE, sans DELETE.
+DAY_MS = 86_400_000
+PARTITIONED = {
+    'audio_levels': (
+        'ts',
+        '(ts INTEGER PRIMARY KEY, level_db REAL NOT NULL, signal_ok INTEGER NOT NULL) WITHOUT ROWID',
+        'ts, level_db, signal_ok',
+    ),
+    'metric_blocks': (
+        'minute',
+        '(minute INTEGER PRIMARY KEY, interval_ms INTEGER NOT NULL, fields TEXT NOT NULL, data BLOB NOT NULL)',
+        'minute, interval_ms, fields, data',
+    ),
+}
+
+# Statut agrégé d'une alerte sur ses notifications : le premier présent l'emporte
+NOTIFY_STATUS_ORDER = ('pending', 'failed', 'expired', 'sent', 'skipped')
+
+# Rétention par défaut (jours, 0 = illimitée), surchargée par config.json → retention
+RETENTION_DEFAULTS = {
+    'raw_days':        7,     # audio_levels
+    'metrics_days':    30,    # metric_blocks
+    'rollup_1m_days':  30,
+    'rollup_15m_days': 400,
+    'rollup_1h_days':  0,
+    'alerts_days':     365,   # alerts + alert_episodes clos + flight_records
+    'rds_days':        30,    # rds_history
+    'clips_days':      30,    # audio_clips (et leurs fichiers MP3)
+}
+
+
+def day_of(ms):
+    """Jour UTC 'AAAAMMJJ' d'un horodatage epoch ms"""
+    return time.strftime('%Y%m%d', time.gmtime(ms // 1000))
+
+
+def day_start_ms(day):
+    return int(datetime.strptime(day, '%Y%m%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+# Épisodes d'alerte : type ouvrant → (type fermant, libellé affiché, sens du pic)
+# Le pic retient la valeur la plus basse (niveaux) ou la plus haute (déviation).
+EPISODE_TYPES = {
+    'signal_lost':    ('signal_restored',     'Perte émetteur',     'min'),
+    'no_modulation':  ('modulation_restored', 'Absence modulation', 'min'),
+    'rds_lost':       ('rds_restored',        'RDS absent',         'min'),
+    'rt_lost':        ('rt_restored',         'RadioText absent',   'min'),
+    'over_deviation': ('deviation_restored',  'Sur-déviation',      'max'),
+}
+EPISODE_CLOSERS = {v[0]: k for k, v in EPISODE_TYPES.items()}
+
+
+def register_episode_type(alert_type, restore_type, label, peak='min'):
+    """Déclare un type d'épisode (règle d'alerte) ; les types existants sont conservés"""
+    if alert_type not in EPISODE_TYPES:
+        EPISODE_TYPES[alert_type] = (restore_type, label, peak)
+        EPISODE_CLOSERS[restore_type] = alert_type
+
+
+def local_day_bounds(day):
+    """Début et fin (epoch ms) d'un jour civil local (date), changements d'heure compris"""
+    start = datetime.combine(day, datetime.min.time()).astimezone()
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time()).astimezone()
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def split_local_days(start_ms, end_ms):
+    """Découpe [start_ms, end_ms[ par jour civil local : [('AAAA-MM-JJ', durée ms), ...]"""
+    parts = []
+    day = datetime.fromtimestamp(start_ms / 1000).date()
+    while start_ms < end_ms:
+        _, day_end = local_day_bounds(day)
+        stop = min(day_end, end_ms)
+        parts.append((day.isoformat(), stop - start_ms))
+        start_ms = stop
+        day += timedelta(days=1)
+    return parts
+
+
+def now_ms():
+    """Instant courant en epoch millisecondes (format de stockage des horodatages)"""
+    return int(time.time() * 1000)
+
+
+def ms_to_iso(ms):
+    """Epoch ms UTC → ISO 8601 en heure locale avec décalage (conversion à la sortie API)"""
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).astimezone().isoformat(timespec='seconds')
+
+# Pragmas de la connexion d'écriture persistante (surchargés par config.json → database)
+WRITER_PRAGMAS = {
+    'synchronous':        'NORMAL',     # WAL : pas de fsync à chaque commit, seulement au checkpoint
+    'wal_autocheckpoint': 1000,         # pages (~4 Mo) avant checkpoint automatique
+    'mmap_size':          64 * 1024 * 1024,
+    'temp_store':         'MEMORY',
+    'busy_timeout':       5000,
+}
+
+
 class FMDatabase:
-    def __init__(self, db_path='fm_monitor.db'):
+    def __init__(self, db_path='fm_monitor.db', pragmas=None):
         """Initialise la base de données"""
         self.db_path = db_path
+        self.pragmas = dict(WRITER_PRAGMAS, **(pragmas or {}))
+        # Connexion d'écriture unique, ouverte à la demande et conservée
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        # Partitions journalières existantes : base → ensemble de jours 'AAAAMMJJ'
+        self._partitions = {base: set() for base in PARTITIONED}
         # Activer WAL mode pour éviter les locks
-        import sqlite3
         conn = sqlite3.connect(self.db_path)
         conn.execute('PRAGMA journal_mode=WAL')
         conn.execute('PRAGMA busy_timeout=5000')
         conn.close()
         self.init_database()
+
+    def _writer_connection(self):
+        """Connexion d'écriture persistante (à appeler sous _writer_lock)"""
+        if self._writer is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            for name, value in self.pragmas.items():
+                conn.execute(f'PRAGMA {name}={value}')
+            self._writer = conn
+            logger.info(
+                "Connexion d'écriture BDD ouverte ("
+                + ', '.join(f'{k}={v}' for k, v in self.pragmas.items()) + ")"
+            )
+        return self._writer
+
+    @contextmanager
+    def writer_transaction(self):
+        """Transaction unique sur la connexion d'écriture persistante"""
+        with self._writer_lock:
+            conn = self._writer_connection()
+            conn.execute('BEGIN')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                # Une partition créée dans la transaction annulée n'existe plus
+                self._load_partitions(conn)
+                raise
+
+    def close(self):
+        """Ferme la connexion d'écriture (un checkpoint est fait à la fermeture)"""
+        with self._writer_lock:
+            if self._writer is not None:
+                try:
+                    self._writer.close()
+                except Exception as e:
+                    logger.warning(f"Fermeture connexion BDD: {e}")
+                self._writer = None
     
     @contextmanager
     def get_connection(self):
@@ -38,107 +191,889 @@ class FMDatabase:
             conn.close()
     
     def init_database(self):
-        """Crée les tables si elles n'existent pas"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Table des niveaux audio (enregistrement toutes les 5s)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audio_levels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    level_db REAL NOT NULL,
-                    signal_ok BOOLEAN NOT NULL
-                )
-            ''')
-            
-            # Index pour les requêtes temporelles
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_audio_timestamp 
-                ON audio_levels(timestamp)
-            ''')
-            
-            # Table des alertes
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS alerts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    alert_type TEXT NOT NULL,
-                    level_db REAL,
-                    duration_seconds INTEGER,
-                    message TEXT,
-                    email_sent BOOLEAN DEFAULT 0
-                )
-            ''')
-            
-            # Table historique RDS (optionnel, pour analyse)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS rds_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    ps TEXT,
-                    rt TEXT
+        """
+        Crée ou met à jour le schéma. La version est suivie par PRAGMA
+        user_version ; chaque migration manquante est appliquée dans sa
+        propre transaction, dans l'ordre.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout=5000')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, migration in enumerate(self.MIGRATIONS, start=1):
+                if version >= target:
+                    continue
+                t0 = time.perf_counter()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    migration(self, conn)
+                    conn.execute(f'PRAGMA user_version={target}')
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    logger.error(f"Échec migration schéma BDD v{target}")
+                    raise
+                version = target
+                logger.info(f"Schéma BDD v{target} appliqué ({time.perf_counter() - t0:.2f}s)")
+            self._load_partitions(conn)
+            logger.info(f"Base de données initialisée (schéma v{version})")
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # PARTITIONS JOURNALIÈRES
+    # ------------------------------------------------------------------
+
+    def _load_partitions(self, conn):
+        for base in PARTITIONED:
+            rows = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                (f'{base}_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]',)
+            ).fetchall()
+            self._partitions[base] = {name[len(base) + 1:] for (name,) in rows}
+
+    def _rebuild_view(self, conn, base):
+        """Vue `<base>` = UNION ALL de toutes les partitions (requêtes ad hoc, compatibilité)"""
+        col, _, columns = PARTITIONED[base]
+        days = sorted(self._partitions[base])
+        conn.execute(f'DROP VIEW IF EXISTS {base}')
+        if days:
+            body = ' UNION ALL '.join(f'SELECT {columns} FROM {base}_{d}' for d in days)
+        else:
+            body = f'SELECT {", ".join("NULL AS " + c.strip() for c in columns.split(","))} WHERE 0'
+        conn.execute(f'CREATE VIEW {base} AS {body}')
+
+    def _ensure_partition(self, conn, base, day):
+        """Crée la partition du jour si besoin (sous transaction d'écriture)"""
+        if day in self._partitions[base]:
+            return
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {base}_{day} {PARTITIONED[base][1]}')
+        self._partitions[base].add(day)
+        self._rebuild_view(conn, base)
+
+    def _partition_union(self, base, start_ms, end_ms):
+        """Sous-requête sur les seules partitions qui recouvrent [start_ms, end_ms["""
+        _, _, columns = PARTITIONED[base]
+        days = [d for d in sorted(self._partitions[base])
+                if day_start_ms(d) < end_ms and day_start_ms(d) + DAY_MS > start_ms]
+        if not days:
+            return None
+        return ' UNION ALL '.join(f'SELECT {columns} FROM {base}_{d}' for d in days)
+
+    def _schema_v1(self, conn):
+        """Schéma historique : horodatages DATETIME texte"""
+        cursor = conn.cursor()
+
+        # Table des niveaux audio (enregistrement toutes les 5s)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS audio_levels (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                level_db REAL NOT NULL,
+                signal_ok BOOLEAN NOT NULL
+            )
+        ''')
+
+        # Index pour les requêtes temporelles
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_audio_timestamp
+            ON audio_levels(timestamp)
+        ''')
+
+        # Table des alertes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                alert_type TEXT NOT NULL,
+                level_db REAL,
+                duration_seconds INTEGER,
+                message TEXT,
+                email_sent BOOLEAN DEFAULT 0
+            )
+        ''')
+
+        # Table historique RDS (optionnel, pour analyse)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rds_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                ps TEXT,
+                rt TEXT
+            )
+        ''')
+
+        # Agrégats multi-résolution des niveaux audio, clé = début du bucket (epoch s)
+        for suffix, seconds in ROLLUPS:
+            table = f'audio_rollup_{suffix}'
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket INTEGER PRIMARY KEY,
+                    level_min REAL NOT NULL,
+                    level_max REAL NOT NULL,
+                    level_sum REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    ok_count INTEGER NOT NULL
                 )
             ''')
-            
-            logger.info("Base de données initialisée")
-    
+            # Première création : agrégats reconstruits depuis l'historique brut
+            if cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None:
+                cursor.execute(f'''
+                    INSERT INTO {table} (bucket, level_min, level_max, level_sum, count, ok_count)
+                    SELECT (CAST(strftime('%s', timestamp) AS INTEGER) / {seconds}) * {seconds},
+                           MIN(level_db), MAX(level_db), SUM(level_db), COUNT(*), SUM(signal_ok)
+                    FROM audio_levels
+                    GROUP BY 1
+                ''')
+                if cursor.rowcount > 0:
+                    logger.info(f"Agrégats {suffix} reconstruits : {cursor.rowcount} buckets")
+
+    def _schema_v2(self, conn):
+        """
+        Horodatages en epoch millisecondes UTC (colonne `ts`).
+        audio_levels devient une table WITHOUT ROWID groupée sur ts : plus
+        d'id ni d'index séparé, les plages et purges parcourent la clé.
+        Les anciens horodatages étaient UTC (CURRENT_TIMESTAMP) pour
+        audio_levels/rds_history et locaux pour alerts.
+        """
+        to_ms = "CAST(ROUND((julianday({}) - 2440587.5) * 86400000) AS INTEGER)"
+
+        conn.execute('''
+            CREATE TABLE audio_levels_v2 (
+                ts INTEGER PRIMARY KEY,
+                level_db REAL NOT NULL,
+                signal_ok INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'''
+            INSERT OR IGNORE INTO audio_levels_v2 (ts, level_db, signal_ok)
+            SELECT {to_ms.format('timestamp')}, level_db, signal_ok
+            FROM audio_levels WHERE timestamp IS NOT NULL
+        ''')
+        conn.execute('DROP TABLE audio_levels')
+        conn.execute('ALTER TABLE audio_levels_v2 RENAME TO audio_levels')
+
+        conn.execute('''
+            CREATE TABLE alerts_v2 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL,
+                alert_type TEXT NOT NULL,
+                level_db REAL,
+                duration_seconds INTEGER,
+                message TEXT,
+                email_sent INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute(f'''
+            INSERT INTO alerts_v2 (id, ts, alert_type, level_db, duration_seconds, message, email_sent)
+            SELECT id, {to_ms.format("timestamp, 'utc'")}, alert_type, level_db,
+                   duration_seconds, message, email_sent
+            FROM alerts WHERE timestamp IS NOT NULL
+        ''')
+        conn.execute('DROP TABLE alerts')
+        conn.execute('ALTER TABLE alerts_v2 RENAME TO alerts')
+        conn.execute('CREATE INDEX idx_alerts_ts ON alerts(ts)')
+
+        conn.execute('''
+            CREATE TABLE rds_history_v2 (
+                ts INTEGER NOT NULL,
+                ps TEXT,
+                rt TEXT
+            )
+        ''')
+        conn.execute(f'''
+            INSERT INTO rds_history_v2 (ts, ps, rt)
+            SELECT {to_ms.format('timestamp')}, ps, rt
+            FROM rds_history WHERE timestamp IS NOT NULL
+        ''')
+        conn.execute('DROP TABLE rds_history')
+        conn.execute('ALTER TABLE rds_history_v2 RENAME TO rds_history')
+        conn.execute('CREATE INDEX idx_rds_ts ON rds_history(ts)')
+
+        for suffix, _ in ROLLUPS:
+            conn.execute(f'UPDATE audio_rollup_{suffix} SET bucket = bucket * 1000')
+
+    def _schema_v3(self, conn):
+        """
+        Table alert_episodes : un épisode par perte, ouvert et fermé avec
+        les événements d'alerte. Reconstruite depuis la table alerts.
+        """
+        conn.execute('''
+            CREATE TABLE alert_episodes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER,
+                duration_s INTEGER,
+                level_start REAL,
+                level_end REAL,
+                peak REAL,
+                notifications INTEGER NOT NULL DEFAULT 0,
+                closed_by TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX idx_episodes_type_start ON alert_episodes(type, start_ts)')
+        conn.execute('CREATE INDEX idx_episodes_start ON alert_episodes(start_ts)')
+        conn.execute('CREATE INDEX idx_episodes_open ON alert_episodes(type) WHERE end_ts IS NULL')
+
+        rows = conn.execute('''
+            SELECT ts, alert_type, level_db, duration_seconds, email_sent
+            FROM alerts ORDER BY ts ASC, id ASC
+        ''').fetchall()
+        for ts, alert_type, level_db, duration_s, email_sent in rows:
+            self._apply_episode_event(conn, ts, alert_type, level_db, duration_s,
+                                      bool(email_sent), None, daily=False)
+        if rows:
+            count = conn.execute('SELECT COUNT(*) FROM alert_episodes').fetchone()[0]
+            logger.info(f"Épisodes d'alerte reconstruits : {count} depuis {len(rows)} événements")
+
+    def _schema_v4(self, conn):
+        """Blocs de métriques compressés, une ligne par minute (voir metric_store)"""
+        conn.execute('''
+            CREATE TABLE metric_blocks (
+                minute INTEGER PRIMARY KEY,
+                interval_ms INTEGER NOT NULL,
+                fields TEXT NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+
+    def _schema_v5(self, conn):
+        """
+        audio_levels et metric_blocks éclatées en partitions journalières
+        (UTC) réunies par une vue du même nom.
+        """
+        for base, (col, _, columns) in PARTITIONED.items():
+            days = [row[0] for row in conn.execute(
+                f'SELECT DISTINCT {col} / {DAY_MS} FROM {base} ORDER BY 1'
+            )]
+            for day_num in days:
+                day = day_of(day_num * DAY_MS)
+                conn.execute(f'CREATE TABLE {base}_{day} {PARTITIONED[base][1]}')
+                conn.execute(f'''
+                    INSERT INTO {base}_{day} ({columns})
+                    SELECT {columns} FROM {base} WHERE {col} >= ? AND {col} < ?
+                ''', (day_num * DAY_MS, (day_num + 1) * DAY_MS))
+            conn.execute(f'DROP TABLE {base}')
+            self._load_partitions(conn)
+            self._rebuild_view(conn, base)
+            if days:
+                logger.info(f"{base} : {len(days)} partition(s) journalière(s) créée(s)")
+
+    def _schema_v6(self, conn):
+        """
+        Agrégats journaliers de disponibilité (jour civil local × type
+        d'épisode), reconstruits depuis alert_episodes puis tenus à jour
+        à chaque ouverture / fermeture d'épisode.
+        """
+        conn.execute('''
+            CREATE TABLE availability_daily (
+                day TEXT NOT NULL,
+                type TEXT NOT NULL,
+                down_ms INTEGER NOT NULL DEFAULT 0,
+                episodes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, type)
+            ) WITHOUT ROWID
+        ''')
+        rows = conn.execute('SELECT type, start_ts, end_ts FROM alert_episodes').fetchall()
+        for ep_type, start_ts, end_ts in rows:
+            self._count_episode(conn, ep_type, start_ts)
+            if end_ts is not None:
+                self._add_downtime(conn, ep_type, start_ts, end_ts)
+        if rows:
+            logger.info(f"Disponibilité journalière reconstruite depuis {len(rows)} épisode(s)")
+
+    def _schema_v7(self, conn):
+        """File persistante des notifications et statut de livraison par alerte"""
+        conn.execute('''
+            CREATE TABLE notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_ts INTEGER NOT NULL,
+                alert_id INTEGER,
+                channel TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_ts INTEGER NOT NULL,
+                last_error TEXT,
+                sent_ts INTEGER
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX idx_outbox_due ON notification_outbox(next_attempt_ts)
+            WHERE status = 'pending'
+        ''')
+        conn.execute('CREATE INDEX idx_outbox_created ON notification_outbox(created_ts)')
+        conn.execute('ALTER TABLE alerts ADD COLUMN notify_status TEXT')
+
+    def _schema_v8(self, conn):
+        """Lignes de base apprises par métrique et heure de la semaine (baselines.py)"""
+        conn.execute('''
+            CREATE TABLE baselines (
+                metric TEXT NOT NULL,
+                how INTEGER NOT NULL,
+                n REAL NOT NULL,
+                mean REAL NOT NULL,
+                var REAL NOT NULL,
+                updated_ts INTEGER NOT NULL,
+                PRIMARY KEY (metric, how)
+            ) WITHOUT ROWID
+        ''')
+
+    def _schema_v9(self, conn):
+        """Épisode parent (cause racine) des alertes rattachées par corrélation"""
+        conn.execute('ALTER TABLE alert_episodes ADD COLUMN parent_id INTEGER')
+
+    def _schema_v10(self, conn):
+        """Enregistrements de l'enregistreur de vol autour des alertes (flight_recorder.py)"""
+        conn.execute('''
+            CREATE TABLE flight_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert_id INTEGER NOT NULL,
+                episode_id INTEGER,
+                event TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                fields TEXT NOT NULL,
+                ts_data BLOB NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX idx_flight_episode ON flight_records(episode_id)')
+        conn.execute('CREATE INDEX idx_flight_ts ON flight_records(ts)')
+
+    def _schema_v11(self, conn):
+        """Extraits audio MP3 autour des alertes (fichiers sur disque, audio_ring.py)"""
+        conn.execute('''
+            CREATE TABLE audio_clips (
+                key TEXT PRIMARY KEY,
+                alert_id INTEGER NOT NULL,
+                episode_id INTEGER,
+                ts INTEGER NOT NULL,
+                start_ts INTEGER NOT NULL,
+                end_ts INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX idx_clips_episode ON audio_clips(episode_id)')
+        conn.execute('CREATE INDEX idx_clips_ts ON audio_clips(ts)')
+
+    MIGRATIONS = (_schema_v1, _schema_v2, _schema_v3, _schema_v4, _schema_v5, _schema_v6,
+                  _schema_v7, _schema_v8, _schema_v9, _schema_v10, _schema_v11)
+
     def save_audio_level(self, level_db, signal_ok):
         """Enregistre un niveau audio"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO audio_levels (level_db, signal_ok)
-                    VALUES (?, ?)
-                ''', (level_db, signal_ok))
+            self.save_audio_levels([(time.time(), level_db, signal_ok)])
         except Exception as e:
             logger.error(f"Erreur sauvegarde niveau: {e}")
+
+    def save_audio_levels(self, rows):
+        """
+        Enregistre un lot de niveaux audio en une seule transaction et met
+        à jour les agrégats 1 min / 15 min / 1 h dans la même transaction.
+        rows : liste de (epoch_s, level_db, signal_ok).
+        Les erreurs sont propagées à l'appelant, qui conserve le lot.
+        """
+        raw = [(int(ts * 1000), level, 1 if ok else 0) for ts, level, ok in rows]
+        by_day = {}
+        for row in raw:
+            by_day.setdefault(day_of(row[0]), []).append(row)
+        with self.writer_transaction() as conn:
+            for day, day_rows in by_day.items():
+                self._ensure_partition(conn, 'audio_levels', day)
+                conn.executemany(f'''
+                    INSERT OR IGNORE INTO audio_levels_{day} (ts, level_db, signal_ok)
+                    VALUES (?, ?, ?)
+                ''', day_rows)
+            for suffix, seconds in ROLLUPS:
+                conn.executemany(f'''
+                    INSERT INTO audio_rollup_{suffix}
+                        (bucket, level_min, level_max, level_sum, count, ok_count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(bucket) DO UPDATE SET
+                        level_min = MIN(level_min, excluded.level_min),
+                        level_max = MAX(level_max, excluded.level_max),
+                        level_sum = level_sum + excluded.level_sum,
+                        count     = count + excluded.count,
+                        ok_count  = ok_count + excluded.ok_count
+                ''', self._aggregate(raw, seconds * 1000))
+
+    @staticmethod
+    def _aggregate(rows, step_ms):
+        """Pré-agrège un lot par bucket pour limiter le nombre d'upserts"""
+        buckets = {}
+        for ts, level, ok in rows:
+            b = ts // step_ms * step_ms
+            agg = buckets.get(b)
+            if agg is None:
+                buckets[b] = [level, level, level, 1, 1 if ok else 0]
+            else:
+                if level < agg[0]:
+                    agg[0] = level
+                if level > agg[1]:
+                    agg[1] = level
+                agg[2] += level
+                agg[3] += 1
+                agg[4] += 1 if ok else 0
+        return [(b, *agg) for b, agg in buckets.items()]
     
-    def save_alert(self, alert_type, level_db, duration_seconds, message, email_sent=False):
-        """Enregistre une alerte"""
+    def save_alert(self, alert_type, level_db, duration_seconds, message, email_sent=False,
+                   peak=None, notify=None, parent_type=None, children=(), ts=None, onset=None):
+        """
+        Enregistre une alerte et ouvre/ferme l'épisode correspondant dans la
+        même transaction. `ts` : instant de l'événement (epoch ms, défaut :
+        maintenant) ; `onset` : début du dépassement, date d'ouverture de
+        l'épisode (défaut : ts). `peak` : valeur suivie par l'épisode si ce
+        n'est pas level_db (ex : déviation en kHz pour over_deviation).
+        `parent_type` : type de l'épisode cause racine auquel rattacher
+        l'épisode ouvert ; `children` : types des épisodes ouverts (rattachés
+        avant que la cause ne soit elle-même en alerte) à adopter.
+        `notify` : {'channel', 'kind', 'payload', 'delay_ms'}, ou une liste de
+        ces dicts, met les notifications en file (notification_outbox) dans
+        cette même transaction.
+        Retourne l'id de l'alerte (None en cas d'erreur).
+        """
+        if isinstance(notify, dict):
+            notify = [notify]
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO alerts (timestamp, alert_type, level_db, duration_seconds, message, email_sent)
-                    VALUES (datetime('now', 'localtime'), ?, ?, ?, ?, ?)
-                ''', (alert_type, level_db, duration_seconds, message, email_sent))
+            now = now_ms()
+            if ts is None:
+                ts = now
+            with self.writer_transaction() as conn:
+                alert_id = conn.execute('''
+                    INSERT INTO alerts (ts, alert_type, level_db, duration_seconds, message, email_sent,
+                                        notify_status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (ts, alert_type, level_db, duration_seconds, message, email_sent,
+                      'pending' if notify else None)).lastrowid
+                self._apply_episode_event(conn, ts, alert_type, level_db, duration_seconds,
+                                          email_sent, peak, parent_type=parent_type, children=children,
+                                          onset=onset)
+                conn.executemany('''
+                    INSERT INTO notification_outbox (created_ts, alert_id, channel, kind, payload,
+                                                     next_attempt_ts)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [(now, alert_id, n.get('channel', 'email'), n.get('kind', 'alert'),
+                       json.dumps(n.get('payload', {}), ensure_ascii=False),
+                       now + int(n.get('delay_ms', 0))) for n in notify or ()])
                 logger.info(f"Alerte enregistrée: {alert_type}")
+            return alert_id
         except Exception as e:
             logger.error(f"Erreur sauvegarde alerte: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # FILE DE NOTIFICATIONS
+    # ------------------------------------------------------------------
+
+    def get_due_notifications(self, now, limit=20):
+        """Notifications en attente dont l'échéance est passée, plus anciennes d'abord"""
+        with self.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT id, created_ts, alert_id, channel, kind, payload, attempts, next_attempt_ts
+                FROM notification_outbox
+                WHERE status = 'pending' AND next_attempt_ts <= ?
+                ORDER BY next_attempt_ts, id
+                LIMIT ?
+            ''', (now, limit)).fetchall()
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+    def get_outbox_pending(self):
+        """(nombre en attente, prochaine échéance epoch ms ou None)"""
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT COUNT(*), MIN(next_attempt_ts) FROM notification_outbox WHERE status = 'pending'
+            ''').fetchone()
+        return row[0], row[1]
+
+    def mark_notification(self, notification_id, status, attempts=None, error=None,
+                          next_attempt_ts=None):
+        """
+        Met à jour une notification ; un statut final (sent, skipped, failed,
+        expired) est reporté sur l'alerte, et un envoi réussi compte une
+        notification de plus sur l'épisode de l'alerte. Le statut de l'alerte
+        agrège tous ses canaux (NOTIFY_STATUS_ORDER : un échec n'est jamais
+        masqué par un autre canal réussi) ; email_sent ne concerne que l'email.
+        """
+        ts = now_ms()
+        with self.writer_transaction() as conn:
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = ?, attempts = COALESCE(?, attempts), last_error = ?,
+                    next_attempt_ts = COALESCE(?, next_attempt_ts),
+                    sent_ts = CASE WHEN ? = 'sent' THEN ? ELSE sent_ts END
+                WHERE id = ?
+            ''', (status, attempts, error, next_attempt_ts, status, ts, notification_id))
+            if status == 'pending':
+                return
+            alert = conn.execute('''
+                SELECT a.id, a.ts, a.alert_type, o.channel FROM notification_outbox o
+                JOIN alerts a ON a.id = o.alert_id WHERE o.id = ?
+            ''', (notification_id,)).fetchone()
+            if alert is None:
+                return
+            alert_id, alert_ts, alert_type, channel = alert
+            statuses = {row[0] for row in conn.execute(
+                'SELECT status FROM notification_outbox WHERE alert_id = ?', (alert_id,))}
+            aggregate = next(s for s in NOTIFY_STATUS_ORDER if s in statuses)
+            conn.execute('''
+                UPDATE alerts SET notify_status = ?, email_sent = email_sent OR ? WHERE id = ?
+            ''', (aggregate, channel == 'email' and status == 'sent', alert_id))
+            if status == 'sent':
+                conn.execute('''
+                    UPDATE alert_episodes SET notifications = notifications + 1
+                    WHERE type = ? AND start_ts <= ? AND (end_ts IS NULL OR end_ts >= ?)
+                ''', (EPISODE_CLOSERS.get(alert_type, alert_type), alert_ts, alert_ts))
+
+    def get_outbox(self, limit=50):
+        """Dernières notifications (suivi de livraison)"""
+        with self.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT o.id, o.created_ts, o.alert_id, o.channel, o.kind, o.payload, o.status,
+                       o.attempts, o.next_attempt_ts, o.last_error, o.sent_ts, a.alert_type
+                FROM notification_outbox o LEFT JOIN alerts a ON a.id = o.alert_id
+                ORDER BY o.id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [
+            dict(row,
+                 payload=json.loads(row['payload']),
+                 created=ms_to_iso(row['created_ts']),
+                 next_attempt=ms_to_iso(row['next_attempt_ts']) if row['status'] == 'pending' else None,
+                 sent=ms_to_iso(row['sent_ts']))
+            for row in rows
+        ]
+
+    @staticmethod
+    def _count_episode(conn, ep_type, start_ts):
+        """Compte un épisode (défaillance) sur son jour de début"""
+        conn.execute('''
+            INSERT INTO availability_daily (day, type, episodes) VALUES (?, ?, 1)
+            ON CONFLICT (day, type) DO UPDATE SET episodes = episodes + 1
+        ''', (datetime.fromtimestamp(start_ts / 1000).date().isoformat(), ep_type))
+
+    @staticmethod
+    def _add_downtime(conn, ep_type, start_ts, end_ts):
+        """Ventile la durée d'un épisode clos sur les jours qu'il recouvre"""
+        for day, down_ms in split_local_days(start_ts, end_ts):
+            conn.execute('''
+                INSERT INTO availability_daily (day, type, down_ms) VALUES (?, ?, ?)
+                ON CONFLICT (day, type) DO UPDATE SET down_ms = down_ms + excluded.down_ms
+            ''', (day, ep_type, down_ms))
+
+    @classmethod
+    def _apply_episode_event(cls, conn, ts, alert_type, level_db, duration_s, email_sent, peak,
+                             daily=True, parent_type=None, children=(), onset=None):
+        """
+        Ouvre ou ferme un épisode selon le type d'événement ; `daily` tient
+        à jour availability_daily dans la même transaction. L'épisode est
+        daté de `onset` (début du dépassement) s'il est connu, sinon de `ts`.
+        À l'ouverture, l'épisode est rattaché à l'épisode ouvert de
+        `parent_type` et adopte les épisodes ouverts de `children` qui n'ont
+        pas encore de parent.
+        """
+        ep_type = EPISODE_CLOSERS.get(alert_type, alert_type)
+        value = peak
+        if value is None and EPISODE_TYPES.get(ep_type, ('', '', 'min'))[2] == 'min':
+            value = level_db
+        notified = 1 if email_sent else 0
+
+        if alert_type in EPISODE_TYPES:
+            open_ep = conn.execute(
+                'SELECT id FROM alert_episodes WHERE type = ? AND end_ts IS NULL',
+                (alert_type,)
+            ).fetchone()
+            if open_ep:
+                # Événement répété pendant un épisode ouvert : simple notification de plus
+                conn.execute('''
+                    UPDATE alert_episodes SET notifications = notifications + ? WHERE id = ?
+                ''', (notified, open_ep[0]))
+                return
+            parent = conn.execute(
+                'SELECT id FROM alert_episodes WHERE type = ? AND end_ts IS NULL',
+                (parent_type,)
+            ).fetchone() if parent_type else None
+            # parent_id (schéma v9) seulement s'il y a un parent : la reconstruction
+            # des épisodes de la migration v3 s'exécute sur l'ancien schéma
+            start_ts = ts if onset is None else onset
+            columns = 'type, start_ts, level_start, peak, notifications'
+            values = (alert_type, start_ts, level_db, value, notified)
+            if parent:
+                columns, values = columns + ', parent_id', values + (parent[0],)
+            ep_id = conn.execute(f'''
+                INSERT INTO alert_episodes ({columns}) VALUES ({', '.join('?' * len(values))})
+            ''', values).lastrowid
+            if children:
+                conn.execute(f'''
+                    UPDATE alert_episodes SET parent_id = ?
+                    WHERE end_ts IS NULL AND parent_id IS NULL
+                      AND type IN ({','.join('?' * len(children))})
+                ''', (ep_id, *children))
+            if daily:
+                cls._count_episode(conn, alert_type, start_ts)
+
+        elif alert_type in EPISODE_CLOSERS:
+            pick = 'MIN' if EPISODE_TYPES[ep_type][2] == 'min' else 'MAX'
+            opened = conn.execute(
+                'SELECT start_ts FROM alert_episodes WHERE type = ? AND end_ts IS NULL',
+                (ep_type,)
+            ).fetchall() if daily else []
+            cur = conn.execute(f'''
+                UPDATE alert_episodes
+                SET end_ts = ?, duration_s = (? - start_ts) / 1000, level_end = ?,
+                    peak = CASE WHEN ? IS NULL THEN peak
+                                WHEN peak IS NULL THEN ?
+                                ELSE {pick}(peak, ?) END,
+                    notifications = notifications + ?, closed_by = 'restored'
+                WHERE type = ? AND end_ts IS NULL
+            ''', (ts, ts, level_db, value, value, value, notified, ep_type))
+            if cur.rowcount == 0:
+                # Rétablissement sans perte enregistrée : épisode reconstitué par sa durée
+                duration_s = int(duration_s or 0)
+                start_ts = ts - duration_s * 1000 if onset is None else onset
+                conn.execute('''
+                    INSERT INTO alert_episodes (type, start_ts, end_ts, duration_s, level_start,
+                                                level_end, peak, notifications, closed_by)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'orphan')
+                ''', (ep_type, start_ts, ts, duration_s, level_db, level_db,
+                      value, notified))
+                if daily:
+                    cls._count_episode(conn, ep_type, start_ts)
+                    opened = [(start_ts,)]
+            for (start_ts,) in opened:
+                cls._add_downtime(conn, ep_type, start_ts, ts)
     
+    def save_metric_block(self, minute, interval_ms, fields, data):
+        """Enregistre (ou remplace) le bloc de métriques d'une minute"""
+        day = day_of(minute)
+        with self.writer_transaction() as conn:
+            self._ensure_partition(conn, 'metric_blocks', day)
+            conn.execute(f'''
+                INSERT OR REPLACE INTO metric_blocks_{day} (minute, interval_ms, fields, data)
+                VALUES (?, ?, ?, ?)
+            ''', (minute, interval_ms, fields, data))
+
+    def get_metric_blocks(self, start_ms, end_ms):
+        """Blocs de métriques couvrant [start_ms, end_ms[ en ordre chronologique"""
+        union = self._partition_union('metric_blocks', start_ms - 60000, end_ms)
+        if union is None:
+            return []
+        try:
+            with self.get_connection() as conn:
+                return [tuple(row) for row in conn.execute(f'''
+                    SELECT minute, interval_ms, fields, data
+                    FROM ({union})
+                    WHERE minute > ? AND minute < ?
+                    ORDER BY minute ASC
+                ''', (start_ms - 60000, end_ms))]
+        except Exception as e:
+            logger.error(f"Erreur lecture blocs métriques: {e}")
+            return []
+
+    def save_flight_record(self, alert_id, start_ts, end_ts, fields, ts_data, data):
+        """
+        Enregistre la fenêtre de l'enregistreur de vol d'une alerte, rattachée
+        à l'épisode que l'alerte a ouvert ou fermé.
+        """
+        with self.writer_transaction() as conn:
+            alert = self._alert_episode(conn, alert_id)
+            if alert is None:
+                return None
+            ts, alert_type, episode_id = alert
+            return conn.execute('''
+                INSERT INTO flight_records (alert_id, episode_id, event, ts, start_ts, end_ts,
+                                            fields, ts_data, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (alert_id, episode_id, 'close' if alert_type in EPISODE_CLOSERS else 'open',
+                  ts, start_ts, end_ts, fields, ts_data, data)).lastrowid
+
+    @staticmethod
+    def _alert_episode(conn, alert_id):
+        """(ts, type, id de l'épisode ouvert ou fermé) d'une alerte, None si elle n'existe plus"""
+        alert = conn.execute('SELECT ts, alert_type FROM alerts WHERE id = ?', (alert_id,)).fetchone()
+        if alert is None:
+            return None
+        ts, alert_type = alert
+        episode = conn.execute('''
+            SELECT id FROM alert_episodes WHERE type = ? AND start_ts <= ?
+            ORDER BY start_ts DESC LIMIT 1
+        ''', (EPISODE_CLOSERS.get(alert_type, alert_type), ts)).fetchone()
+        return ts, alert_type, episode and episode[0]
+
+    def save_audio_clip(self, key, alert_id, start_ts, end_ts, path, size):
+        """Référence l'extrait audio (déjà écrit sur disque) d'une alerte et de son épisode"""
+        with self.writer_transaction() as conn:
+            alert = self._alert_episode(conn, alert_id)
+            if alert is None:
+                return False
+            ts, _, episode_id = alert
+            conn.execute('''
+                INSERT OR REPLACE INTO audio_clips (key, alert_id, episode_id, ts, start_ts, end_ts,
+                                                    path, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, alert_id, episode_id, ts, start_ts, end_ts, path, size))
+            return True
+
+    def get_audio_clip(self, key):
+        """Extrait audio par clé (dict) ou None"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute('SELECT * FROM audio_clips WHERE key = ?', (key,)).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Erreur lecture extrait audio: {e}")
+            return None
+
+    def get_episode_clips(self, episode_id):
+        """Extraits audio d'un épisode (ouverture puis fermeture)"""
+        try:
+            with self.get_connection() as conn:
+                return [dict(row) for row in conn.execute('''
+                    SELECT c.key, c.alert_id, c.ts, c.start_ts, c.end_ts, c.size, a.alert_type
+                    FROM audio_clips c JOIN alerts a ON a.id = c.alert_id
+                    WHERE c.episode_id = ?
+                    ORDER BY c.ts
+                ''', (episode_id,))]
+        except Exception as e:
+            logger.error(f"Erreur lecture extraits audio: {e}")
+            return []
+
+    def get_flight_records(self, episode_id):
+        """Enregistrements de vol d'un épisode (ouverture puis fermeture)"""
+        try:
+            with self.get_connection() as conn:
+                return [dict(row) for row in conn.execute('''
+                    SELECT f.id, f.alert_id, f.event, f.ts, f.start_ts, f.end_ts, f.fields,
+                           f.ts_data, f.data, a.alert_type, a.message
+                    FROM flight_records f JOIN alerts a ON a.id = f.alert_id
+                    WHERE f.episode_id = ?
+                    ORDER BY f.ts, f.id
+                ''', (episode_id,))]
+        except Exception as e:
+            logger.error(f"Erreur lecture enregistrements de vol: {e}")
+            return []
+
+    def save_baselines(self, rows):
+        """Écrit les cases de lignes de base modifiées : (metric, how, n, mean, var)"""
+        ts = now_ms()
+        with self.writer_transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO baselines (metric, how, n, mean, var, updated_ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [row + (ts,) for row in rows])
+
+    def get_baselines(self):
+        """Toutes les cases de lignes de base : liste de (metric, how, n, mean, var)"""
+        try:
+            with self.get_connection() as conn:
+                return [tuple(row) for row in conn.execute(
+                    'SELECT metric, how, n, mean, var FROM baselines'
+                )]
+        except Exception as e:
+            logger.error(f"Erreur lecture lignes de base: {e}")
+            return []
+
     def save_rds(self, ps, rt):
         """Enregistre les données RDS (optionnel)"""
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO rds_history (ps, rt)
-                    VALUES (?, ?)
-                ''', (ps, rt))
+            with self.writer_transaction() as conn:
+                conn.execute('''
+                    INSERT INTO rds_history (ts, ps, rt)
+                    VALUES (?, ?, ?)
+                ''', (now_ms(), ps, rt))
         except Exception as e:
             logger.error(f"Erreur sauvegarde RDS: {e}")
     
     def get_audio_history(self, hours=24):
         """Récupère l'historique des niveaux audio"""
+        now = now_ms()
+        since = now - int(hours * 3600 * 1000)
+        union = self._partition_union('audio_levels', since, now + DAY_MS)
+        if union is None:
+            return []
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                since = datetime.now() - timedelta(hours=hours)
-                
-                cursor.execute('''
-                    SELECT timestamp, level_db, signal_ok
-                    FROM audio_levels
-                    WHERE timestamp >= ?
-                    ORDER BY timestamp ASC
+                cursor.execute(f'''
+                    SELECT ts, level_db, signal_ok
+                    FROM ({union})
+                    WHERE ts >= ?
+                    ORDER BY ts ASC
                 ''', (since,))
-                
-                return [dict(row) for row in cursor.fetchall()]
+
+                return [self._audio_row(row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"Erreur récupération historique: {e}")
             return []
     
+    @staticmethod
+    def _audio_row(row):
+        return {
+            'ts':        row['ts'],
+            'timestamp': ms_to_iso(row['ts']),
+            'level_db':  row['level_db'],
+            'signal_ok': bool(row['signal_ok']),
+        }
+
+    def get_audio_history_range(self, start, end, width=1000, raw_interval=5):
+        """
+        Historique audio entre deux instants (epoch s) à la résolution adaptée.
+
+        Choisit la résolution la plus fine (brut, 1 min, 15 min, 1 h) qui
+        donne au plus 2 × `width` points sur la plage — deux points par pixel
+        suffisent au tracé min/max — et retourne (résolution, points).
+        Chaque point agrégé porte min/max/moyenne et le taux de signal_ok.
+        """
+        span = max(1, end - start)
+        budget = max(1, int(width)) * 2
+        resolutions = [('raw', raw_interval)] + list(ROLLUPS)
+        resolution, seconds = resolutions[-1]
+        for name, step in resolutions:
+            if span / step <= budget:
+                resolution, seconds = name, step
+                break
+
+        try:
+            with self.get_connection() as conn:
+                if resolution == 'raw':
+                    union = self._partition_union('audio_levels', int(start * 1000), int(end * 1000))
+                    if union is None:
+                        return resolution, []
+                    rows = conn.execute(f'''
+                        SELECT ts, level_db, signal_ok
+                        FROM ({union})
+                        WHERE ts >= ? AND ts < ?
+                        ORDER BY ts ASC
+                    ''', (int(start * 1000), int(end * 1000))).fetchall()
+                    return resolution, [self._audio_row(row) for row in rows]
+
+                step = seconds * 1000
+                rows = conn.execute(f'''
+                    SELECT bucket, level_min, level_max, level_sum, count, ok_count
+                    FROM audio_rollup_{resolution}
+                    WHERE bucket >= ? AND bucket < ?
+                    ORDER BY bucket ASC
+                ''', (int(start * 1000) // step * step, int(end * 1000))).fetchall()
+                return resolution, [
+                    {
+                        'ts':              r['bucket'],
+                        'timestamp':       ms_to_iso(r['bucket']),
+                        'level_db':        r['level_sum'] / r['count'],
+                        'level_min':       r['level_min'],
+                        'level_max':       r['level_max'],
+                        'signal_ok':       r['ok_count'] * 2 >= r['count'],
+                        'signal_ok_ratio': r['ok_count'] / r['count'],
+                        'count':           r['count'],
+                    }
+                    for r in rows
+                ]
+        except Exception as e:
+            logger.error(f"Erreur récupération historique ({resolution}): {e}")
+            return resolution, []
+
     def get_alerts_history(self, limit=50):
         """Récupère l'historique des alertes"""
         try:
@@ -146,174 +1081,379 @@ class FMDatabase:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
-                    SELECT timestamp, alert_type, level_db, duration_seconds, message, email_sent
+                    SELECT ts, alert_type, level_db, duration_seconds, message, email_sent, notify_status
                     FROM alerts
-                    ORDER BY timestamp DESC
+                    ORDER BY ts DESC, id DESC
                     LIMIT ?
                 ''', (limit,))
-                
-                return [dict(row) for row in cursor.fetchall()]
+
+                return [
+                    dict(row, timestamp=ms_to_iso(row['ts']), email_sent=bool(row['email_sent']))
+                    for row in cursor.fetchall()
+                ]
         except Exception as e:
             logger.error(f"Erreur récupération alertes: {e}")
             return []
     
     def get_alerts_history_grouped(self, limit=50):
-        """Récupère l'historique des alertes regroupées par paires (perte + retour)"""
-
-        # Correspondance type_perte → type_retour + libellé affiché
-        ALERT_PAIRS = {
-            'signal_lost':   ('signal_restored',      'Perte émetteur'),
-            'no_modulation': ('modulation_restored',  'Absence modulation'),
-            'rds_lost':      ('rds_restored',         'RDS absent'),
-            'rt_lost':       ('rt_restored',          'RadioText absent'),
-        }
-        RESTORE_TYPES = {v[0]: k for k, v in ALERT_PAIRS.items()}
-
+        """Récupère l'historique des alertes regroupées par épisode (perte + retour)"""
         try:
+            now = now_ms()
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                cursor.execute('''
-                    SELECT timestamp, alert_type, level_db, duration_seconds, message, email_sent
-                    FROM alerts
-                    ORDER BY timestamp DESC
+                rows = conn.execute('''
+                    SELECT id, type, start_ts, end_ts, duration_s, level_start, level_end,
+                           peak, notifications, closed_by, parent_id
+                    FROM alert_episodes
+                    ORDER BY start_ts DESC
                     LIMIT ?
-                ''', (limit * 3,))
-
-                alerts = [dict(row) for row in cursor.fetchall()]
-
-                grouped = []
-                i = 0
-
-                while i < len(alerts):
-                    alert = alerts[i]
-                    atype = alert['alert_type']
-
-                    # --- Cas rétablissement : chercher la perte correspondante ---
-                    if atype in RESTORE_TYPES:
-                        lost_type = RESTORE_TYPES[atype]
-                        label = ALERT_PAIRS[lost_type][1]
-                        lost_alert = None
-
-                        if i + 1 < len(alerts) and alerts[i + 1]['alert_type'] == lost_type:
-                            lost_alert = alerts[i + 1]
-                            i += 2
-                        else:
-                            grouped.append({
-                                'alert_label': label,
-                                'start_time': alert['timestamp'],
-                                'end_time': alert['timestamp'],
-                                'duration': alert['duration_seconds'] or 0,
-                                'level_lost': alert['level_db'],
-                                'level_restored': alert['level_db'],
-                                'emails_sent': 1 if alert['email_sent'] else 0,
-                                'status': 'restored_only'
-                            })
-                            i += 1
-                            continue
-
-                        grouped.append({
-                            'alert_label': label,
-                            'start_time': lost_alert['timestamp'],
-                            'end_time': alert['timestamp'],
-                            'duration': int((datetime.fromisoformat(alert['timestamp']) - datetime.fromisoformat(lost_alert['timestamp'])).total_seconds()),
-                            'level_lost': lost_alert['level_db'],
-                            'level_restored': alert['level_db'],
-                            'emails_sent': (1 if lost_alert['email_sent'] else 0) + (1 if alert['email_sent'] else 0),
-                            'status': 'complete'
-                        })
-
-                    # --- Cas perte sans rétablissement ---
-                    elif atype in ALERT_PAIRS:
-                        label = ALERT_PAIRS[atype][1]
-                        grouped.append({
-                            'alert_label': label,
-                            'start_time': alert['timestamp'],
-                            'end_time': None,
-                            'duration': alert['duration_seconds'] or 0,
-                            'level_lost': alert['level_db'],
-                            'level_restored': None,
-                            'emails_sent': 1 if alert['email_sent'] else 0,
-                            'status': 'ongoing'
-                        })
-                        i += 1
-
-                    else:
-                        i += 1
-
-                return grouped[:limit]
+                ''', (limit,)).fetchall()
+
+            grouped = []
+            for r in rows:
+                if r['end_ts'] is None:
+                    status = 'ongoing'
+                    duration = (now - r['start_ts']) // 1000
+                else:
+                    status = 'restored_only' if r['closed_by'] == 'orphan' else 'complete'
+                    duration = r['duration_s'] or 0
+                grouped.append({
+                    'id':             r['id'],
+                    'parent_id':      r['parent_id'],
+                    'alert_type':     r['type'],
+                    'alert_label':    EPISODE_TYPES.get(r['type'], (None, r['type']))[1],
+                    'start_time':     ms_to_iso(r['start_ts']),
+                    'end_time':       ms_to_iso(r['end_ts']),
+                    'duration':       duration,
+                    'level_lost':     r['level_start'],
+                    'level_restored': r['level_end'],
+                    'peak':           r['peak'],
+                    'emails_sent':    r['notifications'],
+                    'status':         status,
+                })
+            return grouped
 
         except Exception as e:
             logger.error(f"Erreur récupération alertes groupées: {e}")
             return []
-    
 
-    def close_open_alerts(self):
+    def get_open_episodes(self):
+        """Épisodes en cours (index partiel sur end_ts IS NULL)"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, type, start_ts, level_start, peak, notifications, parent_id
+                    FROM alert_episodes WHERE end_ts IS NULL
+                ''').fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Erreur récupération épisodes ouverts: {e}")
+            return []
+
+    def get_availability(self, since_ms, until_ms=None):
         """
-        Clôture les alertes ouvertes au redémarrage du service.
-        Insère un événement _restored pour chaque alerte _lost sans rétablissement.
+        Temps cumulé en défaut par type d'épisode sur [since_ms, until_ms],
+        épisodes à cheval sur les bornes tronqués. Une seule requête indexée.
+        Retourne {type: {'episodes', 'down_seconds', 'availability'}}.
         """
-        ALERT_PAIRS = {
-            'signal_lost':   'signal_restored',
-            'no_modulation': 'modulation_restored',
-            'rds_lost':      'rds_restored',
-        }
+        until_ms = until_ms or now_ms()
+        span = max(1, until_ms - since_ms)
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT timestamp, alert_type, level_db
-                    FROM alerts
-                    ORDER BY timestamp DESC
-                    LIMIT 100
-                ''')
-                alerts = [dict(row) for row in cursor.fetchall()]
-
-                # Chercher les alertes ouvertes (lost sans restored qui suit)
-                closed = 0
-                for i, alert in enumerate(alerts):
-                    atype = alert['alert_type']
-                    if atype not in ALERT_PAIRS:
-                        continue
-                    restore_type = ALERT_PAIRS[atype]
-                    # Vérifier si un restored existe après (= plus tôt dans la liste DESC)
-                    already_restored = any(
-                        a['alert_type'] == restore_type
-                        for a in alerts[:i]
-                    )
-                    if not already_restored:
-                        cursor.execute('''
-                            INSERT INTO alerts (timestamp, alert_type, level_db,
-                                duration_seconds, message, email_sent)
-                            VALUES (datetime('now', 'localtime'), ?, ?, 0, ?, 0)
-                        ''', (
-                            restore_type,
-                            alert['level_db'],
-                            f"Clôturé automatiquement au redémarrage du service"
-                        ))
-                        closed += 1
-                        logger.info(f"Alerte {atype} clôturée au redémarrage → {restore_type}")
-
-                if closed:
-                    logger.info(f"{closed} alerte(s) ouverte(s) clôturée(s) au redémarrage")
-                return closed
+                rows = conn.execute('''
+                    SELECT type, COUNT(*) AS episodes,
+                           SUM(MIN(COALESCE(end_ts, :until), :until) - MAX(start_ts, :since)) AS down_ms
+                    FROM alert_episodes
+                    WHERE start_ts < :until AND (end_ts IS NULL OR end_ts > :since)
+                    GROUP BY type
+                ''', {'since': since_ms, 'until': until_ms}).fetchall()
+            result = {t: {'episodes': 0, 'down_seconds': 0, 'availability': 100.0}
+                      for t in EPISODE_TYPES}
+            for r in rows:
+                down = max(0, r['down_ms'] or 0)
+                result[r['type']] = {
+                    'episodes':     r['episodes'],
+                    'down_seconds': down // 1000,
+                    'availability': round(100.0 * (1 - down / span), 3),
+                }
+            return result
         except Exception as e:
-            logger.error(f"Erreur close_open_alerts: {e}")
-            return 0
+            logger.error(f"Erreur calcul disponibilité: {e}")
+            return {}
 
-    def cleanup_old_data(self, days=7):
-        """Nettoie les données de plus de X jours"""
+    def get_availability_report(self, first_day, last_day):
+        """
+        Rapport de disponibilité sur les jours civils locaux [first_day, last_day]
+        (dates incluses), lu dans availability_daily (≤ 5 lignes par jour) ;
+        les épisodes en cours y sont ajoutés jusqu'à maintenant.
+
+        Par type : temps en défaut, nombre de défaillances (comptées le jour
+        de leur début), disponibilité en %, MTTR (durée moyenne d'un défaut)
+        et MTBF (temps de fonctionnement moyen entre deux défaillances).
+        """
+        now = now_ms()
+        start_ms, _ = local_day_bounds(first_day)
+        _, end_ms = local_day_bounds(last_day)
+        period_ms = max(0, min(end_ms, now) - start_ms)
+
+        down = {t: 0 for t in EPISODE_TYPES}
+        count = {t: 0 for t in EPISODE_TYPES}
+        days = {}
+        with self.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT day, type, down_ms, episodes FROM availability_daily
+                WHERE day >= ? AND day <= ?
+            ''', (first_day.isoformat(), last_day.isoformat())).fetchall()
+            open_eps = conn.execute(
+                'SELECT type, start_ts FROM alert_episodes WHERE end_ts IS NULL'
+            ).fetchall()
+
+        def add(day, ep_type, down_ms, episodes):
+            down[ep_type] = down.get(ep_type, 0) + down_ms
+            count[ep_type] = count.get(ep_type, 0) + episodes
+            per_day = days.setdefault(day, {})
+            per_day[ep_type] = per_day.get(ep_type, 0) + down_ms
+
+        for day, ep_type, down_ms, episodes in rows:
+            add(day, ep_type, down_ms, episodes)
+        # Épisodes ouverts : déjà comptés, durée pas encore ventilée
+        for ep_type, ep_start in open_eps:
+            for day, down_ms in split_local_days(max(ep_start, start_ms), min(now, end_ms)):
+                add(day, ep_type, down_ms, 0)
+
+        types = {}
+        for ep_type in down:
+            up_ms = max(0, period_ms - down[ep_type])
+            n = count[ep_type]
+            types[ep_type] = {
+                'label':        EPISODE_TYPES.get(ep_type, (None, ep_type))[1],
+                'down_seconds': down[ep_type] // 1000,
+                'failures':     n,
+                'availability': round(100.0 * up_ms / period_ms, 4) if period_ms else None,
+                'mttr_seconds': round(down[ep_type] / n / 1000, 1) if n else None,
+                'mtbf_hours':   round(up_ms / n / 3_600_000, 2) if n else None,
+            }
+        return {
+            'start':          ms_to_iso(start_ms),
+            'end':            ms_to_iso(min(end_ms, now)),
+            'period_seconds': period_ms // 1000,
+            # Disponibilité à l'antenne = absence de perte de porteuse
+            'on_air':         types.get('signal_lost', {}).get('availability'),
+            'types':          types,
+            'days':           [
+                {'day': day, 'down_seconds': {t: ms // 1000 for t, ms in sorted(d.items())}}
+                for day, d in sorted(days.items())
+            ],
+        }
+
+    def close_open_alerts(self, keep=()):
+        """
+        Clôture les alertes ouvertes au redémarrage du service.
+        Insère un événement de rétablissement pour chaque épisode ouvert et le ferme.
+        keep : types dont l'épisode continue (reprise à chaud de l'état des détecteurs).
+        """
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cutoff = datetime.now() - timedelta(days=days)
-                
-                cursor.execute('DELETE FROM audio_levels WHERE timestamp < ?', (cutoff,))
-                deleted = cursor.rowcount
-                
-                logger.info(f"Nettoyage: {deleted} enregistrements supprimés")
-                return deleted
+            ts = now_ms()
+            with self.writer_transaction() as conn:
+                open_eps = [ep for ep in conn.execute('''
+                    SELECT id, type, level_start, start_ts FROM alert_episodes WHERE end_ts IS NULL
+                ''').fetchall() if ep[1] not in keep]
+                for ep_id, ep_type, level, start_ts in open_eps:
+                    self._add_downtime(conn, ep_type, start_ts, ts)
+                    restore_type = EPISODE_TYPES.get(ep_type, (f'{ep_type}_restored',))[0]
+                    conn.execute('''
+                        INSERT INTO alerts (ts, alert_type, level_db,
+                            duration_seconds, message, email_sent)
+                        VALUES (?, ?, ?, 0, ?, 0)
+                    ''', (ts, restore_type, level, "Clôturé automatiquement au redémarrage du service"))
+                    logger.info(f"Alerte {ep_type} clôturée au redémarrage → {restore_type}")
+                conn.executemany('''
+                    UPDATE alert_episodes
+                    SET end_ts = ?, duration_s = (? - start_ts) / 1000, closed_by = 'restart'
+                    WHERE id = ?
+                ''', [(ts, ts, ep[0]) for ep in open_eps])
+
+            if open_eps:
+                logger.info(f"{len(open_eps)} alerte(s) ouverte(s) clôturée(s) au redémarrage")
+            return len(open_eps)
         except Exception as e:
-            logger.error(f"Erreur nettoyage: {e}")
+            logger.error(f"Erreur close_open_alerts: {e}")
             return 0
 
+    # ------------------------------------------------------------------
+    # EXPORT EN FLUX
+    # ------------------------------------------------------------------
+
+    EXPORT_CHUNK = 1000
+
+    def _iter_query(self, conn, sql, params=()):
+        """Lignes (tuples) d'une requête, lues par paquets fetchmany"""
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(self.EXPORT_CHUNK)
+            if not rows:
+                return
+            yield from rows
+
+    @contextmanager
+    def _export_connection(self):
+        """Connexion dédiée en lecture seule, ouverte dans le thread qui itère"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA query_only=1')
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _iter_partitioned(self, base, start_ms, end_ms):
+        """
+        Lignes de [start_ms, end_ms[ d'une table partitionnée, partition par
+        partition dans l'ordre des jours : chaque requête parcourt la clé
+        primaire sans tri ni table temporaire, la mémoire reste constante.
+        """
+        col, _, columns = PARTITIONED[base]
+        days = [d for d in sorted(self._partitions[base])
+                if day_start_ms(d) < end_ms and day_start_ms(d) + DAY_MS > start_ms]
+        with self._export_connection() as conn:
+            for d in days:
+                try:
+                    yield from self._iter_query(conn, f'''
+                        SELECT {columns} FROM {base}_{d}
+                        WHERE {col} >= ? AND {col} < ? ORDER BY {col}
+                    ''', (start_ms, end_ms))
+                except sqlite3.OperationalError as e:
+                    # Partition supprimée par la rétention pendant l'export
+                    logger.warning(f"Export {base}_{d} ignorée : {e}")
+
+    def iter_audio_levels(self, start_ms, end_ms):
+        """(ts, level_db, signal_ok) bruts sur la plage, ordre chronologique"""
+        return self._iter_partitioned('audio_levels', start_ms, end_ms)
+
+    def iter_metric_blocks(self, start_ms, end_ms):
+        """Blocs (minute, interval_ms, fields, data) recouvrant la plage, un à la fois"""
+        return self._iter_partitioned('metric_blocks', start_ms - 60000 + 1, end_ms)
+
+    def iter_audio_rollup(self, suffix, start_ms, end_ms):
+        """(bucket, level_min, level_max, level_sum, count, ok_count) d'une table d'agrégats"""
+        with self._export_connection() as conn:
+            yield from self._iter_query(conn, f'''
+                SELECT bucket, level_min, level_max, level_sum, count, ok_count
+                FROM audio_rollup_{suffix}
+                WHERE bucket >= ? AND bucket < ? ORDER BY bucket
+            ''', (start_ms, end_ms))
+
+    def iter_alerts(self, start_ms, end_ms, types=None):
+        """Événements d'alerte bruts sur la plage (index idx_alerts_ts)"""
+        sql = '''
+            SELECT ts, alert_type, level_db, duration_seconds, message, email_sent
+            FROM alerts WHERE ts >= ? AND ts < ?
+        '''
+        params = [start_ms, end_ms]
+        if types:
+            sql += f" AND alert_type IN ({','.join('?' * len(types))})"
+            params += list(types)
+        with self._export_connection() as conn:
+            yield from self._iter_query(conn, sql + ' ORDER BY ts, id', params)
+
+    def iter_episodes(self, start_ms, end_ms, types=None):
+        """Épisodes recouvrant la plage (y compris en cours), par début croissant"""
+        sql = '''
+            SELECT type, start_ts, end_ts, duration_s, level_start, level_end,
+                   peak, notifications, closed_by
+            FROM alert_episodes
+            WHERE start_ts < ? AND (end_ts IS NULL OR end_ts >= ?)
+        '''
+        params = [end_ms, start_ms]
+        if types:
+            sql += f" AND type IN ({','.join('?' * len(types))})"
+            params += list(types)
+        with self._export_connection() as conn:
+            yield from self._iter_query(conn, sql + ' ORDER BY start_ts', params)
+
+    def iter_rds(self, start_ms, end_ms):
+        """(ts, ps, rt) de l'historique RDS sur la plage"""
+        with self._export_connection() as conn:
+            yield from self._iter_query(conn, '''
+                SELECT ts, ps, rt FROM rds_history
+                WHERE ts >= ? AND ts < ? ORDER BY ts
+            ''', (start_ms, end_ms))
+
+    def apply_retention(self, policy=None):
+        """
+        Applique la rétention par classe de données (voir RETENTION_DEFAULTS).
+        Les partitions journalières entièrement expirées sont supprimées par
+        DROP TABLE (pages rendues à la freelist et réutilisées, sans VACUUM) ;
+        les petites tables indexées sur le temps le sont par plage de clé.
+        Retourne {classe: {'removed': n, 'seconds': durée}}.
+        """
+        policy = dict(RETENTION_DEFAULTS, **(policy or {}))
+        now = now_ms()
+        report = {}
+
+        def run(name, fn):
+            t0 = time.perf_counter()
+            try:
+                removed = fn()
+            except Exception as e:
+                logger.error(f"Rétention {name}: {e}")
+                removed = None
+            report[name] = {'removed': removed, 'seconds': round(time.perf_counter() - t0, 4)}
+
+        def drop_partitions(base, days):
+            cutoff = now - days * DAY_MS
+            with self.writer_transaction() as conn:
+                expired = [d for d in sorted(self._partitions[base])
+                           if day_start_ms(d) + DAY_MS <= cutoff]
+                for d in expired:
+                    conn.execute(f'DROP TABLE IF EXISTS {base}_{d}')
+                    self._partitions[base].discard(d)
+                if expired:
+                    self._rebuild_view(conn, base)
+            return len(expired)
+
+        def delete_before(sql, days):
+            with self.writer_transaction() as conn:
+                return conn.execute(sql, (now - days * DAY_MS,)).rowcount
+
+        if policy['raw_days']:
+            run('raw', lambda: drop_partitions('audio_levels', policy['raw_days']))
+        if policy['metrics_days']:
+            run('metrics', lambda: drop_partitions('metric_blocks', policy['metrics_days']))
+        for suffix, _ in ROLLUPS:
+            days = policy.get(f'rollup_{suffix}_days')
+            if days:
+                run(f'rollup_{suffix}', lambda s=suffix, d=days: delete_before(
+                    f'DELETE FROM audio_rollup_{s} WHERE bucket < ?', d))
+        if policy['alerts_days']:
+            run('alerts', lambda: delete_before('DELETE FROM alerts WHERE ts < ?', policy['alerts_days'])
+                + delete_before('DELETE FROM alert_episodes WHERE end_ts < ?', policy['alerts_days'])
+                + delete_before("DELETE FROM notification_outbox WHERE created_ts < ? AND status != 'pending'",
+                                policy['alerts_days'])
+                + delete_before('DELETE FROM flight_records WHERE ts < ?', policy['alerts_days']))
+        if policy['rds_days']:
+            run('rds', lambda: delete_before('DELETE FROM rds_history WHERE ts < ?', policy['rds_days']))
+
+        def delete_clips(days):
+            cutoff = now - days * DAY_MS
+            with self.writer_transaction() as conn:
+                paths = [row[0] for row in conn.execute(
+                    'SELECT path FROM audio_clips WHERE ts < ?', (cutoff,))]
+                conn.execute('DELETE FROM audio_clips WHERE ts < ?', (cutoff,))
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return len(paths)
+
+        if policy['clips_days']:
+            run('clips', lambda: delete_clips(policy['clips_days']))
+
+        removed = sum(r['removed'] or 0 for r in report.values())
+        total = sum(r['seconds'] for r in report.values())
+        logger.info(f"Rétention : {removed} partition(s)/ligne(s) supprimée(s) en {total:.3f}s")
+        return report
+
+    def cleanup_old_data(self, days=7):
+        """Nettoie les données brutes de plus de X jours (voir apply_retention)"""
+        report = self.apply_retention({'raw_days': days, 'metrics_days': days})
+        return sum(r['removed'] or 0 for r in report.values())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Réduction de séries pour les graphiques : au plus N points, visuellement fidèles.
+
+  - lttb   : Largest-Triangle-Three-Buckets (Steinarsson 2013). Garde dans
+             chaque bucket le point qui forme le plus grand triangle avec le
+             point retenu précédemment et la moyenne du bucket suivant :
+             pics et creux isolés sont conservés.
+  - minmax : enveloppe min/max, deux points par bucket (tracés de niveaux
+             bruités, détection visuelle des coupures).
+
+Les fonctions retournent des INDICES dans la série d'origine, ce qui permet
+de sélectionner n'importe quel format de ligne (dicts SQLite, colonnes
+numpy…). Les valeurs NaN/None sont ignorées pour le choix des points.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def _as_arrays(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray([np.nan if v is None else v for v in y], dtype=np.float64) \
+        if isinstance(y, list) else np.asarray(y, dtype=np.float64)
+    return x, y
+
+
+def lttb_indices(x, y, n):
+    """Indices des n points LTTB de (x, y) ; x croissant"""
+    x, y = _as_arrays(x, y)
+    valid = np.flatnonzero(~np.isnan(y))
+    size = len(valid)
+    if n >= size or n < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+
+    # n - 2 buckets pour les points intérieurs, le premier et le dernier sont gardés
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    ends = np.r_[edges[1:], size]
+    # Moyenne du bucket suivant, calculée d'un bloc par sommes cumulées
+    cx = np.r_[0.0, np.cumsum(xv)]
+    cy = np.r_[0.0, np.cumsum(yv)]
+    next_lo, next_hi = ends[:-1], np.maximum(ends[1:], ends[:-1] + 1)
+    counts = next_hi - next_lo
+    avg_x = (cx[next_hi] - cx[next_lo]) / counts
+    avg_y = (cy[next_hi] - cy[next_lo]) / counts
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], ends[i]
+        if hi <= lo:
+            out[i + 1] = lo
+            continue
+        area = np.abs((xv[a] - avg_x[i]) * (yv[lo:hi] - yv[a])
+                      - (xv[a] - xv[lo:hi]) * (avg_y[i] - yv[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return valid[np.unique(out)]
+
+
+def minmax_indices(x, y, n):
+    """Indices du min et du max de chaque bucket (n // 2 buckets de taille égale)"""
+    x, y = _as_arrays(x, y)
+    valid = np.flatnonzero(~np.isnan(y))
+    size = len(valid)
+    buckets = max(1, n // 2)
+    if n >= size or size == 0:
+        return valid
+    yv = y[valid]
+    bucket = np.arange(size) * buckets // size
+    order = np.lexsort((yv, bucket))
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket[order])) + 1]
+    stops = np.r_[starts[1:], size] - 1
+    keep = np.unique(np.r_[order[starts], order[stops], 0, size - 1])
+    return valid[keep]
+
+
+def downsample_indices(x, y, n, method='lttb'):
+    """Indices retenus selon la méthode ('lttb' ou 'minmax')"""
+    if method == 'minmax':
+        return minmax_indices(x, y, n)
+    return lttb_indices(x, y, n)
+
+
+def downsample_rows(rows, n, x_key='ts', y_key='level_db', method='lttb'):
+    """Sous-ensemble d'une liste de dicts, dans l'ordre, d'au plus ~n lignes"""
+    if not n or len(rows) <= n:
+        return rows
+    idx = downsample_indices([r[x_key] for r in rows], [r.get(y_key) for r in rows], n, method)
+    return [rows[i] for i in idx]
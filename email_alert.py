@@ -1,17 +1,137 @@
 #!/usr/bin/env python3
 """
 Module de gestion des alertes email pour le système de surveillance FM
+
+Les gabarits (sujet, texte, HTML) sont rendus une fois par type d'alerte
+avec la station, la fréquence et le style ; un envoi ne substitue plus que
+la date et les détails. La session SMTP (connexion, STARTTLS, login) est
+conservée `session_idle_seconds` après le dernier envoi et réutilisée par
+les envois suivants. `send_digest` regroupe plusieurs événements en un
+seul email (mode digest du dispatcher de notifications). Les extraits
+audio des alertes peuvent être joints (`attachments` : chemins de fichiers).
 """
 
 import smtplib
 import json
+import threading
+import os
+import time
+from email.mime.audio import MIMEAudio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from functools import lru_cache
+from string import Template
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+_STYLE_ALERT = {'bg': '#fff3cd', 'border': '#ffc107', 'color': '#856404', 'icon': '⚠️'}
+_STYLE_OK = {'bg': '#d4edda', 'border': '#28a745', 'color': '#155724', 'icon': '✅'}
+
+_HTML_HEAD = """
+            <html>
+            <head>
+                <style>
+                    body { font-family: Arial, sans-serif; }
+                    .alert-box {
+                        background-color: %(bg)s;
+                        border-left: 4px solid %(border)s;
+                        padding: 20px;
+                        margin: 20px 0;
+                    }
+                    .header { color: %(color)s; font-size: 24px; font-weight: bold; }
+                    .info { margin: 10px 0; }
+                    .label { font-weight: bold; color: #333; }
+                    .footer { margin-top: 20px; color: #666; font-size: 12px; }
+                    td { padding: 4px 12px 4px 0; vertical-align: top; }
+                </style>
+            </head>
+            <body>
+                <div class="alert-box">"""
+
+_HTML_FOOT = """
+                    <div class="footer">BL-FMO Système de surveillance FM</div>
+                </div>
+            </body>
+            </html>
+            """
+
+_TEXT_ALERT = """
+ALERTE DE SURVEILLANCE FM
+========================
+
+Station: %(station)s
+Fréquence: %(frequency)s
+Type d'alerte: %(alert_type)s
+Date et heure: $timestamp
+
+Détails:
+$details
+
+---
+BL-FMO Système de surveillance FM
+            """
+
+_HTML_ALERT = """
+                    <div class="header">%(icon)s %(alert_type_upper)s</div>
+                    <hr>
+                    <div class="info"><span class="label">Station:</span> %(station)s</div>
+                    <div class="info"><span class="label">Fréquence:</span> %(frequency)s</div>
+                    <div class="info"><span class="label">Type d'alerte:</span> %(alert_type)s</div>
+                    <div class="info"><span class="label">Date et heure:</span> $timestamp</div>
+                    <hr>
+                    <div class="info"><span class="label">Détails:</span><br>$details</div>"""
+
+_TEXT_RECOVERY = """
+SIGNAL RÉTABLI
+==============
+
+Station: %(station)s
+Fréquence: %(frequency)s
+Date et heure: $timestamp
+
+Le signal FM a été rétabli avec succès.
+
+---
+BL-FMO Système de surveillance FM
+            """
+
+_HTML_RECOVERY = """
+                    <div class="header">✅ SIGNAL RÉTABLI</div>
+                    <hr>
+                    <div class="info"><span class="label">Station:</span> %(station)s</div>
+                    <div class="info"><span class="label">Fréquence:</span> %(frequency)s</div>
+                    <div class="info"><span class="label">Date et heure:</span> $timestamp</div>
+                    <hr>
+                    <p>Le signal FM a été rétabli avec succès.</p>"""
+
+_TEXT_DIGEST = """
+SURVEILLANCE FM - $count ÉVÉNEMENTS
+========================
+
+Station: %(station)s
+Fréquence: %(frequency)s
+
+$lines
+
+---
+BL-FMO Système de surveillance FM
+            """
+
+_HTML_DIGEST = """
+                    <div class="header">%(icon)s $count ÉVÉNEMENTS</div>
+                    <hr>
+                    <div class="info"><span class="label">Station:</span> %(station)s</div>
+                    <div class="info"><span class="label">Fréquence:</span> %(frequency)s</div>
+                    <hr>
+                    <table>$rows</table>"""
+
+
+def _literal(value):
+    """Valeur figée dans un string.Template : les $ ne sont pas des champs"""
+    return str(value).replace('$', '$$')
+
 
 class EmailAlert:
     def __init__(self, config_path='config.json'):
@@ -29,6 +149,134 @@ class EmailAlert:
         # Toggle "alertes actives" (live, piloté par l'UI, sans redémarrage)
         self.alerts_enabled = self.config.get('alerts_enabled', True)
 
+        # Session SMTP réutilisée entre envois rapprochés
+        self.session_idle = float(self.config.get('session_idle_seconds', 60))
+        self._smtp = None
+        self._smtp_key = None
+        self._smtp_used = 0.0
+        self._smtp_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # GABARITS (rendus une fois, seuls date et détails varient)
+    # ------------------------------------------------------------------
+
+    def _fields(self, style, **extra):
+        fields = dict(style, station=_literal(self.station_name), frequency=_literal(self.frequency))
+        fields.update({k: _literal(v) for k, v in extra.items()})
+        return fields
+
+    @lru_cache(maxsize=64)
+    def _alert_templates(self, alert_type):
+        """(sujet, Template texte, Template HTML) d'un type d'alerte"""
+        recovery = "rétabli" in alert_type.lower()
+        fields = self._fields(_STYLE_OK if recovery else _STYLE_ALERT,
+                              alert_type=alert_type, alert_type_upper=alert_type.upper())
+        prefix = "✅ RÉTABLI" if recovery else "⚠️ ALERTE"
+        return (f"{prefix} - {self.station_name} - {alert_type}",
+                Template(_TEXT_ALERT % fields),
+                Template((_HTML_HEAD + _HTML_ALERT + _HTML_FOOT) % fields))
+
+    @lru_cache(maxsize=1)
+    def _recovery_templates(self):
+        fields = self._fields(_STYLE_OK)
+        return (f"✅ RÉTABLI - {self.station_name}",
+                Template(_TEXT_RECOVERY % fields),
+                Template((_HTML_HEAD + _HTML_RECOVERY + _HTML_FOOT) % fields))
+
+    @lru_cache(maxsize=2)
+    def _digest_templates(self, recovery):
+        fields = self._fields(_STYLE_OK if recovery else _STYLE_ALERT)
+        prefix = "✅ RÉTABLI" if recovery else "⚠️ ALERTE"
+        return (Template(f"{prefix} - {_literal(self.station_name)} - $count événements"),
+                Template(_TEXT_DIGEST % fields),
+                Template((_HTML_HEAD + _HTML_DIGEST + _HTML_FOOT) % fields))
+
+    def _message(self, subject, text_content, html_content, attachments=()):
+        msg = body = MIMEMultipart('alternative')
+        body.attach(MIMEText(text_content, 'plain', 'utf-8'))
+        body.attach(MIMEText(html_content, 'html', 'utf-8'))
+        if attachments:
+            msg = MIMEMultipart('mixed')
+            msg.attach(body)
+            for path in attachments:
+                with open(path, 'rb') as f:
+                    part = MIMEAudio(f.read(), 'mpeg')
+                part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
+                msg.attach(part)
+        msg['Subject'] = subject
+        msg['From'] = self.config['sender_email']
+        msg['To'] = ', '.join(self.config['recipient_emails'])
+        return msg
+
+    # ------------------------------------------------------------------
+    # SESSION SMTP
+    # ------------------------------------------------------------------
+
+    def _session_key(self):
+        c = self.config
+        return (c['smtp_server'], c['smtp_port'], c['sender_email'], c.get('use_tls'))
+
+    def _close_session(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _session(self):
+        """Session SMTP ouverte et authentifiée (à appeler sous _smtp_lock)"""
+        key = self._session_key()
+        if self._smtp is not None:
+            if key == self._smtp_key and time.monotonic() - self._smtp_used < self.session_idle:
+                try:
+                    if self._smtp.noop()[0] == 250:
+                        return self._smtp
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._close_session()
+
+        server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=30)
+        try:
+            if self.config['use_tls']:
+                server.starttls()
+            server.login(self.config['sender_email'], self.config['sender_password'])
+        except Exception:
+            server.close()
+            raise
+        self._smtp, self._smtp_key = server, key
+        return server
+
+    def _deliver(self, msg):
+        """Envoie sur la session partagée ; une reconnexion si le serveur l'a coupée"""
+        with self._smtp_lock:
+            for attempt in (1, 2):
+                server = self._session()
+                try:
+                    server.sendmail(self.config['sender_email'], self.config['recipient_emails'],
+                                    msg.as_string())
+                    self._smtp_used = time.monotonic()
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._smtp = None
+                    if attempt == 2:
+                        raise
+
+    def close_idle(self):
+        """Ferme la session SMTP inutilisée depuis plus de session_idle secondes"""
+        with self._smtp_lock:
+            if self._smtp is not None and time.monotonic() - self._smtp_used >= self.session_idle:
+                self._close_session()
+                logger.debug("Session SMTP fermée (inactive)")
+
+    def close(self):
+        with self._smtp_lock:
+            self._close_session()
+
+    # ------------------------------------------------------------------
+    # ENVOIS
+    # ------------------------------------------------------------------
+
     def can_send_alert(self):
         """Vérifie si on peut envoyer une alerte (cooldown)"""
         if not self.config['enabled']:
@@ -39,18 +287,30 @@ class EmailAlert:
 
         return datetime.now() - self.last_alert_time > self.cooldown
 
-    def send_alert(self, alert_type, details="", skip_cooldown=False):
+    def _policy_allows(self, label, test=False):
+        """Toggle UI et activation email ; l'email de test reste toujours autorisé"""
+        if test:
+            return True
+        if not getattr(self, 'alerts_enabled', True):
+            logger.info(f"Alerte '{label}' non envoyée (alertes coupées via toggle)")
+            return False
+        if not self.config.get('enabled'):
+            logger.info(f"Alerte '{label}' non envoyée (email désactivé)")
+            return False
+        return True
+
+    def send_alert(self, alert_type, details="", skip_cooldown=False, raise_errors=False, attachments=()):
         """Envoie une alerte email
-        
+
         Args:
             alert_type: Type d'alerte
             details: Détails de l'alerte
             skip_cooldown: Si True, ignore le cooldown (pour les rétablissements)
+            raise_errors: Si True, une erreur SMTP est propagée au lieu de
+                retourner False (reprise par le dispatcher de notifications)
+            attachments: Fichiers MP3 à joindre (extraits audio de l'alerte)
         """
-        # Garde-fou toggle : couper les alertes automatiques quand désactivé
-        # (l'email de test, alert_type="Test", reste toujours autorisé)
-        if not getattr(self, 'alerts_enabled', True) and alert_type != "Test":
-            logger.info(f"Alerte '{alert_type}' non envoyée (alertes coupées via toggle)")
+        if not self._policy_allows(alert_type, test=alert_type == "Test"):
             return False
         # Ignorer le cooldown si c'est un rétablissement OU si skip_cooldown=True
         if "rétabli" in alert_type.lower() or skip_cooldown:
@@ -60,173 +320,76 @@ class EmailAlert:
             return False
 
         try:
-            # Créer le message
-            msg = MIMEMultipart('alternative')
-            
-            # Sujet différent selon le type d'alerte
-            if "rétabli" in alert_type.lower():
-                msg['Subject'] = f"✅ RÉTABLI - {self.station_name} - {alert_type}"
-            else:
-                msg['Subject'] = f"⚠️ ALERTE - {self.station_name} - {alert_type}"
-                
-            msg['From'] = self.config['sender_email']
-            msg['To'] = ', '.join(self.config['recipient_emails'])
-
-            # Corps du message
-            timestamp = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-
-            text_content = f"""
-ALERTE DE SURVEILLANCE FM
-========================
-
-Station: {self.station_name}
-Fréquence: {self.frequency}
-Type d'alerte: {alert_type}
-Date et heure: {timestamp}
+            subject, text_tpl, html_tpl = self._alert_templates(alert_type)
+            values = {'timestamp': datetime.now().strftime('%d/%m/%Y %H:%M:%S'), 'details': details}
+            msg = self._message(subject, text_tpl.substitute(values), html_tpl.substitute(values),
+                                attachments)
 
-Détails:
-{details}
-
----
-BL-FMO Système de surveillance FM
-            """
-
-            html_content = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; }}
-                    .alert-box {{
-                        background-color: {"#d4edda" if "rétabli" in alert_type.lower() else "#fff3cd"};
-                        border-left: 4px solid {"#28a745" if "rétabli" in alert_type.lower() else "#ffc107"};
-                        padding: 20px;
-                        margin: 20px 0;
-                    }}
-                    .header {{ color: {"#155724" if "rétabli" in alert_type.lower() else "#856404"}; font-size: 24px; font-weight: bold; }}
-                    .info {{ margin: 10px 0; }}
-                    .label {{ font-weight: bold; color: #333; }}
-                    .footer {{ margin-top: 20px; color: #666; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="alert-box">
-                    <div class="header">{"✅" if "rétabli" in alert_type.lower() else "⚠️"} {alert_type.upper()}</div>
-                    <hr>
-                    <div class="info"><span class="label">Station:</span> {self.station_name}</div>
-                    <div class="info"><span class="label">Fréquence:</span> {self.frequency}</div>
-                    <div class="info"><span class="label">Type d'alerte:</span> {alert_type}</div>
-                    <div class="info"><span class="label">Date et heure:</span> {timestamp}</div>
-                    <hr>
-                    <div class="info"><span class="label">Détails:</span><br>{details}</div>
-                    <div class="footer">BL-FMO Système de surveillance FM</div>
-                </div>
-            </body>
-            </html>
-            """
-
-            # Attacher les deux versions
-            part1 = MIMEText(text_content, 'plain', 'utf-8')
-            part2 = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(part1)
-            msg.attach(part2)
-
-            # Envoyer l'email
             # Mettre à jour le cooldown AVANT la tentative d'envoi
             # pour éviter la boucle infinie en cas d'échec SMTP
             self.last_alert_time = datetime.now()
-
-            with smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port']) as server:
-                if self.config['use_tls']:
-                    server.starttls()
-
-                server.login(self.config['sender_email'], self.config['sender_password'])
-                server.sendmail(self.config['sender_email'], self.config['recipient_emails'], msg.as_string())
+            self._deliver(msg)
 
             logger.info(f"Alerte email envoyée: {alert_type}")
             return True
 
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'email: {e}")
+            if raise_errors:
+                raise
             return False
 
-    def send_recovery_alert(self):
+    def send_recovery_alert(self, raise_errors=False):
         """Envoie une alerte de rétablissement du signal"""
-        if not getattr(self, 'alerts_enabled', True):
-            logger.info("Alerte de rétablissement non envoyée (alertes coupées via toggle)")
+        if not self._policy_allows("rétablissement"):
             return False
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f"✅ RÉTABLI - {self.station_name}"
-            msg['From'] = self.config['sender_email']
-            msg['To'] = ', '.join(self.config['recipient_emails'])
-
-            timestamp = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-
-            text_content = f"""
-SIGNAL RÉTABLI
-==============
-
-Station: {self.station_name}
-Fréquence: {self.frequency}
-Date et heure: {timestamp}
-
-Le signal FM a été rétabli avec succès.
-
----
-BL-FMO Système de surveillance FM
-            """
-
-            html_content = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; }}
-                    .success-box {{
-                        background-color: #d4edda;
-                        border-left: 4px solid #28a745;
-                        padding: 20px;
-                        margin: 20px 0;
-                    }}
-                    .header {{ color: #155724; font-size: 24px; font-weight: bold; }}
-                    .info {{ margin: 10px 0; }}
-                    .label {{ font-weight: bold; color: #333; }}
-                    .footer {{ margin-top: 20px; color: #666; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="success-box">
-                    <div class="header">✅ SIGNAL RÉTABLI</div>
-                    <hr>
-                    <div class="info"><span class="label">Station:</span> {self.station_name}</div>
-                    <div class="info"><span class="label">Fréquence:</span> {self.frequency}</div>
-                    <div class="info"><span class="label">Date et heure:</span> {timestamp}</div>
-                    <hr>
-                    <p>Le signal FM a été rétabli avec succès.</p>
-                    <div class="footer">BL-FMO Système de surveillance FM</div>
-                </div>
-            </body>
-            </html>
-            """
-
-            part1 = MIMEText(text_content, 'plain', 'utf-8')
-            part2 = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(part1)
-            msg.attach(part2)
+            subject, text_tpl, html_tpl = self._recovery_templates()
+            values = {'timestamp': datetime.now().strftime('%d/%m/%Y %H:%M:%S')}
+            msg = self._message(subject, text_tpl.substitute(values), html_tpl.substitute(values))
 
             # Mettre à jour le cooldown AVANT la tentative d'envoi
             self.last_alert_time = datetime.now()
-
-            with smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port']) as server:
-                if self.config['use_tls']:
-                    server.starttls()
-
-                server.login(self.config['sender_email'], self.config['sender_password'])
-                server.sendmail(self.config['sender_email'], self.config['recipient_emails'], msg.as_string())
+            self._deliver(msg)
 
             logger.info("Alerte de rétablissement envoyée")
             return True
 
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de l'alerte de rétablissement: {e}")
+            if raise_errors:
+                raise
             return False
 
+    def send_digest(self, events, raise_errors=False, attachments=()):
+        """
+        Un seul email pour plusieurs événements rapprochés.
+        events : [(libellé, détails, datetime, rétablissement), ...] dans l'ordre.
+        """
+        if not self._policy_allows(f"digest de {len(events)} événements"):
+            return False
+        try:
+            subject_tpl, text_tpl, html_tpl = self._digest_templates(all(ev[3] for ev in events))
+            lines, rows = [], []
+            for label, details, when, recovery in events:
+                stamp = when.strftime('%d/%m/%Y %H:%M:%S')
+                icon = '✅' if recovery else '⚠️'
+                lines.append(f"{stamp}  {icon} {label}")
+                lines.extend(f"    {line}" for line in (details or '').splitlines())
+                rows.append(f'<tr><td>{stamp}</td><td>{icon} <b>{label}</b>'
+                            + (f'<br>{details}' if details else '') + '</td></tr>')
+            values = {'count': len(events), 'lines': '\n'.join(lines), 'rows': ''.join(rows)}
+            msg = self._message(subject_tpl.substitute(values),
+                                text_tpl.substitute(values), html_tpl.substitute(values), attachments)
+
+            self.last_alert_time = datetime.now()
+            self._deliver(msg)
+
+            logger.info(f"Digest email envoyé ({len(events)} événements)")
+            return True
+
+        except Exception as e:
+            logger.error(f"Erreur lors de l'envoi du digest: {e}")
+            if raise_errors:
+                raise
+            return False
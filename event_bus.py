@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Bus d'événements interne et roue de temporisation.
+
+Les producteurs (calcul RMS, analyseurs MPX / audio, callbacks TEF, lecteur
+RDS) publient des événements horodatés à la source : `publish(topic,
+values, ts)` ne fait qu'un `put` dans une queue, sans verrou ni calcul, et
+peut être appelé depuis n'importe quel thread.
+
+Un thread unique `event-bus` distribue les événements aux abonnés dans
+l'ordre d'arrivée, puis fait avancer la roue de temporisation. Les abonnés
+(détecteurs) s'exécutent donc tous dans ce thread : pas de verrou à
+prendre pour leur état, et `call_at` peut y être appelé directement.
+
+Les minuteries reçoivent leur échéance exacte, pas l'heure à laquelle la
+roue les a traitées (au plus `tick` plus tard) : un délai d'alerte expire
+à l'instant prévu dans les horodatages enregistrés.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_bus_events = REGISTRY.counter('fmmonitor_bus_events_total', 'Événements distribués par sujet', ('topic',))
+_bus_dropped = REGISTRY.counter('fmmonitor_bus_dropped_total', 'Événements perdus (queue du bus pleine)')
+_bus_lag = REGISTRY.histogram('fmmonitor_bus_lag_seconds', "Délai entre l'horodatage d'un événement et sa distribution",
+                              buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+_bus_timers = REGISTRY.counter('fmmonitor_bus_timers_total', 'Minuteries échues')
+
+
+class Timer:
+    __slots__ = ('deadline', 'callback', 'args', 'rounds', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.rounds = 0
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Roue de temporisation hachée : `slots` cases de `tick` secondes ; une
+    échéance au-delà d'un tour de roue garde son nombre de tours restants.
+    Planifier et annuler sont en O(1) (annulation paresseuse), avancer coûte
+    les cases parcourues plus les minuteries échues.
+    """
+
+    def __init__(self, tick=0.05, slots=256, now=None):
+        self.tick = float(tick)
+        self._slots = [[] for _ in range(slots)]
+        self._pos = 0
+        self._slot_start = time.time() if now is None else now   # début de la case courante
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, deadline, callback, *args):
+        timer = Timer(deadline, callback, args)
+        ticks = max(0, int((deadline - self._slot_start) / self.tick))
+        n = len(self._slots)
+        timer.rounds = ticks // n
+        self._slots[(self._pos + ticks) % n].append(timer)
+        self.count += 1
+        return timer
+
+    @staticmethod
+    def cancel(timer):
+        if timer is not None:
+            timer.cancelled = True
+
+    def advance(self, now):
+        """Minuteries échues jusqu'à `now` (cases terminées), par échéance croissante"""
+        n = len(self._slots)
+        if now - self._slot_start > n * self.tick:
+            return self._rebuild(now)
+        due = []
+        while self._slot_start + self.tick <= now:
+            slot = self._slots[self._pos]
+            if slot:
+                keep = []
+                for timer in slot:
+                    if timer.cancelled:
+                        self.count -= 1
+                    elif timer.rounds > 0:
+                        timer.rounds -= 1
+                        keep.append(timer)
+                    else:
+                        due.append(timer)
+                        self.count -= 1
+                self._slots[self._pos] = keep
+            self._pos = (self._pos + 1) % n
+            self._slot_start += self.tick
+        due.sort(key=lambda t: t.deadline)
+        return due
+
+    def _rebuild(self, now):
+        """Saut de plus d'un tour (veille, horloge) : échues rendues, les autres replacées"""
+        timers = [t for slot in self._slots for t in slot if not t.cancelled]
+        self._slots = [[] for _ in self._slots]
+        self._pos = 0
+        self._slot_start = now
+        self.count = 0
+        due = sorted((t for t in timers if t.deadline <= now), key=lambda t: t.deadline)
+        for t in timers:
+            if t.deadline > now:
+                self.schedule(t.deadline, t.callback, *t.args)
+        return due
+
+    def next_wait(self, now):
+        """Délai avant la fin de la case courante, None si aucune minuterie"""
+        if not self.count:
+            return None
+        return max(0.0, self._slot_start + self.tick - now)
+
+
+class EventBus:
+
+    def __init__(self, tick=0.05, maxsize=10000):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._subscribers = defaultdict(list)
+        self.wheel = TimerWheel(tick=tick)
+        self._running = False
+        self._thread = None
+
+    def subscribe(self, topic, callback):
+        """callback(ts, values), appelé dans le thread du bus"""
+        self._subscribers[topic].append(callback)
+
+    def publish(self, topic, values, ts=None):
+        """Publie un événement (tout thread, non bloquant) ; ts = epoch s de la mesure"""
+        try:
+            self._queue.put_nowait((topic, time.time() if ts is None else ts, values))
+        except queue.Full:
+            _bus_dropped.inc()
+
+    def call_at(self, deadline, callback, *args):
+        """
+        Planifie callback(deadline, *args). Depuis le thread du bus uniquement
+        (abonnés, minuteries) ; retourne la minuterie, annulable par cancel().
+        """
+        return self.wheel.schedule(deadline, callback, *args)
+
+    def cancel(self, timer):
+        self.wheel.cancel(timer)
+
+    @property
+    def running(self):
+        return self._running
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    @property
+    def maxsize(self):
+        return self._queue.maxsize
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self.wheel = TimerWheel(tick=self.wheel.tick)
+        self._thread = threading.Thread(target=self._run, daemon=True, name='event-bus')
+        self._thread.start()
+
+    def stop(self, timeout=3):
+        """Arrête le bus une fois distribués les événements publiés avant l'appel"""
+        if self._thread and self._thread.is_alive():
+            try:
+                self._queue.put(('_stop', time.time(), None), timeout=timeout)
+            except queue.Full:
+                self._running = False
+            self._thread.join(timeout=timeout)
+        self._running = False
+
+    def _dispatch(self, topic, ts, values):
+        _bus_events.inc(topic=topic)
+        _bus_lag.observe(max(0.0, time.time() - ts))
+        for callback in self._subscribers.get(topic, ()):
+            try:
+                callback(ts, values)
+            except Exception as e:
+                logger.error(f"Abonné {topic} en erreur : {e}")
+
+    def _run(self):
+        logger.info("Bus d'événements démarré")
+        while self._running:
+            wait = self.wheel.next_wait(time.time())
+            try:
+                item = self._queue.get(timeout=1.0 if wait is None else wait)
+            except queue.Empty:
+                item = None
+            stop = item is not None and item[0] == '_stop'
+            if item is not None and not stop:
+                self._dispatch(*item)
+            for timer in self.wheel.advance(time.time()):
+                _bus_timers.inc()
+                try:
+                    timer.callback(timer.deadline, *timer.args)
+                except Exception as e:
+                    logger.error(f"Minuterie en erreur : {e}")
+            if stop:
+                break
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Export en flux des historiques (niveaux, agrégats, métriques, alertes, RDS).
+
+Chaque jeu de données est une paire (colonnes, générateur de lignes) lue
+par paquets `fetchmany` depuis FMDatabase ; la mise en forme CSV / NDJSON
+et la compression gzip se font au fil de l'eau. Rien n'est matérialisé :
+la mémoire utilisée ne dépend pas de la plage exportée (un mois de niveaux
+bruts comme une heure).
+"""
+import csv
+import io
+import json
+import math
+import zlib
+from database import ROLLUPS, EPISODE_TYPES, ms_to_iso
+from metric_store import METRIC_FIELDS, unpack
+
+DATASETS = (
+    'levels', *(f'levels_{suffix}' for suffix, _ in ROLLUPS),
+    'metrics', 'alerts', 'episodes', 'rds',
+)
+FORMATS = ('csv', 'ndjson')
+
+# Lignes mises en forme par morceau envoyé au client
+_BATCH = 500
+
+
+def _levels(db, start_ms, end_ms, **_):
+    columns = ('ts', 'timestamp', 'level_db', 'signal_ok')
+    rows = ((ts, ms_to_iso(ts), level, int(ok))
+            for ts, level, ok in db.iter_audio_levels(start_ms, end_ms))
+    return columns, rows
+
+
+def _rollup(suffix):
+    def rows_for(db, start_ms, end_ms, **_):
+        columns = ('ts', 'timestamp', 'level_min', 'level_max', 'level_avg', 'samples', 'ok_ratio')
+        rows = (
+            (bucket, ms_to_iso(bucket), lo, hi, round(total / count, 2), count, round(ok / count, 3))
+            for bucket, lo, hi, total, count, ok in db.iter_audio_rollup(suffix, start_ms, end_ms)
+            if count
+        )
+        return columns, rows
+    return rows_for
+
+
+def _metrics(db, start_ms, end_ms, fields=None, **_):
+    fields = list(fields or METRIC_FIELDS)
+
+    def rows():
+        # Un bloc (une minute) décompressé à la fois
+        for minute, interval_ms, block_fields, blob in db.iter_metric_blocks(start_ms, end_ms):
+            names = block_fields.split(',')
+            data = unpack(blob, len(names))
+            cols = [names.index(f) if f in names else None for f in fields]
+            for slot, values in enumerate(data.tolist()):
+                ts = minute + slot * interval_ms
+                if ts < start_ms or ts >= end_ms:
+                    continue
+                out = [None if c is None or math.isnan(values[c]) else round(values[c], 3)
+                       for c in cols]
+                if any(v is not None for v in out):
+                    yield (ts, ms_to_iso(ts), *out)
+
+    return ('ts', 'timestamp', *fields), rows()
+
+
+def _alerts(db, start_ms, end_ms, types=None, **_):
+    columns = ('ts', 'timestamp', 'alert_type', 'level_db', 'duration_seconds', 'message', 'email_sent')
+    rows = ((ts, ms_to_iso(ts), kind, level, duration, message, int(bool(sent)))
+            for ts, kind, level, duration, message, sent in db.iter_alerts(start_ms, end_ms, types))
+    return columns, rows
+
+
+def _episodes(db, start_ms, end_ms, types=None, **_):
+    columns = ('type', 'label', 'start_ts', 'start_time', 'end_ts', 'end_time', 'duration_s',
+               'level_start', 'level_end', 'peak', 'notifications', 'closed_by')
+    rows = (
+        (kind, EPISODE_TYPES.get(kind, (None, kind))[1], start, ms_to_iso(start), end, ms_to_iso(end),
+         duration, level_start, level_end, peak, notifications, closed_by)
+        for kind, start, end, duration, level_start, level_end, peak, notifications, closed_by
+        in db.iter_episodes(start_ms, end_ms, types)
+    )
+    return columns, rows
+
+
+def _rds(db, start_ms, end_ms, **_):
+    columns = ('ts', 'timestamp', 'ps', 'rt')
+    rows = ((ts, ms_to_iso(ts), ps, rt) for ts, ps, rt in db.iter_rds(start_ms, end_ms))
+    return columns, rows
+
+
+_BUILDERS = {
+    'levels':   _levels,
+    'metrics':  _metrics,
+    'alerts':   _alerts,
+    'episodes': _episodes,
+    'rds':      _rds,
+    **{f'levels_{suffix}': _rollup(suffix) for suffix, _ in ROLLUPS},
+}
+
+
+def dataset_rows(db, dataset, start_ms, end_ms, fields=None, types=None):
+    """(colonnes, générateur de tuples) d'un jeu de données sur [start_ms, end_ms["""
+    return _BUILDERS[dataset](db, start_ms, end_ms, fields=fields, types=types)
+
+
+def csv_chunks(columns, rows):
+    """Texte CSV par morceaux de _BATCH lignes, en-tête compris"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(columns)
+    n = 0
+    for row in rows:
+        writer.writerow(row)
+        n += 1
+        if n >= _BATCH:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            n = 0
+    yield buf.getvalue()
+
+
+def ndjson_chunks(columns, rows):
+    """Un objet JSON par ligne, par morceaux de _BATCH lignes"""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    batch = []
+    for row in rows:
+        batch.append(dumps(dict(zip(columns, row))))
+        if len(batch) >= _BATCH:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+
+def encode_chunks(chunks, compress=False, level=6):
+    """UTF-8, puis gzip au fil de l'eau si demandé (en-tête gzip : wbits=31)"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = comp.compress(chunk.encode('utf-8'))
+        if out:
+            yield out
+    yield comp.flush()
+
+
+def stream(db, dataset, fmt, start_ms, end_ms, fields=None, types=None, compress=False):
+    """Générateur d'octets prêt pour une réponse HTTP en flux"""
+    columns, rows = dataset_rows(db, dataset, start_ms, end_ms, fields=fields, types=types)
+    chunks = csv_chunks(columns, rows) if fmt == 'csv' else ndjson_chunks(columns, rows)
+    return encode_chunks(chunks, compress=compress)
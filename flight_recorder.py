@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Enregistreur de vol : toutes les métriques des dernières minutes à 10 Hz.
+
+Le thread du bus échantillonne le dernier vecteur de métriques reçu
+(METRIC_FIELDS) dans un anneau numpy préalloué (HistoryRing) : 10 minutes
+à 10 Hz sur 15 métriques occupent ~360 Ko, sans aucune écriture disque.
+
+À l'ouverture ou à la fermeture d'un épisode d'alerte, une fenêtre autour
+de l'événement (`pre_seconds` avant, `post_seconds` après) est découpée et
+compressée comme les blocs de metric_store (float32 + zlib), horodatages en
+décalages int32 depuis le début de la fenêtre. L'enregistrement est rattaché
+à l'alerte et à son épisode (table flight_records) : l'analyse après
+incident n'a plus besoin d'un historique continu à haute résolution.
+"""
+import zlib
+import numpy as np
+from history_ring import HistoryRing
+from metric_store import METRIC_FIELDS, pack, unpack
+
+
+class FlightRecorder:
+
+    def __init__(self, minutes=10, rate=10.0, fields=METRIC_FIELDS):
+        self.rate = float(rate)
+        self.interval = 1.0 / self.rate
+        self.fields = tuple(fields)
+        self.ring = HistoryRing(int(float(minutes) * 60 * self.rate), columns=self.fields)
+
+    def sample(self, ts, values):
+        """Ajoute le vecteur {métrique: valeur} à l'instant ts (epoch s)"""
+        self.ring.append(int(ts * 1000), *(np.nan if values.get(f) is None else values[f]
+                                           for f in self.fields))
+
+    def snapshot(self, start_ms, end_ms):
+        """
+        Fenêtre ]start_ms, end_ms] compressée : dict (start_ts, end_ts,
+        fields, ts_data, data) prêt pour FMDatabase.save_flight_record, None
+        si l'anneau ne couvre pas la fenêtre.
+        """
+        ts, values = self.ring.window(start_ms, end_ms)
+        if not len(ts):
+            return None
+        offsets = (ts - ts[0]).astype('<i4')
+        return {
+            'start_ts': int(ts[0]),
+            'end_ts':   int(ts[-1]),
+            'fields':   ','.join(self.fields),
+            'ts_data':  zlib.compress(offsets.tobytes(), 1),
+            'data':     pack(values),
+        }
+
+
+def decode(start_ts, fields, ts_data, data):
+    """
+    Enregistrement stocké → (horodatages epoch ms, {métrique: valeurs}) ;
+    les métriques sans aucune mesure sont omises, NaN → None (JSON).
+    """
+    fields = fields.split(',')
+    ts = start_ts + np.frombuffer(zlib.decompress(ts_data), dtype='<i4').astype(np.int64)
+    values = unpack(data, len(fields))
+    series = {}
+    for i, name in enumerate(fields):
+        col = values[:, i]
+        if np.isnan(col).all():
+            continue
+        series[name] = [None if v != v else round(float(v), 3) for v in col]
+    return ts.tolist(), series
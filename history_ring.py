@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Historique récent en mémoire : anneau numpy à capacité fixe.
+
+Horodatages int64 (epoch ms) et valeurs float32 en colonnes, écrasés
+circulairement. Un échantillon à 2 Hz sur 24 h occupe ~2 Mo. Les lectures
+par plage (`window`) font une recherche dichotomique sur chacun des deux
+segments ordonnés de l'anneau et ne copient que le résultat.
+
+Sert /api/signal/history et, pour les plages qu'il couvre,
+/api/audio/history : la base n'est interrogée qu'au-delà de l'anneau.
+"""
+import threading
+import numpy as np
+
+
+class HistoryRing:
+
+    def __init__(self, capacity, columns=('level',)):
+        self.capacity = int(capacity)
+        self.columns = tuple(columns)
+        self._ts = np.zeros(self.capacity, dtype=np.int64)
+        self._values = np.zeros((self.capacity, len(self.columns)), dtype=np.float32)
+        self._head = 0          # prochain emplacement écrit
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, ts_ms, *values):
+        with self._lock:
+            self._ts[self._head] = ts_ms
+            self._values[self._head] = values
+            self._head = (self._head + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def oldest_ts(self):
+        """Horodatage le plus ancien encore présent (None si vide)"""
+        with self._lock:
+            if not self._count:
+                return None
+            return int(self._ts[(self._head - self._count) % self.capacity])
+
+    def _segments(self):
+        """Tranches chronologiques de l'anneau (sous verrou)"""
+        if self._count < self.capacity:
+            return [slice(0, self._count)]
+        return [slice(self._head, self.capacity), slice(0, self._head)]
+
+    def window(self, start_ms=None, end_ms=None):
+        """Copie (ts, valeurs) des échantillons start_ms < ts <= end_ms, ordre chronologique"""
+        parts_ts, parts_val = [], []
+        with self._lock:
+            for seg in self._segments():
+                ts = self._ts[seg]
+                lo = 0 if start_ms is None else np.searchsorted(ts, start_ms, side='right')
+                hi = len(ts) if end_ms is None else np.searchsorted(ts, end_ms, side='right')
+                if hi > lo:
+                    parts_ts.append(ts[lo:hi].copy())
+                    parts_val.append(self._values[seg][lo:hi].copy())
+        if not parts_ts:
+            return (np.empty(0, dtype=np.int64),
+                    np.empty((0, len(self.columns)), dtype=np.float32))
+        return np.concatenate(parts_ts), np.concatenate(parts_val)
+
+
+def bucket_envelope(ts, values, points):
+    """
+    Réduit (ts, valeurs) à au plus `points` buckets de durée égale.
+    Retourne (ts début de bucket, moyenne, min, max) par colonne.
+    """
+    if len(ts) <= points or points < 1:
+        return ts, values, values, values
+    span = int(ts[-1] - ts[0]) + 1
+    width = -(-span // points)
+    bucket = (ts - ts[0]) // width
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket)) + 1]
+    counts = np.diff(np.r_[starts, len(ts)])[:, None]
+    mean = np.add.reduceat(values, starts, axis=0) / counts
+    vmin = np.minimum.reduceat(values, starts, axis=0)
+    vmax = np.maximum.reduceat(values, starts, axis=0)
+    return ts[starts], mean, vmin, vmax
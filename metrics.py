@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Registre de métriques en mémoire, exposé au format texte Prometheus/OpenMetrics.
+
+Conçu pour les chemins chauds du moniteur (boucle RMS, analyseurs, écriture
+BDD) : une mise à jour n'est qu'une addition ou une affectation sur une
+liste/un dict Python, sans verrou. Sous le GIL ces opérations ne corrompent
+jamais l'état ; dans le pire des cas une incrémentation concurrente sur la
+MÊME série peut être perdue, ce qui est acceptable pour de la supervision.
+
+Types disponibles :
+  - Counter   : compteur monotone (suffixe _total)
+  - Gauge     : valeur instantanée
+  - Histogram : distribution par buckets cumulatifs (latences)
+Les collecteurs (`register_collector`) produisent des séries calculées au
+moment du scrape (tailles de queues, état des alertes, CPU par thread…).
+"""
+import bisect
+import math
+import os
+import threading
+
+# Buckets de latence par défaut (secondes) : 100 µs → 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(n, '')) for n in labelnames)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in pairs) + '}'
+
+
+def _format_value(v):
+    if v is None:
+        return 'NaN'
+    v = float(v)
+    if math.isnan(v):
+        return 'NaN'
+    if math.isinf(v):
+        return '+Inf' if v > 0 else '-Inf'
+    if v == int(v) and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation='', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self, name=None):
+        name = name or self.name
+        return [f'# HELP {name} {self.documentation}', f'# TYPE {name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation='', labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = self._header()
+        for key, v in list(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}')
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation='', labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = self._header()
+        for key, v in list(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}')
+        return lines
+
+
+class _HistogramSeries:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, n):
+        self.counts = [0] * n
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, _HistogramSeries(len(self.buckets) + 1))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def render(self):
+        lines = self._header()
+        for key, series in list(self._series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, series.counts):
+                cumulative += c
+                lines.append(
+                    f'{self.name}_bucket'
+                    f'{_format_labels(self.labelnames, key, [("le", _format_value(bound))])} {cumulative}'
+                )
+            cumulative += series.counts[-1]
+            lines.append(
+                f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {cumulative}'
+            )
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series.sum)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {series.count}')
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques et collecteurs du processus."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()   # création seulement, jamais en mise à jour
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is not None:
+            return metric
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, documentation='', labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation='', labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation='', labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, fn):
+        """
+        Enregistre un collecteur appelé à chaque scrape.
+        fn() retourne une liste de (nom, type, aide, [(labels_dict, valeur), ...]).
+        """
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for fn in list(self._collectors):
+            try:
+                families = fn() or []
+            except Exception as e:
+                lines.append(f'# collecteur en erreur: {e}'.replace('\n', ' '))
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    labelnames = tuple(labels.keys())
+                    key = tuple(str(labels[n]) for n in labelnames)
+                    lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        lines.append('')
+        return '\n'.join(lines)
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _process_collector():
+    """
+    CPU du processus et CPU par nom de thread (lu dans /proc/self/task) ;
+    les threads de même nom (pool de requêtes) sont cumulés en une série.
+    """
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    families = [
+        ('fmmonitor_process_cpu_seconds_total', 'counter',
+         'Temps CPU total (user+system) du processus Python',
+         [({}, usage.ru_utime + usage.ru_stime)]),
+        ('fmmonitor_process_max_rss_bytes', 'gauge',
+         'Mémoire résidente maximale du processus',
+         [({}, usage.ru_maxrss * 1024)]),
+    ]
+    tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    by_name = {}
+    for t in threading.enumerate():
+        tid = getattr(t, 'native_id', None)
+        if tid is None:
+            continue
+        try:
+            with open(f'/proc/self/task/{tid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # champs 14/15 (utime/stime) → index 11/12 après le nom
+            cpu = (int(fields[11]) + int(fields[12])) / tick
+        except (OSError, IndexError, ValueError):
+            continue
+        by_name[t.name] = by_name.get(t.name, 0.0) + cpu
+    if by_name:
+        families.append(('fmmonitor_thread_cpu_seconds_total', 'counter',
+                         'Temps CPU consommé par thread',
+                         [({'thread': name}, cpu) for name, cpu in sorted(by_name.items())]))
+    return families
+
+
+REGISTRY.register_collector(_process_collector)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Point de reprise de l'état du moniteur : redémarrage à chaud.
+
+L'état des détecteurs (mesures, dépassements et épisodes en cours du moteur
+de règles, indicateurs RDS, fenêtre de l'écart-type du niveau) est un petit
+dict JSON ; les historiques récents sont des tableaux numpy. Le tout tient
+dans un seul fichier .npz compressé de quelques dizaines de Ko.
+
+L'écriture est atomique : fichier temporaire dans le même répertoire, fsync,
+puis os.replace. Un arrêt brutal laisse l'ancien point de reprise intact,
+jamais un fichier tronqué. Chargement sans pickle (allow_pickle=False).
+"""
+import json
+import logging
+import os
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+
+
+def save_state(path, state, arrays=None):
+    """Écrit {état JSON} + {nom: tableau} ; retourne la taille du fichier"""
+    payload = dict(arrays or {})
+    payload['state'] = np.frombuffer(json.dumps(dict(state, format=FORMAT)).encode(), dtype=np.uint8)
+    fd, tmp = tempfile.mkstemp(prefix='.state-', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **payload)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def load_state(path):
+    """(état, {nom: tableau}) du point de reprise, None s'il est absent ou illisible"""
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            state = json.loads(z['state'].tobytes())
+            arrays = {name: z[name] for name in z.files if name != 'state'}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Point de reprise illisible ({path}) : {e}")
+        return None
+    if state.get('format') != FORMAT:
+        logger.warning(f"Point de reprise ignoré : format {state.get('format')} inconnu")
+        return None
+    return state, arrays
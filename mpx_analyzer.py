@@ -22,9 +22,16 @@ import numpy as np
 from scipy import signal as scipy_signal
 import threading
 import logging
+import time
+from metrics import REGISTRY
+from timing import TIMINGS
 
 logger = logging.getLogger(__name__)
 
+_process_seconds = REGISTRY.histogram(
+    'fmmonitor_analyzer_process_seconds',
+    "Durée d'une analyse MPX/audio", ('analyzer',))
+
 SAMPLE_RATE     = 171000
 MAX_DEV_HZ      = 75_000.0
 PILOT_FREQ      = 19_000
@@ -48,6 +55,8 @@ class MPXAnalyzer:
             'deviation_peak': None, 'deviation_rms': None
         }
         self._counter      = 0
+        self.updates       = 0      # nombre d'analyses publiées (watchdog)
+        self.on_update     = None   # callable(résultats) appelé après chaque analyse
         self._fft_size     = 2048
         self._fft_window   = np.hanning(self._fft_size)
         self._fft_avg      = None   # moyenne glissante EMA sur FFT
@@ -105,6 +114,9 @@ class MPXAnalyzer:
         self._b_noise, self._a_noise = scipy_signal.butter(
             4, [60_000 / nyq, 75_000 / nyq], btype='bandpass')
 
+        # Budget temps réel d'une analyse : process_every chunks de 2048 échantillons
+        TIMINGS.set_budget('mpx.process_chunk', 2048 * process_every / sample_rate)
+
         logger.info(f"MPXAnalyzer initialisé — fs={sample_rate} Hz, traitement 1/{process_every} chunks, L/R+SNR activés")
 
     def process_chunk(self, samples_int16: np.ndarray) -> None:
@@ -114,6 +126,7 @@ class MPXAnalyzer:
         if len(samples_int16) < 512:
             return
 
+        t0 = time.perf_counter()
         try:
             mpx = samples_int16.astype(np.float32) / 32768.0
 
@@ -208,9 +221,16 @@ class MPXAnalyzer:
                     'snr':             ema('snr', snr_db),
                     'fft_spectrum':    [round(float(x), 1) for x in fft_decimated],
                 })
+                results = self._results.copy() if self.on_update else None
+            self.updates += 1
+            if results is not None:
+                self.on_update(results)
 
         except Exception as exc:
             logger.debug(f"MPXAnalyzer.process_chunk: {exc}")
+        dt = time.perf_counter() - t0
+        _process_seconds.observe(dt, analyzer='mpx')
+        TIMINGS.record('mpx.process_chunk', dt)
 
     def get_results(self) -> dict:
         with self._lock:
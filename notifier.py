@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Envoi asynchrone des notifications d'alerte via une file persistante.
+
+La boucle de surveillance n'envoie plus d'email : FMDatabase.save_alert
+insère l'alerte et sa notification (table `notification_outbox`) dans la
+même transaction locale, puis réveille le dispatcher. Le thread
+`notifier` envoie, avec reprise en backoff exponentiel si le serveur SMTP
+est lent ou injoignable, et reporte le statut de livraison sur la ligne
+d'alerte (`alerts.notify_status`, `email_sent`). Canaux : `email`, et
+`webhook` (POST JSON, voir alert_rules).
+
+La file survit aux redémarrages : les notifications en attente sont
+reprises au démarrage, celles devenues trop anciennes (`max_age_hours`)
+sont marquées expirées plutôt qu'envoyées hors de propos.
+
+Mode digest (`digest_window` > 0) : une notification n'est envoyée qu'après
+`digest_window` secondes, et toutes celles en file qui arrivent à échéance
+dans la fenêtre partent ensemble dans un seul email. Une perte d'émetteur
+donne ainsi un email au lieu de quatre (porteuse, modulation, RDS, RT).
+"""
+import os
+import threading
+import time
+import logging
+import requests
+from datetime import datetime
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_notify_sent = REGISTRY.counter('fmmonitor_notifications_total',
+                                'Notifications traitées par statut final', ('status',))
+_notify_attempts = REGISTRY.counter('fmmonitor_notification_attempts_total',
+                                    "Tentatives d'envoi de notification (échecs compris)")
+_notify_pending = REGISTRY.gauge('fmmonitor_notifications_pending',
+                                 'Notifications en attente dans la file')
+_notify_seconds = REGISTRY.histogram('fmmonitor_notification_send_seconds',
+                                     "Durée d'une tentative d'envoi")
+
+DEFAULTS = {
+    'max_attempts':  8,
+    'base_delay':    15,      # s avant la 2e tentative, doublé ensuite
+    'max_delay':     1800,    # s, plafond du backoff
+    'max_age_hours': 6,
+    'digest_window': 10,      # s, 0 = un email par événement
+    'attach_max_bytes': 5 * 1024 * 1024,   # extraits audio joints au-delà : non joints
+}
+
+
+class NotificationDispatcher:
+
+    def __init__(self, db, email_alert, config=None):
+        self.db = db
+        self.email_alert = email_alert
+        cfg = dict(DEFAULTS, **(config or {}))
+        self.max_attempts = int(cfg['max_attempts'])
+        self.base_delay = float(cfg['base_delay'])
+        self.max_delay = float(cfg['max_delay'])
+        self.max_age_ms = int(float(cfg['max_age_hours']) * 3_600_000)
+        self.digest_window_ms = int(float(cfg['digest_window']) * 1000)
+        self.attach_max_bytes = int(cfg['attach_max_bytes'])
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='notifier')
+        self._thread.start()
+
+    def stop(self, timeout=3):
+        self._running = False
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self.email_alert.close()
+
+    def wake(self):
+        """Signale une nouvelle notification en file (appelé après save_alert)"""
+        self._wake.set()
+
+    def _backoff(self, attempts):
+        return min(self.max_delay, self.base_delay * (2 ** max(0, attempts - 1)))
+
+    def _deliver(self, item):
+        """
+        Envoie une notification. True : envoyée ; False : écartée par la
+        politique d'envoi (alertes coupées, email désactivé). Lève en cas
+        d'échec réseau / SMTP, ce qui déclenche une reprise.
+        """
+        payload = item['payload']
+        if item['channel'] == 'webhook':
+            resp = requests.post(payload['url'], json=payload['body'], timeout=10)
+            resp.raise_for_status()
+            return True
+        if item['channel'] != 'email':
+            raise ValueError(f"Canal inconnu : {item['channel']}")
+        if item['kind'] == 'recovery':
+            return self.email_alert.send_recovery_alert(raise_errors=True)
+        return self.email_alert.send_alert(
+            alert_type=payload['alert_type'],
+            details=payload.get('details', ''),
+            skip_cooldown=True,
+            raise_errors=True,
+            attachments=self._attachments([item]),
+        )
+
+    def _attachments(self, items):
+        """Fichiers des extraits audio demandés (payload 'clip'), dans la limite de taille"""
+        paths, total = [], 0
+        for item in items:
+            key = item['payload'].get('clip')
+            clip = self.db.get_audio_clip(key) if key else None
+            if clip is None or not os.path.exists(clip['path']):
+                continue
+            if total + clip['size'] > self.attach_max_bytes:
+                logger.info(f"Extrait audio {key} non joint (taille maximale atteinte)")
+                continue
+            paths.append(clip['path'])
+            total += clip['size']
+        return paths
+
+    def _deliver_digest(self, items):
+        events = []
+        for item in items:
+            recovery = item['kind'] == 'recovery'
+            label = item['payload'].get('alert_type') or 'Signal FM rétabli'
+            events.append((label, item['payload'].get('details', ''),
+                           datetime.fromtimestamp(item['created_ts'] / 1000),
+                           recovery or 'rétabli' in label.lower()))
+        return self.email_alert.send_digest(events, raise_errors=True,
+                                            attachments=self._attachments(items))
+
+    def _send(self, items):
+        """Envoie un lot (un email, digest si plusieurs) et enregistre le résultat par notification"""
+        t0 = time.perf_counter()
+        _notify_attempts.inc()
+        try:
+            delivered = self._deliver(items[0]) if len(items) == 1 else self._deliver_digest(items)
+        except Exception as e:
+            _notify_seconds.observe(time.perf_counter() - t0)
+            for item in items:
+                attempts = item['attempts'] + 1
+                if attempts >= self.max_attempts:
+                    logger.error(f"Notification {item['id']} abandonnée après {attempts} tentatives : {e}")
+                    self.db.mark_notification(item['id'], 'failed', attempts=attempts, error=str(e))
+                    _notify_sent.inc(status='failed')
+                else:
+                    delay = self._backoff(attempts)
+                    logger.warning(f"Notification {item['id']} : échec ({e}), nouvel essai dans {delay:.0f}s")
+                    self.db.mark_notification(item['id'], 'pending', attempts=attempts, error=str(e),
+                                              next_attempt_ts=int(time.time() * 1000 + delay * 1000))
+            return
+        _notify_seconds.observe(time.perf_counter() - t0)
+        status = 'sent' if delivered else 'skipped'
+        for item in items:
+            self.db.mark_notification(item['id'], status, attempts=item['attempts'] + 1)
+            _notify_sent.inc(status=status)
+
+    def process_due(self):
+        """Traite les notifications échues ; retourne le délai (s) jusqu'à la prochaine"""
+        now = int(time.time() * 1000)
+        # Les notifications qui arrivent à échéance dans la fenêtre partent avec les échues
+        items = self.db.get_due_notifications(now + self.digest_window_ms)
+        if not any(item['next_attempt_ts'] <= now for item in items):
+            items = []
+
+        batch = []
+        for item in items:
+            if now - item['created_ts'] > self.max_age_ms:
+                self.db.mark_notification(item['id'], 'expired', error='Notification trop ancienne')
+                _notify_sent.inc(status='expired')
+            elif item['channel'] == 'email' and self.digest_window_ms:
+                batch.append(item)
+            else:
+                self._send([item])
+        if batch and self._running:
+            self._send(batch)
+        self.email_alert.close_idle()
+
+        pending, next_due = self.db.get_outbox_pending()
+        _notify_pending.set(pending)
+        wait = 60.0 if next_due is None else (next_due - int(time.time() * 1000)) / 1000
+        # Réveil au plus tard à l'expiration de la session SMTP pour la fermer
+        return max(0.5, min(wait, self.email_alert.session_idle + 1))
+
+    def _run(self):
+        logger.info("Dispatcher de notifications démarré")
+        while self._running:
+            try:
+                wait = self.process_due()
+            except Exception as e:
+                logger.error(f"Erreur dispatcher notifications: {e}")
+                wait = 10.0
+            self._wake.wait(timeout=wait)
+            self._wake.clear()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Watchdog de pipeline piloté par le débit de chaque étage.
+
+Chaque étage (lecture RF, analyseur, RDS, Icecast…) publie un compteur
+cumulatif : octets lus, mises à jour d'analyse, lignes RDS… Le watchdog
+échantillonne ces compteurs périodiquement et considère un étage comme
+bloqué lorsqu'il n'a plus progressé depuis `stall_after` secondes, même si
+son processus est toujours vivant (rtl_fm figé, ffmpeg bloqué sur Icecast).
+
+Un étage bloqué est relancé de façon ciblée via son callback `restart`,
+avec un backoff exponentiel entre deux relances successives ; sans callback
+(étage non relançable isolément), le blocage est seulement signalé. Les compteurs
+de relance sont conservés pour l'exposition en métriques.
+
+Les compteurs sont incrémentés depuis les chemins chauds sans verrou :
+`feed()` ne fait qu'une addition d'entier (atomique sous le GIL).
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """État de vivacité d'un étage du pipeline."""
+
+    def __init__(self, name, stall_after, restart=None, counter=None,
+                 probe=None, active=None, depends_on=None,
+                 backoff_min=10.0, backoff_max=600.0):
+        self.name        = name
+        self.stall_after = float(stall_after)
+        self.restart     = restart       # callable() → relance ciblée
+        self.counter     = counter       # callable() → compteur cumulatif externe
+        self.probe       = probe         # callable() → bool (ex : source Icecast connectée)
+        self.active      = active        # callable() → bool, étage surveillé ou non
+        self.depends_on  = depends_on    # nom de l'étage amont
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+
+        self.count         = 0           # incrémenté par feed() (chemin chaud)
+        self.rate          = 0.0         # unités/s sur le dernier intervalle
+        self.restarts      = 0
+        self.stalls        = 0
+        self.last_restart  = None
+        self._last_count   = 0
+        self._last_check   = None
+        self._last_progress = time.time()
+        self._backoff      = self.backoff_min
+        self._next_allowed = 0.0
+
+    def feed(self, n=1):
+        """Signale n unités traitées (octets, lignes, trames…)."""
+        self.count += n
+
+    def reset_progress(self, now=None):
+        """Redonne un délai de grâce complet (après démarrage ou retune)."""
+        self._last_progress = now or time.time()
+        self._last_check = None
+
+    def is_active(self):
+        if self.active is None:
+            return True
+        try:
+            return bool(self.active())
+        except Exception:
+            return False
+
+    def stalled_for(self, now=None):
+        return max(0.0, (now or time.time()) - self._last_progress)
+
+    def _sample(self, now):
+        """Met à jour débit et horodatage de dernière progression."""
+        if self.probe is not None:
+            try:
+                ok = bool(self.probe())
+            except Exception:
+                ok = False
+            if ok:
+                self.count += 1
+        total = self.count
+        if self.counter is not None:
+            try:
+                total += int(self.counter())
+            except Exception:
+                pass
+        if self._last_check is not None:
+            dt = now - self._last_check
+            if dt > 0:
+                self.rate = max(0, total - self._last_count) / dt
+        if total != self._last_count:
+            self._last_progress = now
+            # Étage sain depuis un moment : on réarme le backoff
+            if self.last_restart and now - self.last_restart > self.backoff_max:
+                self._backoff = self.backoff_min
+        self._last_count = total
+        self._last_check = now
+
+
+class PipelineWatchdog:
+    """Surveille un ensemble d'étages et relance ceux qui ne progressent plus."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def register(self, name, stall_after, **kwargs):
+        stage = Stage(name, stall_after, **kwargs)
+        self.stages[name] = stage
+        return stage
+
+    def reset_progress(self):
+        now = time.time()
+        for stage in self.stages.values():
+            stage.reset_progress(now)
+
+    def check(self, now=None):
+        """
+        Échantillonne tous les étages et relance ceux qui sont bloqués.
+        Un étage dont l'amont est lui-même bloqué n'est pas relancé :
+        seule la cause racine l'est.
+        Retourne la liste des étages relancés.
+        """
+        now = now or time.time()
+        for stage in self.stages.values():
+            stage._sample(now)
+
+        stalled = set()
+        for stage in self.stages.values():
+            if not stage.is_active():
+                stage.reset_progress(now)
+                continue
+            if stage.stalled_for(now) >= stage.stall_after:
+                stalled.add(stage.name)
+
+        restarted = []
+        for name in stalled:
+            stage = self.stages[name]
+            if stage.depends_on in stalled:
+                continue
+            if now < stage._next_allowed:
+                continue
+            stage.stalls += 1
+            stage._next_allowed = now + stage._backoff
+            if stage.restart is None:
+                # Pas de relance ciblée possible : blocage signalé seulement
+                logger.error(
+                    f"Watchdog : étage '{name}' bloqué depuis {stage.stalled_for(now):.0f}s "
+                    f"— pas de relance ciblée (prochain signalement dans {stage._backoff:.0f}s)"
+                )
+                stage._backoff = min(stage._backoff * 2, stage.backoff_max)
+                stage.reset_progress(now)
+                continue
+            logger.error(
+                f"Watchdog : étage '{name}' bloqué depuis {stage.stalled_for(now):.0f}s "
+                f"— relance #{stage.restarts + 1} (backoff {stage._backoff:.0f}s)"
+            )
+            try:
+                stage.restart()
+            except Exception as e:
+                logger.error(f"Watchdog : échec relance '{name}': {e}")
+            stage.restarts += 1
+            stage.last_restart = now
+            stage._backoff = min(stage._backoff * 2, stage.backoff_max)
+            stage.reset_progress(now)
+            restarted.append(name)
+        return restarted
+
+    def record_restart(self, name):
+        """Comptabilise une relance décidée hors check() (processus mort)."""
+        stage = self.stages.get(name)
+        if stage:
+            stage.restarts += 1
+            stage.last_restart = time.time()
+            stage.reset_progress()
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            name: {
+                'active':      stage.is_active(),
+                'rate':        round(stage.rate, 2),
+                'stalled_for': round(stage.stalled_for(now), 1),
+                'stall_after': stage.stall_after,
+                'restarts':    stage.restarts,
+                'stalls':      stage.stalls,
+                'backoff':     stage._backoff,
+            }
+            for name, stage in self.stages.items()
+        }
+
+
+def icecast_source_connected(mount='/fmmonitor', url='http://localhost:8000/status-json.xsl',
+                             timeout=2):
+    """Vrai si la source `mount` est connectée à Icecast (status-json.xsl)."""
+    import requests
+    r = requests.get(url, timeout=timeout)
+    r.raise_for_status()
+    sources = r.json().get('icestats', {}).get('source', [])
+    if isinstance(sources, dict):
+        sources = [sources]
+    return any(str(s.get('listenurl', '')).endswith(mount) for s in sources)
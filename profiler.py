@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Profileur par échantillonnage intégré, utilisable sur le processus en production.
+
+Échantillonne `sys._current_frames()` à intervalle régulier depuis le thread
+appelant et agrège les piles au format « collapsed » (une ligne par pile,
+frames séparées par ';', suivie du nombre d'échantillons), directement
+exploitable par flamegraph.pl ou speedscope.
+
+Surcoût borné :
+  - durée et fréquence plafonnées (config `perf.profile_max_seconds` /
+    `perf.profile_max_rate`) ;
+  - un seul profil à la fois ;
+  - le temps passé à échantillonner est mesuré : s'il dépasse
+    `max_overhead` du temps écoulé, l'intervalle est allongé
+    automatiquement (jusqu'à 1 s) ;
+  - les libellés de frames sont mis en cache par objet code.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class ProfilerBusy(RuntimeError):
+    """Un profil est déjà en cours."""
+
+
+class SamplingProfiler:
+
+    def __init__(self, max_seconds=60, max_rate=200, max_overhead=0.05):
+        self.max_seconds = max_seconds
+        self.max_rate = max_rate
+        self.max_overhead = max_overhead
+        self._busy = threading.Lock()
+        self._labels = {}
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = f"{module}:{code.co_name}:{code.co_firstlineno}"
+            self._labels[code] = label
+        return label
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def profile(self, seconds=10, rate=50, threads=None):
+        """
+        Échantillonne les threads pendant `seconds` secondes à `rate` Hz.
+        `threads` : noms (ou préfixes) des threads à retenir, tous si None.
+        Retourne un dict : collapsed (texte), samples, durée, fréquence
+        effective et part du temps passée à échantillonner.
+        """
+        seconds = min(max(float(seconds), 0.1), self.max_seconds)
+        rate = min(max(float(rate), 1.0), self.max_rate)
+        if not self._busy.acquire(blocking=False):
+            raise ProfilerBusy("Un profil est déjà en cours")
+        try:
+            return self._run(seconds, rate, threads)
+        finally:
+            self._busy.release()
+
+    def _run(self, seconds, rate, threads):
+        me = threading.get_ident()
+        stacks = Counter()
+        interval = 1.0 / rate
+        samples = 0
+        spent = 0.0
+        start = time.perf_counter()
+        deadline = start + seconds
+
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident, f'thread-{ident}')
+                if threads and not any(name.startswith(p) for p in threads):
+                    continue
+                stack = self._stack(frame)
+                stacks[';'.join([name] + stack)] += 1
+            del frame
+            samples += 1
+            cost = time.perf_counter() - t0
+            spent += cost
+
+            # Surcoût au-delà du plafond : on espace les échantillons
+            elapsed = time.perf_counter() - start
+            if elapsed > 0 and spent / elapsed > self.max_overhead:
+                interval = min(interval * 1.5, 1.0)
+            time.sleep(max(0.0, min(interval - cost, deadline - time.perf_counter())))
+
+        elapsed = time.perf_counter() - start
+        collapsed = '\n'.join(f'{stack} {n}' for stack, n in stacks.most_common())
+        return {
+            'collapsed':      collapsed + '\n' if collapsed else '',
+            'samples':        samples,
+            'seconds':        round(elapsed, 2),
+            'rate':           round(samples / elapsed, 1) if elapsed else 0.0,
+            'overhead':       round(spent / elapsed, 4) if elapsed else 0.0,
+        }
@@ -46,7 +46,7 @@ class RDSLookup:
         self._load(force_refresh=False)
 
         if auto_refresh:
-            t = threading.Thread(target=self._background_refresh, daemon=True)
+            t = threading.Thread(target=self._background_refresh, daemon=True, name='rds-lookup-refresh')
             t.start()
 
     # ── Public API ─────────────────────────────────────────────────────────────
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Estimateurs en flux pour les détecteurs : coût O(1) par échantillon, mémoire
+bornée, aucune recopie de l'historique.
+
+  - WindowedStats  : moyenne / variance des N dernières valeurs (Welford avec
+                     retrait de la valeur sortante)
+  - SlidingCounter : nombre d'événements sur les W dernières secondes, par
+                     cases de `resolution` secondes
+  - P2Quantile     : quantile estimé par l'algorithme P² (Jain & Chlamtac
+                     1985), cinq marqueurs quel que soit le nombre de valeurs
+"""
+import math
+from collections import deque
+
+
+class WindowedStats:
+    """Moyenne et variance (population) des `size` dernières valeurs"""
+
+    def __init__(self, size):
+        self.size = int(size)
+        self._values = deque()
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, x):
+        x = float(x)
+        if len(self._values) == self.size:
+            self._remove(self._values.popleft())
+        self._values.append(x)
+        n = len(self._values)
+        d = x - self.mean
+        self.mean += d / n
+        self._m2 += d * (x - self.mean)
+
+    def _remove(self, y):
+        n = len(self._values)
+        if n == 0:
+            self.mean = self._m2 = 0.0
+            return
+        d = y - self.mean
+        self.mean -= d / n
+        self._m2 = max(0.0, self._m2 - d * (y - self.mean))
+
+    def clear(self):
+        self._values.clear()
+        self.mean = self._m2 = 0.0
+
+    def values(self):
+        """Valeurs de la fenêtre, de la plus ancienne à la plus récente"""
+        return list(self._values)
+
+    def variance(self):
+        n = len(self._values)
+        return self._m2 / n if n else math.nan
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+class SlidingCounter:
+    """
+    Événements sur la fenêtre glissante des `window` dernières secondes.
+    Le compte porte sur des cases entières : la fenêtre effective est
+    comprise entre window - resolution et window.
+    """
+
+    def __init__(self, window, resolution=1.0):
+        self.resolution = float(resolution)
+        self.window = float(window)
+        self._n = max(1, int(round(self.window / self.resolution)))
+        self._counts = [0] * self._n
+        self._bucket = [None] * self._n     # indice absolu de la case occupant l'emplacement
+        self._head = None                   # plus ancienne case non encore expirée
+        self.total = 0
+
+    def _expire(self, b):
+        """Retire les cases sorties de la fenêtre qui se termine à la case b"""
+        if self._head is None:
+            self._head = b
+            return
+        if b - self._head >= 2 * self._n:
+            self.clear()
+            self._head = b
+            return
+        while self._head <= b - self._n:
+            slot = self._head % self._n
+            if self._bucket[slot] == self._head:
+                self.total -= self._counts[slot]
+                self._counts[slot] = 0
+                self._bucket[slot] = None
+            self._head += 1
+
+    def add(self, ts, n=1):
+        b = int(ts // self.resolution)
+        self._expire(b)
+        if b < self._head:
+            return                          # événement plus ancien que la fenêtre
+        slot = b % self._n
+        if self._bucket[slot] != b:
+            self._bucket[slot] = b
+            self._counts[slot] = 0
+        self._counts[slot] += n
+        self.total += n
+
+    def count(self, now):
+        self._expire(int(now // self.resolution))
+        return self.total
+
+    def rate(self, now):
+        """Événements par seconde sur la fenêtre"""
+        return self.count(now) / self.window
+
+    def next_expiry(self):
+        """Instant où la plus ancienne case non vide sort de la fenêtre (None si vide)"""
+        if not self.total:
+            return None
+        b = self._head
+        while self._bucket[b % self._n] != b:
+            b += 1
+        return (b + self._n) * self.resolution
+
+    def clear(self):
+        self._counts = [0] * self._n
+        self._bucket = [None] * self._n
+        self._head = None
+        self.total = 0
+
+
+class P2Quantile:
+    """Quantile p (0 < p < 1) estimé en flux par l'algorithme P²"""
+
+    def __init__(self, p):
+        self.p = float(p)
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self._q = []                                    # hauteurs des marqueurs
+        self._n = [0, 1, 2, 3, 4]                       # positions réelles
+        p = self.p
+        self._np = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # positions souhaitées
+        self._dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x):
+        if x is None or x != x:
+            return
+        x = float(x)
+        self.count += 1
+        q = self._q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        n = self._n
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._np[i] += self._dn[i]
+
+        # Ajustement des trois marqueurs intérieurs (parabolique, sinon linéaire)
+        for i in (1, 2, 3):
+            d = self._np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                qp = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = qp
+                n[i] += s
+
+    def value(self):
+        q = self._q
+        if not q:
+            return math.nan
+        if self.count < 5:
+            return q[min(len(q) - 1, int(round(self.p * (len(q) - 1))))]
+        return q[2]
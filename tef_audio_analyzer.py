@@ -2,8 +2,12 @@
 """
 TEFAudioAnalyzer — numpy pur, 50ms chunks, interface MPXAnalyzer compatible.
 """
-import subprocess, threading, logging, numpy as np
+import subprocess, threading, logging, time, numpy as np
+from metrics import REGISTRY
+from timing import TIMINGS
 logger = logging.getLogger(__name__)
+_process_seconds=REGISTRY.histogram('fmmonitor_analyzer_process_seconds',
+    "Durée d'une analyse MPX/audio",('analyzer',))
 SAMPLE_RATE=48000; CHUNK_FRAMES=2400; BYTES_PER_FRAME=4
 
 class TEFAudioAnalyzer:
@@ -24,6 +28,9 @@ class TEFAudioAnalyzer:
             'rds_rf_present':False,'level_left':-100.0,'level_right':-100.0,'snr':0.0,
             'fft_spectrum':[]}
         self._stereo_buf = []   # conservé pour compatibilité mais inutilisé
+        self.updates = 0        # nombre d'analyses publiées (watchdog)
+        self.on_update = None   # callable(résultats) appelé après chaque analyse
+        TIMINGS.set_budget('tef_audio.process', chunk_frames/sample_rate)
         logger.info(f"TEFAudioAnalyzer initialisé — {alsa_device}, {sample_rate}Hz stéréo, {chunk_frames} frames/50ms (numpy pur)")
 
     def start(self):
@@ -56,7 +63,6 @@ class TEFAudioAnalyzer:
     def _capture_loop(self):
         cmd=['arecord','-D',self.alsa_device,'-f','S16_LE','-r',str(self.sample_rate),
              '-c','2','-t','raw','--buffer-size',str(self.chunk_frames*4)]
-        import time
         while self._running:
             try:
                 self._proc=subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,bufsize=0)
@@ -75,6 +81,7 @@ class TEFAudioAnalyzer:
             if self._running: time.sleep(5)
 
     def _process(self, raw):
+        t0=time.perf_counter()
         try:
             s=np.frombuffer(raw,dtype=np.int16).astype(np.float32)/32768.0
             if len(s)<256: return
@@ -105,6 +112,11 @@ class TEFAudioAnalyzer:
                     'stereo_level':-100.0,'pilot_level':-100.0,'pilot_present':False,
                     'rds_level':-100.0,'rds_rf_present':False,
                     'fft_spectrum':fft_spectrum})
+                results=self._results.copy() if self.on_update else None
+            self.updates+=1
+            if results is not None: self.on_update(results)
         except Exception as e: logger.debug(f"TEFAudioAnalyzer._process: {e}")
+        dt=time.perf_counter()-t0
+        _process_seconds.observe(dt,analyzer='tef_audio'); TIMINGS.record('tef_audio.process',dt)
 
 def _rms_to_db(rms): return 20.0*np.log10(rms) if rms>1e-10 else -100.0
@@ -168,6 +168,9 @@ class TEFDriver:
         self._running       = False
         self._freq_khz      = None
         self._lock          = threading.Lock()
+        # Compteurs cumulatifs (watchdog de débit)
+        self.lines_read     = 0
+        self.rds_groups     = 0
 
     # ── API publique ────────────────────────────────────────────────────
 
@@ -254,6 +257,7 @@ class TEFDriver:
                 raw, buf = buf.split(b'\n', 1)
                 line = raw.decode('ascii', errors='ignore').strip()
                 if line:
+                    self.lines_read += 1
                     self._parse(line)
 
     def _write(self, data):
@@ -296,6 +300,7 @@ class TEFDriver:
                 bc = int(data[4:8],  16)
                 bd = int(data[8:12], 16)
                 st = int(data[12:14], 16)
+                self.rds_groups += 1
                 self._rds.feed(bb, bc, bd, st)
             except ValueError:
                 pass
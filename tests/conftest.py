@@ -0,0 +1,25 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules à plat à la racine du dépôt
+sys.path.insert(0, REPO)
+
+import monitor  # noqa: E402
+
+
+@pytest.fixture
+def fm(tmp_path, monkeypatch):
+    """Moniteur non démarré sur une copie de config.example.json, base dans tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(os.path.join(REPO, 'config.example.json'), tmp_path / 'config.json')
+    m = monitor.FMMonitor('config.json')
+    # Ni minuterie du bus (non démarré) ni fichier hors de la base
+    m.flight_recorder = None
+    m.audio_ring = None
+    yield m
+    m.db.close()
@@ -0,0 +1,50 @@
+from alert_rules import RuleEngine
+from test_alert_rules import carrier_rules, names
+
+
+def test_child_is_folded_under_active_cause():
+    engine = RuleEngine(carrier_rules(hold=0))
+    engine.update({'level_db': -60.0}, 0.0)
+    events = engine.update({'level_std': 0.1}, 1.0)
+    assert events == []
+    events = engine.advance(6.0)
+    assert names(events) == [('mod', False)]
+    assert events[0].cause == 'carrier'
+    assert engine.notifications(events[0]) == []
+    # Le rétablissement de la cause énumère l'alerte rattachée
+    events = engine.update({'level_db': -20.0, 'level_std': 3.0}, 10.0)
+    assert ('carrier', True) in names(events)
+    restored = next(e for e in events if e.rule.name == 'carrier')
+    assert restored.folded == ('mod',)
+
+
+def test_child_outliving_its_cause_is_relaunched_standalone():
+    engine = RuleEngine(carrier_rules(hold=0))
+    engine.update({'level_db': -60.0, 'level_std': 0.1}, 0.0)
+    engine.advance(5.0)
+    assert engine.is_active('mod')
+    events = engine.update({'level_db': -20.0}, 8.0)
+    assert names(events) == [('carrier', True), ('mod', False)]
+    relaunched = events[1]
+    assert relaunched.cause is None
+    assert engine.notifications(relaunched)
+
+
+def test_child_resolving_with_its_cause_is_not_relaunched():
+    engine = RuleEngine(carrier_rules(hold=0))
+    engine.update({'level_db': -60.0, 'level_std': 0.1}, 0.0)
+    engine.advance(5.0)
+    events = engine.update({'level_db': -20.0, 'level_std': 3.0}, 8.0)
+    assert sorted(names(events)) == [('carrier', True), ('mod', True)]
+
+
+def test_child_resolving_when_pending_cause_cancels_is_not_relaunched():
+    # Cause encore dans son délai : le dépassement est annulé, pas rétabli
+    engine = RuleEngine(carrier_rules(hold=10))
+    engine.update({'level_db': -60.0, 'level_std': 0.1}, 0.0)
+    events = engine.advance(5.0)
+    assert names(events) == [('mod', False)] and events[0].cause == 'carrier'
+    events = engine.update({'level_db': -20.0, 'level_std': 3.0}, 8.0)
+    assert names(events) == [('mod', True)]
+
+
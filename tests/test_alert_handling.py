@@ -0,0 +1,58 @@
+def threshold(engine, name):
+    return next(r for r in engine.rules if r.name == name).conditions[0]['threshold']
+
+
+def alert_types(db):
+    with db.get_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT alert_type FROM alerts ORDER BY id')]
+
+
+def test_rt_lost_raised_by_rds_recovery_is_recorded(fm):
+    engine = fm.alert_engine
+    rds_timeout, rt_timeout = threshold(engine, 'rds_lost'), threshold(engine, 'rt_lost')
+    t = 1_000_000.0
+    fm._handle_alert_events(engine.update({'level_db': -20.0, 'rds_age': 0.0, 'rt_age': 0.0}, t))
+    fm._handle_alert_events(engine.advance(t + rds_timeout + 1))
+    assert alert_types(fm.db) == ['rds_lost']
+    assert not fm.rds_ok
+
+    # Le RDS revient sans RadioText récent : rt_lost part dans la même transition
+    fm._handle_alert_events(engine.update({'rds_age': 0.0}, t + rt_timeout + 10))
+    assert alert_types(fm.db) == ['rds_lost', 'rds_restored', 'rt_lost']
+    assert [ep['type'] for ep in fm.db.get_open_episodes()] == ['rt_lost']
+
+
+def test_signal_loss_episode_opens_and_closes(fm):
+    engine = fm.alert_engine
+    t = 2_000_000.0
+    fm._handle_alert_events(engine.update({'level_db': -90.0, 'audio_snr': 0.0}, t))
+    deadline = engine.next_deadline()
+    fm._handle_alert_events(engine.advance(deadline))
+    assert not fm.signal_ok
+    # Alerte datée de son échéance, épisode du début du dépassement
+    with fm.db.get_connection() as conn:
+        assert conn.execute('SELECT ts FROM alerts').fetchone()[0] == int(deadline * 1000)
+    [episode] = fm.db.get_open_episodes()
+    assert episode['type'] == 'signal_lost'
+    assert episode['start_ts'] == int(t * 1000)
+    fm._handle_alert_events(engine.update({'level_db': -20.0, 'audio_snr': 30.0}, t + 120))
+    assert fm.signal_ok
+    assert fm.db.get_open_episodes() == []
+    with fm.db.get_connection() as conn:
+        assert conn.execute('SELECT duration_s FROM alert_episodes').fetchone()[0] == 120
+
+
+def test_level_std_follows_producer_timestamps(fm):
+    engine = fm.alert_engine
+    t = 3_000_000.0
+    # Niveau publié à 10 Hz : la fenêtre de modulation est échantillonnée à 1 Hz
+    for k in range(250):
+        fm._on_metric_event(t + k / 10, {'level_db': -20.0 + (k % 20) / 10})
+    assert len(fm.level_stats) == 25
+    assert engine.latest('level_std') is not None
+    # Porteuse sans modulation : l'alerte est datée par les mesures, pas par l'horloge
+    for k in range(1, 400):
+        fm._on_metric_event(t + 25 + k / 10, {'level_db': -20.0})
+    assert engine.latest('level_std') < 0.01
+    assert 'no_modulation' in alert_types(fm.db)
+
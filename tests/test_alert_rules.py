@@ -0,0 +1,93 @@
+import math
+
+from alert_rules import RuleEngine, builtin_rules
+
+
+def carrier_rules(**carrier):
+    spec = {'name': 'carrier', 'metric': 'level_db', 'op': '<', 'threshold': -50.0, 'hold': 10}
+    spec.update(carrier)
+    return [
+        spec,
+        {'name': 'mod', 'metric': 'level_std', 'op': '<', 'threshold': 1.0, 'hold': 5,
+         'depends_on': 'carrier'},
+    ]
+
+
+def names(events):
+    return [(e.rule.name, e.restored) for e in events]
+
+
+def test_hold_fires_at_exact_deadline():
+    engine = RuleEngine(carrier_rules())
+    assert engine.update({'level_db': -60.0}, 100.0) == []
+    assert engine.is_pending('carrier') and not engine.is_active('carrier')
+    assert engine.next_deadline() == 110.0
+    assert engine.advance(109.9) == []
+    events = engine.advance(110.0)
+    assert names(events) == [('carrier', False)]
+    assert events[0].ts == 110.0 and events[0].duration == 10
+    assert engine.is_active('carrier')
+
+
+def test_breach_cleared_before_hold_is_forgotten():
+    engine = RuleEngine(carrier_rules())
+    engine.update({'level_db': -60.0}, 0.0)
+    assert engine.update({'level_db': -20.0}, 5.0) == []
+    assert not engine.is_pending('carrier')
+    assert engine.next_deadline() is None
+    assert engine.advance(60.0) == []
+
+
+def test_hysteresis_and_clear_hold_delay_the_restore():
+    engine = RuleEngine(carrier_rules(hold=0, hysteresis=3.0, clear_hold=5))
+    assert names(engine.update({'level_db': -60.0}, 0.0)) == [('carrier', False)]
+    # Au-dessus du seuil mais dans l'hystérésis : toujours en défaut
+    assert engine.update({'level_db': -48.0}, 1.0) == []
+    assert engine.next_deadline() is None
+    assert engine.update({'level_db': -40.0}, 2.0) == []
+    assert engine.next_deadline() == 7.0
+    events = engine.advance(7.0)
+    assert names(events) == [('carrier', True)]
+    assert events[0].duration == 7
+    assert not engine.is_active('carrier')
+
+
+def test_age_metric_fires_without_new_measurement():
+    engine = RuleEngine([{'name': 'rds_lost', 'metric': 'rds_age', 'op': '>=', 'threshold': 60}])
+    engine.update({'rds_age': 0.0}, 1000.0)
+    deadline = engine.next_deadline()
+    assert math.isclose(deadline, 1060.0, abs_tol=0.01)
+    assert names(engine.advance(deadline)) == [('rds_lost', False)]
+    assert names(engine.update({'rds_age': 0.0}, 1070.0)) == [('rds_lost', True)]
+
+
+def test_learned_threshold_never_less_sensitive_than_floor():
+    rules = [{'name': 'mod', 'metric': 'level_std', 'op': '<', 'threshold': 0.8, 'baseline': 3.0}]
+    engine = RuleEngine(rules)
+    # Heure de parole : 3 ± 1.5 dB, k=3 donnerait -1.5 dB (jamais atteint)
+    engine.set_baselines({'level_std': (3.0, 1.5)})
+    assert names(engine.update({'level_std': 0.0}, 0.0)) == [('mod', False)]
+    # Une bande plus sensible que le seuil statique est conservée
+    engine = RuleEngine(rules)
+    engine.set_baselines({'level_std': (10.0, 1.0)})
+    assert names(engine.update({'level_std': 5.0}, 0.0)) == [('mod', False)]
+
+
+def test_explicit_floor_bounds_learned_threshold():
+    engine = RuleEngine([{'name': 'snr', 'metric': 'audio_snr', 'op': '<', 'threshold': None,
+                          'baseline': 3.0, 'floor': 10.0}])
+    engine.set_baselines({'audio_snr': (20.0, 5.0)})
+    assert names(engine.update({'audio_snr': 9.0}, 0.0)) == [('snr', False)]
+
+
+def test_rt_age_suspended_while_rds_lost():
+    engine = RuleEngine(builtin_rules(False, {'rds_timeout': 60, 'rt_timeout': 120}, {}))
+    engine.update({'level_db': -20.0, 'audio_snr': 30.0, 'level_std': 3.0,
+                   'rds_age': 0.0, 'rt_age': 0.0}, 0.0)
+    # Plus de RDS : le RadioText n'est plus surveillé, aucune échéance en attente
+    assert names(engine.advance(200.0)) == [('rds_lost', False)]
+    assert engine.next_deadline() is None
+    # RDS revenu sans RadioText récent : rt_lost dans la même transition
+    events = engine.update({'rds_age': 0.0}, 250.0)
+    assert names(events) == [('rds_lost', True), ('rt_lost', False)]
+    assert events[1].cause is None
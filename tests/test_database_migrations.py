@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+from database import FMDatabase
+
+
+def baseline_db(path):
+    """Base telle que la créait la version initiale (sans user_version)"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE audio_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            level_db REAL NOT NULL,
+            signal_ok BOOLEAN NOT NULL
+        );
+        CREATE INDEX idx_audio_timestamp ON audio_levels(timestamp);
+        CREATE TABLE alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            alert_type TEXT NOT NULL,
+            level_db REAL,
+            duration_seconds INTEGER,
+            message TEXT,
+            email_sent BOOLEAN DEFAULT 0
+        );
+        CREATE TABLE rds_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ps TEXT,
+            rt TEXT
+        );
+    ''')
+    conn.executemany('INSERT INTO audio_levels (timestamp, level_db, signal_ok) VALUES (?, ?, ?)',
+                     [(f'2025-03-01 10:00:{s:02d}', -20.0 - s, 1) for s in range(0, 60, 5)])
+    conn.executemany('''
+        INSERT INTO alerts (timestamp, alert_type, level_db, duration_seconds, message, email_sent)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        ('2025-03-01 10:01:00', 'signal_lost', -80.0, 0, 'Émetteur hors ligne', 1),
+        ('2025-03-01 10:03:00', 'signal_restored', -20.0, 120, 'Émetteur rétabli', 1),
+        ('2025-03-01 11:00:00', 'no_modulation', -30.0, 30, 'Absence modulation', 0),
+    ])
+    conn.execute("INSERT INTO rds_history (timestamp, ps, rt) VALUES ('2025-03-01 10:00:00', 'RADIO', 'Bonjour')")
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    path = str(tmp_path / 'fm_monitor.db')
+    baseline_db(path)
+    db = FMDatabase(path)
+    yield db, path
+    db.close()
+
+
+def user_version(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def test_all_migrations_applied(migrated):
+    db, path = migrated
+    assert user_version(path) == len(FMDatabase.MIGRATIONS) == 11
+    with sqlite3.connect(path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in ('alert_episodes', 'notification_outbox', 'availability_daily', 'baselines',
+                  'flight_records', 'audio_clips', 'audio_rollup_1m'):
+        assert table in tables
+
+
+def test_baseline_rows_survive(migrated):
+    db, path = migrated
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM audio_levels').fetchone()[0] == 12
+        alerts = conn.execute('SELECT ts, alert_type, email_sent FROM alerts ORDER BY ts').fetchall()
+        rds = conn.execute('SELECT ts, ps, rt FROM rds_history').fetchall()
+    assert [a[1] for a in alerts] == ['signal_lost', 'signal_restored', 'no_modulation']
+    assert all(isinstance(a[0], int) for a in alerts)
+    assert alerts[1][0] - alerts[0][0] == 120_000
+    assert rds[0][1:] == ('RADIO', 'Bonjour')
+
+
+def test_episodes_rebuilt_from_history(migrated):
+    db, path = migrated
+    with sqlite3.connect(path) as conn:
+        episodes = conn.execute('''
+            SELECT type, duration_s, end_ts IS NULL, parent_id FROM alert_episodes ORDER BY start_ts
+        ''').fetchall()
+    assert episodes == [('signal_lost', 120, 0, None), ('no_modulation', None, 1, None)]
+    assert [ep['type'] for ep in db.get_open_episodes()] == ['no_modulation']
+
+
+def test_reopening_is_idempotent(migrated):
+    db, path = migrated
+    FMDatabase(path).close()
+    assert user_version(path) == 11
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM alert_episodes').fetchone()[0] == 2
+
+
+def test_fresh_database_reaches_latest_schema(tmp_path):
+    path = str(tmp_path / 'new.db')
+    db = FMDatabase(path)
+    assert user_version(path) == 11
+    alert_id = db.save_alert('signal_lost', -90.0, 0, 'test', email_sent=False)
+    assert alert_id is not None
+    db.close()
@@ -0,0 +1,57 @@
+import numpy as np
+
+from downsample import downsample_indices, downsample_rows, lttb_indices, minmax_indices
+
+
+def test_empty_input():
+    for method in ('lttb', 'minmax'):
+        assert len(downsample_indices([], [], 10, method)) == 0
+
+
+def test_n_at_or_above_size_keeps_every_point():
+    x = np.arange(50)
+    y = np.sin(x)
+    for n in (50, 51, 1000):
+        assert lttb_indices(x, y, n).tolist() == list(range(50))
+        assert minmax_indices(x, y, n).tolist() == list(range(50))
+
+
+def test_lttb_below_three_points_keeps_every_point():
+    x = np.arange(20)
+    assert lttb_indices(x, x * 2.0, 2).tolist() == list(range(20))
+
+
+def test_lttb_keeps_ends_and_isolated_peak():
+    x = np.arange(10_000)
+    y = np.zeros(10_000)
+    y[4321] = 100.0
+    idx = lttb_indices(x, y, 100)
+    assert len(idx) <= 100
+    assert idx[0] == 0 and idx[-1] == 9_999
+    assert 4321 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_minmax_keeps_global_extremes():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=5_000)
+    idx = minmax_indices(np.arange(5_000), y, 100)
+    assert len(idx) <= 102
+    assert int(np.argmin(y)) in idx and int(np.argmax(y)) in idx
+
+
+def test_nan_and_none_are_never_selected():
+    y = [None, 1.0, None, 3.0, 2.0, None, 5.0, 4.0, None]
+    for method in ('lttb', 'minmax'):
+        idx = downsample_indices(range(len(y)), y, 3, method)
+        assert all(y[i] is not None for i in idx)
+
+
+def test_downsample_rows_passthrough():
+    rows = [{'ts': i, 'level_db': -float(i)} for i in range(10)]
+    assert downsample_rows(rows, None) is rows
+    assert downsample_rows(rows, 10) is rows
+    assert downsample_rows([], 5) == []
+    reduced = downsample_rows(rows, 4)
+    assert reduced[0] is rows[0] and reduced[-1] is rows[-1]
+    assert len(reduced) <= 4
@@ -0,0 +1,33 @@
+import threading
+
+from event_bus import EventBus
+
+
+def test_stop_dispatches_events_published_before_it():
+    bus = EventBus()
+    seen = []
+    release = threading.Event()
+
+    def slow(ts, value):
+        release.wait(1)
+        seen.append(value)
+
+    bus.subscribe('metrics', slow)
+    bus.start()
+    for k in range(50):
+        bus.publish('metrics', k)
+    release.set()
+    bus.stop()
+    assert seen == list(range(50))
+    assert not bus.running
+
+
+def test_stop_without_start_leaves_no_stale_sentinel():
+    bus = EventBus()
+    seen = []
+    bus.subscribe('metrics', lambda ts, value: seen.append(value))
+    bus.stop()
+    bus.start()
+    bus.publish('metrics', 1)
+    bus.stop()
+    assert seen == [1]
@@ -0,0 +1,22 @@
+import threading
+
+from metrics import REGISTRY
+
+
+def thread_series(text, name):
+    return [line for line in text.splitlines()
+            if line.startswith(f'fmmonitor_thread_cpu_seconds_total{{thread="{name}"}}')]
+
+
+def test_threads_sharing_a_name_are_one_series():
+    stop = threading.Event()
+    workers = [threading.Thread(target=stop.wait, name='pool-worker') for _ in range(3)]
+    for t in workers:
+        t.start()
+    try:
+        text = REGISTRY.render()
+    finally:
+        stop.set()
+        for t in workers:
+            t.join()
+    assert len(thread_series(text, 'pool-worker')) == 1
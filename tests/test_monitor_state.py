@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+
+from alert_rules import RuleEngine
+from monitor_state import load_state, save_state
+from test_alert_rules import carrier_rules
+
+
+def test_state_round_trip_keeps_episode_start():
+    engine = RuleEngine(carrier_rules(hold=0))
+    engine.update({'level_db': -60.0, 'level_std': 0.1}, 0.0)
+    engine.advance(5.0)
+    state = json.loads(json.dumps(engine.state()))
+
+    restored = RuleEngine(carrier_rules(hold=0))
+    restored.restore(state)
+    assert restored.is_active('carrier') and restored.is_active('mod')
+    events = restored.update({'level_db': -20.0, 'level_std': 3.0}, 100.0)
+    carrier = next(e for e in events if e.rule.name == 'carrier')
+    assert carrier.restored and carrier.duration == 100
+
+
+def test_save_state_is_atomic_and_round_trips(tmp_path):
+    path = str(tmp_path / 'monitor_state.npz')
+    assert load_state(path) is None
+    save_state(path, {'ts': 1.0, 'flags': [1, 2]}, {'signal_ts': np.arange(3, dtype=np.int64)})
+    save_state(path, {'ts': 2.0}, {'signal_ts': np.arange(5, dtype=np.int64)})
+    state, arrays = load_state(path)
+    assert state['ts'] == 2.0
+    assert arrays['signal_ts'].tolist() == [0, 1, 2, 3, 4]
+    # Aucun fichier temporaire laissé derrière
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['monitor_state.npz']
+
+
+def test_corrupt_state_is_ignored(tmp_path):
+    path = tmp_path / 'monitor_state.npz'
+    path.write_bytes(b'not a zip')
+    assert load_state(str(path)) is None
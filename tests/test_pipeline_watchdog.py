@@ -0,0 +1,27 @@
+from pipeline_watchdog import PipelineWatchdog
+
+
+def test_stalled_stage_is_restarted_with_backoff():
+    calls = []
+    wd = PipelineWatchdog()
+    wd.register('rf', 10, restart=lambda: calls.append('rf'))
+    wd.reset_progress()
+    now = wd.stages['rf']._last_progress
+    assert wd.check(now + 5) == []
+    assert wd.check(now + 11) == ['rf']
+    assert calls == ['rf'] and wd.stages['rf'].restarts == 1
+    # Toujours bloqué, mais dans le backoff
+    assert wd.check(now + 20) == []
+
+
+def test_stage_without_restart_is_only_reported():
+    wd = PipelineWatchdog()
+    wd.register('rf', 10, restart=lambda: None)
+    icecast = wd.register('icecast', 10, restart=None, depends_on='rf')
+    wd.stages['rf'].feed()
+    wd.reset_progress()
+    now = icecast._last_progress
+    for t in range(0, 12, 5):
+        wd.stages['rf'].feed()
+        assert wd.check(now + t + 1) == []
+    assert icecast.stalls == 1 and icecast.restarts == 0
@@ -0,0 +1,12 @@
+def test_failed_retune_keeps_frequency_and_station(fm):
+    old = fm.rtl_config['frequency']
+    fm.running = True
+    fm.use_tef, fm.tef_driver = True, None
+    fm.stats['ps'] = 'STATION'
+    try:
+        assert not fm.retune('101.1M')
+        assert not fm.retune('pas une fréquence')
+    finally:
+        fm.running = False
+    assert fm.rtl_config['frequency'] == old
+    assert fm.stats['ps'] == 'STATION'
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Instrumentation des chemins chauds : durée par appel et part du budget temps réel.
+
+Chaque chemin nommé (ex : 'mpx.process_chunk') alimente un histogramme de
+taille fixe de type HDR (log-linéaire, ~3 % de précision de 1 µs à ~10 s)
+qui ne grossit jamais, quel que soit le nombre d'appels.
+
+Le budget temps réel d'un chemin est la durée de signal couverte par un
+appel : 4 × 2048 échantillons à 171 kHz ≈ 48 ms pour MPXAnalyzer (1 chunk
+analysé sur 4), 50 ms pour TEFAudioAnalyzer, 1 s pour une itération de
+surveillance… Le rapport p99 / budget indique la marge restante.
+
+Activable à chaud : désactivé, `start()` renvoie 0 et `stop()` sort
+immédiatement, le surcoût est alors de deux appels de fonction.
+
+Utilisation :
+    t0 = TIMINGS.start()
+    ...
+    TIMINGS.stop('mpx.process_chunk', t0)
+"""
+import threading
+import time
+from metrics import REGISTRY
+
+_SUB_BITS = 5
+_SUB = 1 << _SUB_BITS            # 32 sous-buckets par octave
+_MAX_US = 10_000_000             # 10 s
+_N_BUCKETS = _SUB + (_MAX_US.bit_length() - _SUB_BITS) * _SUB
+
+
+def _bucket_index(us):
+    if us < _SUB:
+        return us
+    e = us.bit_length() - _SUB_BITS - 1
+    return _SUB + e * _SUB + ((us >> e) - _SUB)
+
+
+def _bucket_value(idx):
+    """Valeur représentative (µs) d'un bucket : milieu de l'intervalle."""
+    if idx < _SUB:
+        return float(idx)
+    e, m = divmod(idx - _SUB, _SUB)
+    lower = (m + _SUB) << e
+    return lower + ((1 << e) - 1) / 2.0
+
+
+class HdrHistogram:
+    """Histogramme log-linéaire à taille fixe, valeurs en microsecondes."""
+
+    __slots__ = ('counts', 'count', 'total_us', 'max_us', 'min_us')
+
+    def __init__(self):
+        self.counts = [0] * _N_BUCKETS
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.min_us = None
+
+    def record(self, us):
+        us = int(us)
+        if us < 0:
+            us = 0
+        elif us >= _MAX_US:
+            us = _MAX_US - 1
+        self.counts[_bucket_index(us)] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(_bucket_value(idx), float(self.max_us))
+        return float(self.max_us)
+
+    def mean(self):
+        return self.total_us / self.count if self.count else 0.0
+
+
+class _Path:
+    __slots__ = ('hist', 'budget_s', 'since')
+
+    def __init__(self, budget_s=None):
+        self.hist = HdrHistogram()
+        self.budget_s = budget_s
+        self.since = time.monotonic()
+
+
+class Timings:
+    """Registre des chemins chauds instrumentés."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._paths = {}
+        self._lock = threading.Lock()   # création de chemin uniquement
+
+    def _path(self, name):
+        path = self._paths.get(name)
+        if path is None:
+            with self._lock:
+                path = self._paths.setdefault(name, _Path())
+        return path
+
+    def set_budget(self, name, seconds):
+        """Déclare le budget temps réel d'un appel (secondes de signal couvertes)."""
+        self._path(name).budget_s = float(seconds) if seconds else None
+
+    def set_enabled(self, enabled):
+        enabled = bool(enabled)
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def stop(self, name, t0):
+        if not t0 or not self.enabled:
+            return
+        self._path(name).hist.record((time.perf_counter() - t0) * 1e6)
+
+    def record(self, name, seconds):
+        """Enregistre une durée déjà mesurée par l'appelant."""
+        if self.enabled:
+            self._path(name).hist.record(seconds * 1e6)
+
+    def reset(self):
+        now = time.monotonic()
+        for path in list(self._paths.values()):
+            path.hist.reset()
+            path.since = now
+
+    def report(self):
+        """Statistiques par chemin : percentiles (ms), débit, part du budget et du CPU."""
+        now = time.monotonic()
+        paths = {}
+        for name, path in sorted(self._paths.items()):
+            h = path.hist
+            elapsed = max(now - path.since, 1e-6)
+            p99_ms = h.percentile(99) / 1000.0
+            entry = {
+                'calls':        h.count,
+                'calls_per_s':  round(h.count / elapsed, 2),
+                'mean_ms':      round(h.mean() / 1000.0, 3),
+                'p50_ms':       round(h.percentile(50) / 1000.0, 3),
+                'p90_ms':       round(h.percentile(90) / 1000.0, 3),
+                'p99_ms':       round(p99_ms, 3),
+                'max_ms':       round(h.max_us / 1000.0, 3),
+                # Fraction d'un cœur consommée par ce chemin
+                'cpu_share':    round(h.total_us / 1e6 / elapsed, 4),
+                'budget_ms':    None,
+                'budget_share': None,
+                'headroom':     None,
+            }
+            if path.budget_s:
+                budget_ms = path.budget_s * 1000.0
+                entry['budget_ms'] = round(budget_ms, 2)
+                entry['budget_share'] = round(h.mean() / 1000.0 / budget_ms, 4)
+                entry['headroom'] = round(1.0 - p99_ms / budget_ms, 4)
+            paths[name] = entry
+        return {'enabled': self.enabled, 'paths': paths}
+
+
+TIMINGS = Timings()
+
+
+def _metrics_collector():
+    """Expose p50/p99 par chemin dans /metrics."""
+    samples = []
+    for name, path in list(TIMINGS._paths.items()):
+        h = path.hist
+        if not h.count:
+            continue
+        samples.append(({'path': name, 'quantile': '0.5'}, h.percentile(50) / 1e6))
+        samples.append(({'path': name, 'quantile': '0.99'}, h.percentile(99) / 1e6))
+    if not samples:
+        return []
+    return [('fmmonitor_hotpath_seconds', 'gauge',
+             'Durée par appel des chemins chauds (quantiles)', samples)]
+
+
+REGISTRY.register_collector(_metrics_collector)
@@ -8,9 +8,12 @@ from gnuradio import gr, analog, blocks
 import osmosdr
 import sys
 import os
+import threading
+import time
 
 RDS_FIFO = '/tmp/rds_gnuradio.pcm'
 MPX_FIFO = '/tmp/mpx_gnuradio.pcm'
+CTL_FIFO = '/tmp/wfm_ctl'          # consignes de fréquence (MHz, une par ligne)
 
 class WFMStereo(gr.top_block):
     def __init__(self, freq=88.6e6, gain=40, ppm=0):
@@ -80,6 +83,27 @@ class WFMStereo(gr.top_block):
         self.connect(self.f2s_mpx, self.mpx_sink2)
 
 
+def control_loop(tb):
+    """
+    Lit les consignes de fréquence sur CTL_FIFO et retune la source RTL-SDR
+    à chaud, sans reconstruire le flowgraph (retune en quelques ms).
+    """
+    while True:
+        try:
+            with open(CTL_FIFO, 'r') as ctl:
+                for line in ctl:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        tb.src.set_center_freq(float(line) * 1e6)
+                        sys.stderr.write(f"wfm_stereo : retune {line} MHz\n")
+                    except ValueError:
+                        pass
+        except OSError:
+            time.sleep(1)
+
+
 if __name__ == "__main__":
     freq = float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else 88.6e6
     gain = float(sys.argv[2]) if len(sys.argv) > 2 else 40
@@ -89,11 +113,14 @@ if __name__ == "__main__":
         os.mkfifo(RDS_FIFO)
     if not os.path.exists(MPX_FIFO):
         os.mkfifo(MPX_FIFO)
+    if not os.path.exists(CTL_FIFO):
+        os.mkfifo(CTL_FIFO)
 
 
     tb = WFMStereo(freq=freq, gain=gain, ppm=ppm)
     import signal
     tb.start()
+    threading.Thread(target=control_loop, args=(tb,), daemon=True).start()
     try:
         signal.pause()
     except KeyboardInterrupt: